@@ -0,0 +1,163 @@
+import os
+from datetime import date
+
+from psycopg2.extras import execute_values
+
+MAX_REALLOCATION_MOVES = int(os.getenv('MAX_REALLOCATION_MOVES', 1000))
+PAGE_SIZE = 1000
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def validate_moves(moves):
+    """Check every move's fields and reject moves repeated within the batch"""
+    valid = []
+    rejects = []
+    seen = {}
+
+    for index, move in enumerate(moves):
+        if not isinstance(move, dict):
+            rejects.append({'row': index, 'errors': ['Move must be an object']})
+            continue
+
+        errors = []
+        resource_id = move.get('resource_id')
+        from_project_id = move.get('from_project_id')
+        to_project_id = move.get('to_project_id')
+
+        if not _is_id(resource_id):
+            errors.append('resource_id is required')
+        for field in ('from_project_id', 'to_project_id'):
+            if move.get(field) is not None and not _is_id(move[field]):
+                errors.append(f'{field} must be a project id')
+        if from_project_id is None and to_project_id is None:
+            errors.append('from_project_id or to_project_id is required')
+        elif from_project_id is not None and from_project_id == to_project_id:
+            errors.append('from_project_id and to_project_id must differ')
+
+        percentage = move.get('allocation_percentage', 100)
+        if not isinstance(percentage, int) or isinstance(percentage, bool) or not 0 <= percentage <= 100:
+            errors.append('allocation_percentage must be an integer between 0 and 100')
+
+        start_date = move.get('start_date')
+        if start_date is not None:
+            try:
+                date.fromisoformat(start_date)
+            except (TypeError, ValueError):
+                errors.append('start_date must be an ISO date')
+
+        for field, project_id in (('from', from_project_id), ('to', to_project_id)):
+            if project_id is None or errors:
+                continue
+            key = (field, resource_id, project_id)
+            if key in seen:
+                errors.append(f'Duplicate move, first seen at row {seen[key]}')
+            else:
+                seen[key] = index
+
+        if errors:
+            rejects.append({'row': index, 'errors': errors})
+        else:
+            valid.append((index, move))
+
+    return valid, rejects
+
+
+def reject_unknown_references(cursor, valid, rejects):
+    """Reject moves naming missing resources or inactive target projects"""
+    resource_ids = list({move['resource_id'] for _, move in valid})
+    project_ids = list({move['from_project_id'] for _, move in valid if move.get('from_project_id')})
+    target_ids = list({move['to_project_id'] for _, move in valid if move.get('to_project_id')})
+
+    cursor.execute("SELECT id FROM resources WHERE id = ANY(%s)", (resource_ids,))
+    known_resources = {row[0] for row in cursor.fetchall()}
+    cursor.execute("SELECT id, is_active FROM projects WHERE id = ANY(%s)", (project_ids + target_ids,))
+    known_projects = {row[0]: row[1] for row in cursor.fetchall()}
+
+    remaining = []
+    for index, move in valid:
+        errors = []
+        if move['resource_id'] not in known_resources:
+            errors.append('Resource not found')
+        if move.get('from_project_id') and move['from_project_id'] not in known_projects:
+            errors.append('Source project not found')
+        if move.get('to_project_id'):
+            if move['to_project_id'] not in known_projects:
+                errors.append('Target project not found')
+            elif known_projects[move['to_project_id']] is False:
+                errors.append('Target project is inactive')
+
+        if errors:
+            rejects.append({'row': index, 'errors': errors})
+        else:
+            remaining.append((index, move))
+
+    rejects.sort(key=lambda reject: reject['row'])
+    return remaining
+
+
+def apply_moves(conn, valid):
+    """Apply all moves as a few set-based statements on project_resources.
+
+    Source allocations are closed in one UPDATE; target allocations that are
+    already active are updated in place (percentage, plus start date and role
+    when given) and the rest inserted, so a batch is at most three statements
+    and each resource's status is recomputed by the statement-level triggers
+    rather than per row. Returns
+    ``(released, updated, allocated)``.
+    """
+    cursor = conn.cursor()
+    released = updated = allocated = 0
+
+    releases = [(move['resource_id'], move['from_project_id'])
+                for _, move in valid if move.get('from_project_id')]
+    if releases:
+        rows = execute_values(cursor, """
+            UPDATE project_resources pr
+            SET is_active = FALSE, end_date = CURRENT_DATE
+            FROM (VALUES %s) AS v(resource_id, project_id)
+            WHERE pr.resource_id = v.resource_id AND pr.project_id = v.project_id
+            AND pr.is_active = TRUE
+            RETURNING pr.id
+        """, releases, page_size=PAGE_SIZE, fetch=True)
+        released = len(rows)
+
+    assignments = [(move['resource_id'], move['to_project_id'], move.get('allocation_percentage', 100),
+                    move.get('start_date'), move.get('role_in_project'))
+                   for _, move in valid if move.get('to_project_id')]
+    if assignments:
+        template = '(%s, %s, %s, %s::date, %s::varchar)'
+        rows = execute_values(cursor, """
+            UPDATE project_resources pr
+            SET allocation_percentage = v.allocation_percentage,
+                start_date = COALESCE(v.start_date, pr.start_date),
+                role_in_project = COALESCE(v.role_in_project, pr.role_in_project)
+            FROM (VALUES %s) AS v(resource_id, project_id, allocation_percentage, start_date, role_in_project)
+            WHERE pr.resource_id = v.resource_id AND pr.project_id = v.project_id
+            AND pr.is_active = TRUE
+            RETURNING pr.resource_id, pr.project_id
+        """, assignments, template=template, page_size=PAGE_SIZE, fetch=True)
+        existing = {tuple(row) for row in rows}
+        updated = len(existing)
+
+        new_rows = [row for row in assignments if (row[0], row[1]) not in existing]
+        if new_rows:
+            rows = execute_values(cursor, """
+                INSERT INTO project_resources (resource_id, project_id, allocation_percentage,
+                                               start_date, role_in_project)
+                SELECT v.resource_id, v.project_id, v.allocation_percentage,
+                       COALESCE(v.start_date, CURRENT_DATE), v.role_in_project
+                FROM (VALUES %s) AS v(resource_id, project_id, allocation_percentage, start_date, role_in_project)
+                RETURNING id
+            """, new_rows, template=template, page_size=PAGE_SIZE, fetch=True)
+            allocated = len(rows)
+
+    return released, updated, allocated
+
+
+def get_resource_statuses(cursor, resource_ids):
+    """Current status of each resource, after the triggers have run"""
+    cursor.execute("SELECT id, status FROM resources WHERE id = ANY(%s)", (list(resource_ids),))
+    return {str(row[0]): row[1] for row in cursor.fetchall()}
@@ -2,13 +2,31 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-import psycopg2
 from psycopg2.extras import RealDictCursor
-import bcrypt
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import os
 from dotenv import load_dotenv
 
+import db
+from db import get_db_connection, read_from_replica
+from overview import invalidate_overview_snapshot
+import response_cache
+import serialization
+import instrumentation
+import auth
+from auth import AuthBusy, check_password, get_user_access, user_has_role
+from response_cache import cached_response, invalidate_tables
+from pagination import MAX_PAGE_SIZE, list_response
+from queries import ROUTE_QUERIES, execute
+from skill_index import MatchError, get_skill_index, parse_match_args
+from search import SearchError, parse_search_args, search
+from capacity import (CapacityError, find_overallocations, get_capacity_index, lock_resources,
+                      parse_window)
+from resource_import import (MAX_IMPORT_ROWS, validate_import, reject_unknown_skills, upsert_resources,
+                             sync_resource_skills)
+from allocations import (MAX_REALLOCATION_MOVES, validate_moves, reject_unknown_references,
+                         apply_moves, get_resource_statuses)
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -18,23 +36,11 @@ app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
 jwt = JWTManager(app)
 CORS(app, origins=["http://localhost:5173"])
 
-# Database configuration
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'database': os.getenv('DB_NAME', 'zapcom_resource_db'),
-    'user': os.getenv('DB_USER', 'postgres'),
-    'password': os.getenv('DB_PASSWORD', 'password'),
-    'port': os.getenv('DB_PORT', '5432')
-}
-
-def get_db_connection():
-    """Get database connection"""
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        return None
+db.init_app(app)
+instrumentation.init_app(app)
+serialization.init_app(app)
+response_cache.init_app(app)
+auth.init_app(jwt)
 
 # Authentication Routes
 @app.route('/api/auth/login', methods=['POST'])
@@ -52,10 +58,11 @@ def login():
             return jsonify({'message': 'Database connection failed'}), 500
             
         cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
+        execute(cursor, ROUTE_QUERIES['user_by_email'], (email,), 'user_by_email')
         user = cursor.fetchone()
         
-        if user and bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+        # Hashing runs on the bounded bcrypt pool, not the request worker
+        if user and user['is_active'] is not False and check_password(password, user['password_hash']):
             access_token = create_access_token(
                 identity=user['id'],
                 additional_claims={
@@ -76,19 +83,30 @@ def login():
         else:
             return jsonify({'message': 'Invalid credentials'}), 401
             
+    except AuthBusy as e:
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'message': f'Login error: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
+
+@app.route('/api/auth/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    """Revoke the token used for this request"""
+    try:
+        auth.revoke_current_token()
+        return jsonify({'message': 'Logged out'}), 200
+        
+    except Exception as e:
+        return jsonify({'message': f'Logout error: {str(e)}'}), 500
 
 # Resource Management Routes
 @app.route('/api/resources', methods=['GET'])
+@read_from_replica
 @jwt_required()
+@cached_response('resources', 'departments', 'resource_skills', 'skills')
 def get_resources():
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         query = """
         SELECT r.*, d.name as department_name,
@@ -98,19 +116,36 @@ def get_resources():
         LEFT JOIN resource_skills rs ON r.id = rs.resource_id
         LEFT JOIN skills s ON rs.skill_id = s.id
         GROUP BY r.id, d.name
-        ORDER BY r.name
         """
         
-        cursor.execute(query)
-        resources = cursor.fetchall()
-        
-        return jsonify([dict(resource) for resource in resources]), 200
+        return list_response(conn, query, [], [('name', 'ASC'), ('id', 'ASC')], sync_table='resources')
         
     except Exception as e:
         return jsonify({'message': f'Error fetching resources: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
+
+@app.route('/api/resources/match', methods=['GET'])
+@jwt_required()
+def match_resources():
+    """Rank active resources by skills and proficiency from the in-memory skill index"""
+    try:
+        try:
+            limit = min(int(request.args.get('limit', 20)), MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return jsonify({'message': 'limit must be a positive integer'}), 400
+        
+        # The index syncs from the primary, so this route does not read from replicas
+        index = get_skill_index(get_db_connection())
+        skills, any_skill, filters = parse_match_args(request.args, index)
+        total, matches = index.match(skills, any_skill, limit, **filters)
+        
+        return jsonify({'data': matches, 'total': total}), 200
+        
+    except MatchError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error matching resources: {str(e)}'}), 500
 
 @app.route('/api/resources', methods=['POST'])
 @jwt_required()
@@ -122,24 +157,21 @@ def create_resource():
         # Verify user has permission
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT role FROM users WHERE id = %s", (user_id,))
-        user = cursor.fetchone()
-        
-        if not user or user['role'] != 'resource_manager':
+        if not user_has_role(user_id, 'resource_manager'):
             return jsonify({'message': 'Unauthorized'}), 403
         
         # Insert resource
         insert_query = """
         INSERT INTO resources (name, email, department_id, role, status, level, 
-                             salary, hire_date, manager_id, location, phone)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                             base_salary, hire_date, location, phone)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         RETURNING id
         """
         
         cursor.execute(insert_query, (
             data['name'], data['email'], data['department_id'], data['role'],
             data.get('status', 'Available'), data.get('level', 'Junior'),
-            data.get('salary'), data.get('hire_date'), data.get('manager_id'),
+            data.get('base_salary'), data.get('hire_date'),
             data.get('location'), data.get('phone')
         ))
         
@@ -147,21 +179,16 @@ def create_resource():
         
         # Add skills if provided
         if 'skills' in data and data['skills']:
-            for skill_id in data['skills']:
-                cursor.execute(
-                    "INSERT INTO resource_skills (resource_id, skill_id) VALUES (%s, %s)",
-                    (resource_id, skill_id)
-                )
+            sync_resource_skills(conn, {resource_id: data['skills']})
         
         conn.commit()
+        invalidate_tables('resources', 'resource_skills')
+        invalidate_overview_snapshot()
         return jsonify({'message': 'Resource created successfully', 'id': resource_id}), 201
         
     except Exception as e:
         conn.rollback()
         return jsonify({'message': f'Error creating resource: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 @app.route('/api/resources/<int:resource_id>', methods=['PUT'])
 @jwt_required()
@@ -174,74 +201,121 @@ def update_resource(resource_id):
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         # Verify permissions
-        cursor.execute("SELECT role FROM users WHERE id = %s", (user_id,))
-        user = cursor.fetchone()
-        
-        if not user or user['role'] != 'resource_manager':
+        if not user_has_role(user_id, 'resource_manager'):
             return jsonify({'message': 'Unauthorized'}), 403
         
         # Update resource
         update_query = """
         UPDATE resources SET 
             name = %s, email = %s, department_id = %s, role = %s,
-            status = %s, level = %s, salary = %s, location = %s, phone = %s
+            status = %s, level = %s, base_salary = COALESCE(%s, base_salary),
+            location = %s, phone = %s
         WHERE id = %s
         """
         
         cursor.execute(update_query, (
             data['name'], data['email'], data['department_id'], data['role'],
-            data['status'], data['level'], data.get('salary'),
+            data['status'], data['level'], data.get('base_salary'),
             data.get('location'), data.get('phone'), resource_id
         ))
         
-        # Update skills
+        # Update skills, touching only the rows that changed
         if 'skills' in data:
-            cursor.execute("DELETE FROM resource_skills WHERE resource_id = %s", (resource_id,))
-            for skill_id in data['skills']:
-                cursor.execute(
-                    "INSERT INTO resource_skills (resource_id, skill_id) VALUES (%s, %s)",
-                    (resource_id, skill_id)
-                )
+            sync_resource_skills(conn, {resource_id: data['skills']})
         
         conn.commit()
+        invalidate_tables('resources', 'resource_skills')
+        invalidate_overview_snapshot()
         return jsonify({'message': 'Resource updated successfully'}), 200
         
     except Exception as e:
         conn.rollback()
         return jsonify({'message': f'Error updating resource: {str(e)}'}), 500
-    finally:
+
+@app.route('/api/resources/bulk', methods=['POST'])
+@jwt_required()
+def bulk_import_resources():
+    conn = None
+    try:
+        data = request.get_json()
+        user_id = get_jwt_identity()
+        rows = data.get('resources') if isinstance(data, dict) else data
+        strict = request.args.get('strict', '').lower() == 'true'
+        
+        if not isinstance(rows, list) or not rows:
+            return jsonify({'message': 'Expected a non-empty list of resources'}), 400
+        if len(rows) > MAX_IMPORT_ROWS:
+            return jsonify({'message': f'Batch exceeds {MAX_IMPORT_ROWS} resources'}), 400
+        
+        conn = get_db_connection()
+        
+        # Verify permissions once for the whole batch
+        if not user_has_role(user_id, 'resource_manager'):
+            return jsonify({'message': 'Unauthorized'}), 403
+        
+        valid, rejects = validate_import(rows)
+        valid = reject_unknown_skills(conn, valid, rejects)
+        
+        if (strict and rejects) or not valid:
+            return jsonify({
+                'message': 'Batch rejected',
+                'received': len(rows),
+                'rejected': len(rejects),
+                'rejects': rejects
+            }), 422
+        
+        ids_by_email, inserted, updated = upsert_resources(conn, valid)
+        
+        desired_skills = {
+            ids_by_email[row['email']]: row['skills']
+            for _, row in valid if row.get('skills') is not None
+        }
+        skills_added, skills_removed = sync_resource_skills(conn, desired_skills)
+        
+        conn.commit()
+        invalidate_tables('resources', 'resource_skills')
+        invalidate_overview_snapshot()
+        
+        return jsonify({
+            'message': 'Resources imported successfully',
+            'received': len(rows),
+            'inserted': inserted,
+            'updated': updated,
+            'skills_added': skills_added,
+            'skills_removed': skills_removed,
+            'rejected': len(rejects),
+            'rejects': rejects,
+            'ids': {row['email']: ids_by_email[row['email']] for _, row in valid}
+        }), 200
+        
+    except Exception as e:
         if conn:
-            conn.close()
+            conn.rollback()
+        return jsonify({'message': f'Error importing resources: {str(e)}'}), 500
 
 # Project Management Routes
 @app.route('/api/projects', methods=['GET'])
+@read_from_replica
 @jwt_required()
+@cached_response('projects', 'clients', 'resources', 'project_resources')
 def get_projects():
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         query = """
         SELECT p.*, c.name as client_name, pm.name as manager_name,
-               COUNT(pa.resource_id) as resource_count
+               COUNT(pr.resource_id) as resource_count
         FROM projects p
         LEFT JOIN clients c ON p.client_id = c.id
         LEFT JOIN resources pm ON p.manager_id = pm.id
-        LEFT JOIN project_allocations pa ON p.id = pa.project_id
+        LEFT JOIN project_resources pr ON p.id = pr.project_id AND pr.is_active = TRUE
         GROUP BY p.id, c.name, pm.name
-        ORDER BY p.start_date DESC
         """
         
-        cursor.execute(query)
-        projects = cursor.fetchall()
-        
-        return jsonify([dict(project) for project in projects]), 200
+        return list_response(conn, query, [], [('start_date', 'DESC'), ('id', 'DESC')], sync_table='projects')
         
     except Exception as e:
         return jsonify({'message': f'Error fetching projects: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 @app.route('/api/projects', methods=['POST'])
 @jwt_required()
@@ -254,10 +328,7 @@ def create_project():
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         # Verify permissions
-        cursor.execute("SELECT role FROM users WHERE id = %s", (user_id,))
-        user = cursor.fetchone()
-        
-        if not user or user['role'] != 'resource_manager':
+        if not user_has_role(user_id, 'resource_manager'):
             return jsonify({'message': 'Unauthorized'}), 403
         
         # Insert project
@@ -277,15 +348,14 @@ def create_project():
         
         project_id = cursor.fetchone()['id']
         conn.commit()
+        invalidate_tables('projects')
+        invalidate_overview_snapshot()
         
         return jsonify({'message': 'Project created successfully', 'id': project_id}), 201
         
     except Exception as e:
         conn.rollback()
         return jsonify({'message': f'Error creating project: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 # Allocation Routes
 @app.route('/api/allocations', methods=['POST'])
@@ -299,18 +369,18 @@ def create_allocation():
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         # Verify permissions
-        cursor.execute("SELECT role FROM users WHERE id = %s", (user_id,))
-        user = cursor.fetchone()
-        
-        if not user or user['role'] != 'resource_manager':
+        if not user_has_role(user_id, 'resource_manager'):
             return jsonify({'message': 'Unauthorized'}), 403
         
+        # Concurrent allocations of the same resource are checked one at a time
+        lock_resources(cursor, [data['resource_id']])
+        
         # Create allocation
         insert_query = """
-        INSERT INTO project_allocations (project_id, resource_id, allocation_percentage,
-                                       start_date, end_date, role_in_project)
+        INSERT INTO project_resources (project_id, resource_id, allocation_percentage,
+                                     start_date, end_date, role_in_project)
         VALUES (%s, %s, %s, %s, %s, %s)
-        RETURNING id
+        RETURNING id, start_date, end_date
         """
         
         cursor.execute(insert_query, (
@@ -318,52 +388,207 @@ def create_allocation():
             data['start_date'], data.get('end_date'), data.get('role_in_project')
         ))
         
-        allocation_id = cursor.fetchone()['id']
-        
-        # Update resource status to Billable
-        cursor.execute(
-            "UPDATE resources SET status = 'Billable' WHERE id = %s",
-            (data['resource_id'],)
-        )
+        allocation = cursor.fetchone()
+        overallocated = find_overallocations(cursor, {
+            data['resource_id']: (allocation['start_date'], allocation['end_date'])
+        })
+        if overallocated and request.args.get('allow_overallocation', '').lower() != 'true':
+            conn.rollback()
+            return jsonify({
+                'message': 'Allocation would overallocate the resource',
+                'overallocated': overallocated
+            }), 409
         
+        # Resource status is maintained by the project_resources triggers
         conn.commit()
-        return jsonify({'message': 'Allocation created successfully', 'id': allocation_id}), 201
+        invalidate_tables('project_resources', 'resources')
+        invalidate_overview_snapshot()
+        response = {'message': 'Allocation created successfully', 'id': allocation['id']}
+        if overallocated:
+            response['overallocated'] = overallocated
+        return jsonify(response), 201
         
     except Exception as e:
         conn.rollback()
         return jsonify({'message': f'Error creating allocation: {str(e)}'}), 500
-    finally:
+
+@app.route('/api/allocations/bulk', methods=['POST'])
+@jwt_required()
+def bulk_reallocate():
+    conn = None
+    try:
+        data = request.get_json()
+        user_id = get_jwt_identity()
+        moves = data.get('moves') if isinstance(data, dict) else data
+        
+        if not isinstance(moves, list) or not moves:
+            return jsonify({'message': 'Expected a non-empty list of moves'}), 400
+        if len(moves) > MAX_REALLOCATION_MOVES:
+            return jsonify({'message': f'Batch exceeds {MAX_REALLOCATION_MOVES} moves'}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # Verify permissions once for the whole batch
+        if not user_has_role(user_id, 'resource_manager'):
+            return jsonify({'message': 'Unauthorized'}), 403
+        
+        # A reallocation plan is applied completely or not at all
+        valid, rejects = validate_moves(moves)
+        if not rejects:
+            valid = reject_unknown_references(cursor, valid, rejects)
+        if rejects:
+            return jsonify({
+                'message': 'Batch rejected',
+                'received': len(moves),
+                'rejected': len(rejects),
+                'rejects': rejects
+            }), 422
+        
+        # Lock the moved resources so the capacity check sees every concurrent batch
+        lock_resources(cursor, {move['resource_id'] for _, move in valid})
+        released, updated, allocated = apply_moves(conn, valid)
+        
+        # Only assignments add load: check each resource from its earliest new start on
+        windows = {}
+        for _, move in valid:
+            if move.get('to_project_id'):
+                start = date.fromisoformat(move['start_date']) if move.get('start_date') else date.today()
+                first = windows.get(move['resource_id'], (start, None))[0]
+                windows[move['resource_id']] = (min(first, start), None)
+        overallocated = find_overallocations(cursor, windows) if windows else []
+        if overallocated and request.args.get('allow_overallocation', '').lower() != 'true':
+            conn.rollback()
+            return jsonify({
+                'message': 'Batch would overallocate resources',
+                'received': len(moves),
+                'overallocated': overallocated
+            }), 409
+        
+        statuses = get_resource_statuses(cursor, {move['resource_id'] for _, move in valid})
+        
+        conn.commit()
+        invalidate_tables('project_resources', 'resources')
+        invalidate_overview_snapshot()
+        
+        response = {
+            'message': 'Resources reallocated successfully',
+            'received': len(moves),
+            'released': released,
+            'updated': updated,
+            'allocated': allocated,
+            'statuses': statuses
+        }
+        if overallocated:
+            response['overallocated'] = overallocated
+        return jsonify(response), 200
+        
+    except Exception as e:
         if conn:
-            conn.close()
+            conn.rollback()
+        return jsonify({'message': f'Error reallocating resources: {str(e)}'}), 500
+
+# Capacity Routes
+@app.route('/api/capacity/resources/<int:resource_id>', methods=['GET'])
+@jwt_required()
+def get_resource_capacity(resource_id):
+    """Allocated and free percentage of a resource over a date window"""
+    try:
+        first, last = parse_window(request.args)
+        # The index syncs from the primary, so capacity routes do not read from replicas
+        index = get_capacity_index(get_db_connection())
+        if resource_id not in index.resources:
+            return jsonify({'message': 'Resource not found'}), 404
+        
+        timeline = index.resource_timeline(resource_id, first, last)
+        return jsonify({
+            'resource_id': resource_id,
+            'from': first.isoformat(),
+            'to': last.isoformat(),
+            'peak_allocation': max(segment['allocated'] for segment in timeline),
+            'timeline': timeline
+        }), 200
+        
+    except CapacityError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error fetching resource capacity: {str(e)}'}), 500
+
+@app.route('/api/capacity/departments/<int:department_id>', methods=['GET'])
+@jwt_required()
+def get_department_capacity(department_id):
+    """Allocated and available FTEs of a department's active resources over a date window"""
+    try:
+        first, last = parse_window(request.args)
+        index = get_capacity_index(get_db_connection())
+        headcount, timeline = index.department_timeline(department_id, first, last)
+        
+        return jsonify({
+            'department_id': department_id,
+            'from': first.isoformat(),
+            'to': last.isoformat(),
+            'headcount': headcount,
+            'timeline': timeline
+        }), 200
+        
+    except CapacityError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error fetching department capacity: {str(e)}'}), 500
+
+@app.route('/api/capacity/available', methods=['GET'])
+@jwt_required()
+def get_available_capacity():
+    """Active resources with at least min_free percent free throughout a date window"""
+    try:
+        try:
+            min_free = int(request.args.get('min_free', 50))
+            limit = min(int(request.args.get('limit', 20)), MAX_PAGE_SIZE)
+            department_id = request.args.get('department_id', type=int)
+            if not 0 <= min_free <= 100 or limit < 1:
+                raise ValueError
+        except ValueError:
+            return jsonify({'message': 'min_free must be 0-100 and limit a positive integer'}), 400
+        
+        first, last = parse_window(request.args)
+        index = get_capacity_index(get_db_connection())
+        total, resources = index.available(first, last, min_free, department_id, limit)
+        
+        return jsonify({
+            'data': resources,
+            'total': total,
+            'from': first.isoformat(),
+            'to': last.isoformat()
+        }), 200
+        
+    except CapacityError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error fetching available capacity: {str(e)}'}), 500
 
 # Analytics Routes
 @app.route('/api/analytics/allocation', methods=['GET'])
+@read_from_replica
 @jwt_required()
+@cached_response('resources', 'departments')
 def get_allocation_analytics():
     try:
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Monthly allocation trends
-        allocation_query = """
-        SELECT 
-            DATE_TRUNC('month', CURRENT_DATE - INTERVAL '5 months' + INTERVAL '%s months') as month,
-            SUM(CASE WHEN status = 'Billable' THEN 1 ELSE 0 END) as billable,
-            SUM(CASE WHEN status = 'Benched' THEN 1 ELSE 0 END) as benched,
-            SUM(CASE WHEN status = 'Shadow' THEN 1 ELSE 0 END) as shadow,
-            SUM(CASE WHEN status = 'Associate' THEN 1 ELSE 0 END) as associate,
-            COUNT(*) as total
-        FROM resources
-        GROUP BY month
-        ORDER BY month
-        """
-        
-        # Current status distribution
+        # Current status distribution, summed from the per-department counters
         status_query = """
-        SELECT status, COUNT(*) as count,
-               ROUND(COUNT(*)::decimal / (SELECT COUNT(*) FROM resources) * 100, 1) as percentage
-        FROM resources
-        GROUP BY status
+        SELECT v.status, SUM(v.count) as count,
+               ROUND(SUM(v.count)::decimal / NULLIF(t.total, 0) * 100, 1) as percentage
+        FROM department_stats s
+        CROSS JOIN LATERAL (VALUES
+            ('Billable', s.billable_resources), ('Benched', s.benched_resources),
+            ('Shadow', s.shadow_resources), ('Available', s.available_resources),
+            ('On Leave', s.on_leave_resources), ('Transition', s.transition_resources)
+        ) AS v(status, count)
+        CROSS JOIN (SELECT SUM(total_resources) AS total FROM department_stats) t
+        GROUP BY v.status, t.total
+        HAVING SUM(v.count) > 0
         ORDER BY count DESC
         """
         
@@ -373,15 +598,14 @@ def get_allocation_analytics():
         # Department utilization
         dept_query = """
         SELECT d.name as department,
-               COUNT(r.id) as total,
-               SUM(CASE WHEN r.status = 'Billable' THEN 1 ELSE 0 END) as billable,
+               COALESCE(s.total_resources, 0) as total,
+               COALESCE(s.billable_resources, 0) as billable,
                ROUND(
-                   SUM(CASE WHEN r.status = 'Billable' THEN 1 ELSE 0 END)::decimal / 
-                   NULLIF(COUNT(r.id), 0) * 100, 1
+                   s.billable_resources::decimal / 
+                   NULLIF(s.total_resources, 0) * 100, 1
                ) as utilization
         FROM departments d
-        LEFT JOIN resources r ON d.id = r.department_id
-        GROUP BY d.name
+        LEFT JOIN department_stats s ON s.department_id = d.id
         ORDER BY utilization DESC
         """
         
@@ -395,12 +619,11 @@ def get_allocation_analytics():
         
     except Exception as e:
         return jsonify({'message': f'Error fetching analytics: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 @app.route('/api/analytics/skills', methods=['GET'])
+@read_from_replica
 @jwt_required()
+@cached_response('skills', 'resource_skills')
 def get_skills_analytics():
     try:
         conn = get_db_connection()
@@ -426,12 +649,11 @@ def get_skills_analytics():
         
     except Exception as e:
         return jsonify({'message': f'Error fetching skills analytics: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 @app.route('/api/analytics/bench', methods=['GET'])
+@read_from_replica
 @jwt_required()
+@cached_response('resources')
 def get_bench_analytics():
     try:
         conn = get_db_connection()
@@ -442,7 +664,7 @@ def get_bench_analytics():
         SELECT bench_reason as reason,
                COUNT(*) as count,
                ROUND(COUNT(*)::decimal / (SELECT COUNT(*) FROM resources WHERE status = 'Benched') * 100, 1) as percentage,
-               AVG(EXTRACT(days FROM (CURRENT_DATE - bench_start_date))) as avg_days
+               AVG(CURRENT_DATE - bench_start_date) as avg_days
         FROM resources
         WHERE status = 'Benched' AND bench_reason IS NOT NULL
         GROUP BY bench_reason
@@ -454,9 +676,9 @@ def get_bench_analytics():
         
         # Bench cost calculation
         cost_query = """
-        SELECT SUM(salary / 12) as monthly_cost
+        SELECT SUM(base_salary / 12) as monthly_cost
         FROM resources
-        WHERE status = 'Benched' AND salary IS NOT NULL
+        WHERE status = 'Benched' AND base_salary IS NOT NULL
         """
         
         cursor.execute(cost_query)
@@ -469,13 +691,12 @@ def get_bench_analytics():
         
     except Exception as e:
         return jsonify({'message': f'Error fetching bench analytics: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 # Utility Routes
 @app.route('/api/departments', methods=['GET'])
+@read_from_replica
 @jwt_required()
+@cached_response('departments')
 def get_departments():
     try:
         conn = get_db_connection()
@@ -488,12 +709,11 @@ def get_departments():
         
     except Exception as e:
         return jsonify({'message': f'Error fetching departments: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 @app.route('/api/skills', methods=['GET'])
+@read_from_replica
 @jwt_required()
+@cached_response('skills')
 def get_skills():
     try:
         conn = get_db_connection()
@@ -506,12 +726,11 @@ def get_skills():
         
     except Exception as e:
         return jsonify({'message': f'Error fetching skills: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 @app.route('/api/clients', methods=['GET'])
+@read_from_replica
 @jwt_required()
+@cached_response('clients')
 def get_clients():
     try:
         conn = get_db_connection()
@@ -524,14 +743,39 @@ def get_clients():
         
     except Exception as e:
         return jsonify({'message': f'Error fetching clients: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
+
+@app.route('/api/search', methods=['GET'])
+@read_from_replica
+@jwt_required()
+def search_entities():
+    """Typeahead search across resources, projects and clients"""
+    try:
+        term, types, limit = parse_search_args(request.args)
+        access = get_user_access(get_jwt_identity())
+        if not access or not access['is_active']:
+            return jsonify({'message': 'Unauthorized'}), 403
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        matches = search(cursor, term, types, limit, access['role'])
+        
+        return jsonify({'data': matches, 'query': term}), 200
+        
+    except SearchError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error searching: {str(e)}'}), 500
 
 # Health check
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()}), 200
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.utcnow().isoformat(),
+        'db_pool': db.get_pool_stats(),
+        'db_replicas': db.get_replica_stats(),
+        'cache': response_cache.get_cache_stats()
+    }), 200
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
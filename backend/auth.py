@@ -0,0 +1,281 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import bcrypt
+from flask_jwt_extended import get_jwt
+
+from db import get_db_connection, get_pool
+from response_cache import invalidate_tables, table_versions
+
+# Password checks run on real OS threads (bcrypt releases the GIL), so a
+# login storm never stalls the gevent hub. PASSWORD_HASH_MAX_PENDING bounds
+# how many logins may wait for a hashing thread before we shed load.
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 4))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 64))
+
+# Seconds a user's role/active status is trusted before it is re-read
+USER_ACCESS_TTL = float(os.getenv('USER_ACCESS_TTL', 60))
+
+# Revoked-user entries must outlive every token issued before the revocation
+TOKEN_MAX_AGE = int(os.getenv('JWT_ACCESS_TOKEN_MAX_AGE', 24 * 3600))
+
+# Seconds a process trusts its copy of the revocation list. A revocation
+# bumps the token_revocations cache version, which reloads the copy at once
+# wherever that version is shared (every process with RedisCache); the TTL
+# bounds how late other processes see it with the per-process cache.
+REVOCATION_REFRESH_TTL = float(os.getenv('REVOCATION_REFRESH_TTL', 5))
+
+# Revocations live in token_revocations on the primary, so every worker and
+# serving mode sees them and nothing evicts them before they expire
+REVOKE_QUERY = """
+    WITH purged AS (DELETE FROM token_revocations WHERE expires_at <= now())
+    INSERT INTO token_revocations (revocation_key, revoked_at, expires_at)
+    VALUES (%s, to_timestamp(%s), to_timestamp(%s))
+    ON CONFLICT (revocation_key) DO UPDATE
+    SET revoked_at = EXCLUDED.revoked_at,
+        expires_at = GREATEST(token_revocations.expires_at, EXCLUDED.expires_at)
+"""
+
+# Every live revocation, loaded into each process's copy of the list
+REVOCATIONS_QUERY = """
+    SELECT revocation_key, EXTRACT(EPOCH FROM revoked_at)::float8, EXTRACT(EPOCH FROM expires_at)::float8
+    FROM token_revocations
+    WHERE expires_at > now()
+"""
+
+
+class AuthBusy(Exception):
+    """Raised when too many password checks are already queued"""
+
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+
+def _get_hash_pool():
+    global _hash_pool
+    if _hash_pool is None:
+        with _hash_pool_lock:
+            if _hash_pool is None:
+                try:
+                    from gevent import monkey
+                    patched = monkey.is_module_patched('threading')
+                except ImportError:
+                    patched = False
+                if patched:
+                    # Patched threads are greenlets; gevent's pool uses native threads
+                    from gevent.threadpool import ThreadPool
+                    _hash_pool = ThreadPool(PASSWORD_HASH_WORKERS)
+                else:
+                    _hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                                    thread_name_prefix='bcrypt')
+    return _hash_pool
+
+
+def check_password(password, password_hash):
+    """Verify a password on the hashing pool, blocking only the calling request"""
+    if not _hash_slots.acquire(blocking=False):
+        raise AuthBusy('Too many concurrent logins, please retry')
+    try:
+        pool = _get_hash_pool()
+        args = (password.encode('utf-8'), password_hash.encode('utf-8'))
+        if isinstance(pool, ThreadPoolExecutor):
+            return pool.submit(bcrypt.checkpw, *args).result()
+        return pool.apply(bcrypt.checkpw, args)
+    finally:
+        _hash_slots.release()
+
+
+_user_access = {}
+_user_access_lock = threading.Lock()
+
+
+def get_user_access(user_id):
+    """Role and active flag for a user, served from a TTL cache"""
+    now = time.monotonic()
+    with _user_access_lock:
+        entry = _user_access.get(user_id)
+        if entry and entry[0] > now:
+            return entry[1]
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT role, COALESCE(is_active, TRUE) FROM users WHERE id = %s", (user_id,))
+    row = cursor.fetchone()
+    access = {'role': row[0], 'is_active': row[1]} if row else None
+
+    with _user_access_lock:
+        _user_access[user_id] = (now + USER_ACCESS_TTL, access)
+    return access
+
+
+def invalidate_user_access(user_id=None):
+    """Drop one user's cached access, or everyone's when ``user_id`` is None"""
+    with _user_access_lock:
+        if user_id is None:
+            _user_access.clear()
+        else:
+            _user_access.pop(user_id, None)
+
+
+def user_has_role(user_id, *roles):
+    """True if the user is active and holds one of ``roles``"""
+    access = get_user_access(user_id)
+    return bool(access) and access['is_active'] and access['role'] in roles
+
+
+def claims_have_role(claims, *roles):
+    """True if access token ``claims`` carry one of ``roles``; the check behind ``require_role``"""
+    return claims.get('role') in roles
+
+
+@contextmanager
+def _revocation_cursor():
+    """Cursor on a primary connection of its own, committed on exit.
+
+    Revocation loads run before the route takes its connection, which may
+    be a replica, and writes must not depend on the route committing.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn:
+            yield conn.cursor()
+    finally:
+        pool.putconn(conn)
+
+
+# Revocation key -> (revoked_at, expires_at) as epoch seconds, with the cache
+# version and time it was loaded at
+_revocations = None
+_revocations_version = None
+_revocations_at = 0.0
+_revocations_lock = threading.Lock()
+_async_revocations_lock = None
+
+
+def _revocations_stale(version):
+    return (_revocations is None or version != _revocations_version
+            or time.monotonic() - _revocations_at >= REVOCATION_REFRESH_TTL)
+
+
+def _store_revocations(rows, version):
+    global _revocations, _revocations_version, _revocations_at
+    _revocations = {key: (revoked_at, expires_at) for key, revoked_at, expires_at in rows}
+    _revocations_version = version
+    _revocations_at = time.monotonic()
+    return _revocations
+
+
+def _current_revocations():
+    """This process's copy of the revocation list, reloaded when stale.
+
+    Only one request reloads it; the others keep checking the previous copy
+    until the reload lands, like the overview snapshot.
+    """
+    version = table_versions('token_revocations')[0]
+    if not _revocations_stale(version):
+        return _revocations
+    if _revocations is not None and not _revocations_lock.acquire(blocking=False):
+        return _revocations
+    if _revocations is None:
+        _revocations_lock.acquire()
+    try:
+        if _revocations_stale(version):
+            with _revocation_cursor() as cursor:
+                cursor.execute(REVOCATIONS_QUERY)
+                _store_revocations(cursor.fetchall(), version)
+        return _revocations
+    finally:
+        _revocations_lock.release()
+
+
+async def _current_revocations_async(pool):
+    """``_current_revocations`` for an asyncpg pool connected to the primary"""
+    global _async_revocations_lock
+    version = table_versions('token_revocations')[0]
+    if not _revocations_stale(version):
+        return _revocations
+    if _async_revocations_lock is None:
+        _async_revocations_lock = asyncio.Lock()
+    if _revocations is not None and _async_revocations_lock.locked():
+        return _revocations
+    async with _async_revocations_lock:
+        if _revocations_stale(version):
+            async with pool.acquire() as conn:
+                rows = await conn.fetch(REVOCATIONS_QUERY)
+            _store_revocations([tuple(row) for row in rows], version)
+        return _revocations
+
+
+def _issued_at(jwt_payload):
+    # iat has whole-second resolution; issued_at_ms tells apart tokens issued
+    # in the same second as a user revocation
+    if 'issued_at_ms' in jwt_payload:
+        return jwt_payload['issued_at_ms'] / 1000
+    return jwt_payload.get('iat', 0)
+
+
+def _is_revoked(revocations, jwt_payload):
+    now = time.time()
+    token = revocations.get(f"token:{jwt_payload.get('jti')}")
+    if token is not None and token[1] > now:
+        return True
+    user = revocations.get(f"user:{jwt_payload.get('sub')}")
+    return user is not None and user[1] > now and _issued_at(jwt_payload) < user[0]
+
+
+def _revoke(key, revoked_at, expires_at):
+    with _revocation_cursor() as cursor:
+        cursor.execute(REVOKE_QUERY, (key, revoked_at, expires_at))
+    # Every process sharing the cache version reloads its copy on its next check
+    invalidate_tables('token_revocations')
+
+
+def revoke_token(jti, expires_at):
+    """Add a single token to the revocation list until it would have expired"""
+    _revoke(f"token:{jti}", time.time(), expires_at)
+
+
+def revoke_user(user_id):
+    """Revoke every token issued to a user up to now and forget their cached access"""
+    now = time.time()
+    _revoke(f"user:{user_id}", now, now + TOKEN_MAX_AGE)
+    invalidate_user_access(user_id)
+
+
+def is_token_revoked(jwt_header, jwt_payload):
+    """Check a token against this process's copy of the revocation list.
+
+    No query runs unless the copy is stale, so reads routed to a replica
+    never touch the primary on the way.
+    """
+    return _is_revoked(_current_revocations(), jwt_payload)
+
+
+async def is_token_revoked_async(pool, jwt_payload):
+    """``is_token_revoked`` on an asyncpg pool connected to the primary.
+
+    Reads the cache version, so it must run inside a Flask app context.
+    """
+    return _is_revoked(await _current_revocations_async(pool), jwt_payload)
+
+
+def revoke_current_token():
+    claims = get_jwt()
+    revoke_token(claims['jti'], claims['exp'])
+
+
+def issued_at_claims(identity):
+    return {'issued_at_ms': int(time.time() * 1000)}
+
+
+def init_app(jwt):
+    """Stamp tokens with a precise issue time and check every protected request for revocation"""
+    jwt.additional_claims_loader(issued_at_claims)
+    jwt.token_in_blocklist_loader(is_token_revoked)
@@ -0,0 +1,380 @@
+"""Per-endpoint benchmark for every route in ``app.py`` and ``enterprise_app.py``.
+
+Each route is driven in-process through the Flask test client against the
+database named by the usual DB_* variables (load it with ``datagen.py``
+first). For every endpoint the report shows p50/p95 latency, SQL queries,
+rows fetched and bytes sent per request, and the peak Python memory of a
+single request. Results are compared with a stored baseline and the run
+exits non-zero on a regression. A 5xx response stops the run, so a broken
+route is never recorded as a baseline.
+
+    DB_NAME=itdd_bench python datagen.py --scale small --reset
+    DB_NAME=itdd_bench python benchmark.py                    # compare
+    DB_NAME=itdd_bench python benchmark.py --update-baseline  # record
+
+Response, overview, health-input and role caches are cleared before every
+request so the database path is measured; ``--warm`` keeps them. Write
+routes change the data, so reload with ``--reset`` before recording a
+baseline. Query counts do not depend on the machine; latencies do, so
+record the baseline on the machine that runs the comparison.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import numpy as np
+import psycopg2
+from flask_jwt_extended import create_access_token
+
+import app as legacy_app
+import enterprise_app
+import instrumentation
+from auth import invalidate_user_access
+from db import DB_CONFIG
+from health_engine import invalidate_health_inputs
+from overview import invalidate_overview_snapshot
+from response_cache import cache
+from skill_index import invalidate_skill_index
+from capacity import invalidate_capacity_index
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# Allowed growth over the baseline before an endpoint is reported
+LATENCY_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.5
+# Differences below these are noise whatever the ratio
+LATENCY_FLOOR_MS = 5.0
+MEMORY_FLOOR_KB = 256
+
+APPS = {'legacy': legacy_app.app, 'enterprise': enterprise_app.app}
+
+
+class Case:
+    """One request to benchmark.
+
+    ``path`` and ``body`` may be callables taking ``(fixtures, iteration)``
+    so write routes can touch different rows on every iteration. ``check``
+    takes ``(body, json)`` and returns an error message when the response
+    did not do what the request asked.
+    """
+
+    def __init__(self, app, method, path, role='admin', body=None, stream=False, fresh_token=False, name=None,
+                 check=None):
+        self.app = app
+        self.method = method
+        self.path = path
+        self.role = role
+        self.body = body
+        self.stream = stream
+        self.fresh_token = fresh_token
+        self.check = check
+        self.name = name or f"{app} {method} {path if isinstance(path, str) else path(None, None)}"
+
+
+def _resource(fixtures, i):
+    return fixtures['resource_ids'][i % len(fixtures['resource_ids'])]
+
+
+def _free_resource(fixtures, i):
+    return fixtures['free_resource_ids'][i % len(fixtures['free_resource_ids'])]
+
+
+def _project(fixtures, i):
+    return fixtures['project_ids'][i % len(fixtures['project_ids'])]
+
+
+def _new_resource(fixtures, i, n=0, kind='new'):
+    # Each write case gets its own emails; bulk import matches rows on email
+    key = f"{fixtures['run']}-{kind}-{i}-{n}"
+    return {'name': f'Bench Resource {key}', 'email': f'bench-{key}@example.com',
+            'department_id': fixtures['department_id'], 'role': 'Software Engineer'}
+
+
+def _check_import(body, result):
+    if result.get('inserted') != len(body['resources']) or result.get('rejected'):
+        return f"imported {result.get('inserted')} of {len(body['resources'])} resources: {result}"
+    return None
+
+
+def _metric_rows(fixtures, i):
+    today = date.today()
+    return {'rows': [{'project_id': _project(fixtures, i + n), 'metric_date': (today - timedelta(days=n)).isoformat(),
+                      'commits_count': n} for n in range(100)]}
+
+
+def build_cases():
+    """Every route of both apps; ``static`` is left out"""
+    today = date.today().isoformat()
+    cases = [
+        Case('legacy', 'GET', '/api/health'),
+        Case('legacy', 'POST', '/api/auth/login', role=None,
+             body={'email': 'admin@zapcg.com', 'password': 'benchmark-wrong-password'}),
+        Case('legacy', 'POST', '/api/auth/logout', fresh_token=True),
+        Case('legacy', 'GET', '/api/departments'),
+        Case('legacy', 'GET', '/api/skills'),
+        Case('legacy', 'GET', '/api/clients'),
+        Case('legacy', 'GET', '/api/resources'),
+        Case('legacy', 'GET', '/api/resources/match?skills=1:2,2:2&match=any&status=Available,Benched'),
+        Case('legacy', 'GET', '/api/capacity/available?min_free=50&department_id=1'),
+        Case('legacy', 'GET', '/api/search?q=resource%2042'),
+        Case('legacy', 'POST', '/api/resources', role='resource_manager', body=_new_resource),
+        Case('legacy', 'PUT', lambda f, i: f'/api/resources/{_resource(f, i) if f else "<id>"}',
+             role='resource_manager',
+             body=lambda f, i: {**_new_resource(f, i, kind='put'), 'status': 'Available', 'level': 'Mid',
+                                'location': 'Pune'}),
+        Case('legacy', 'POST', '/api/resources/bulk', role='resource_manager',
+             body=lambda f, i: {'resources': [dict(_new_resource(f, i, n, 'bulk'), base_salary=60000, hire_date=today)
+                                              for n in range(20)]},
+             check=_check_import),
+        Case('legacy', 'GET', '/api/projects'),
+        Case('legacy', 'POST', '/api/projects', role='resource_manager',
+             body=lambda f, i: {'name': f"Bench Project {f['run']}-{i}", 'client_id': f['client_id'],
+                                'manager_id': _resource(f, i), 'start_date': today, 'end_date': today}),
+        Case('legacy', 'POST', '/api/allocations', role='resource_manager',
+             body=lambda f, i: {'project_id': _project(f, i), 'resource_id': _free_resource(f, i),
+                                'allocation_percentage': 10, 'start_date': today}),
+        Case('legacy', 'POST', '/api/allocations/bulk', role='resource_manager',
+             body=lambda f, i: {'moves': [{'resource_id': _free_resource(f, i * 20 + n),
+                                           'to_project_id': _project(f, i), 'allocation_percentage': 10}
+                                          for n in range(20)]}),
+        Case('legacy', 'GET', '/api/analytics/allocation'),
+        Case('legacy', 'GET', '/api/analytics/bench'),
+        Case('legacy', 'GET', '/api/analytics/skills'),
+        Case('legacy', 'GET', '/api/metrics'),
+        Case('legacy', 'GET', '/api/metrics/slow-queries'),
+
+        Case('enterprise', 'GET', '/api/health'),
+        Case('enterprise', 'POST', '/api/auth/login', role=None,
+             body={'email': 'admin@zapcg.com', 'password': 'benchmark-wrong-password'}),
+        Case('enterprise', 'POST', '/api/auth/logout', fresh_token=True),
+        Case('enterprise', 'POST', '/api/auth/revoke/0'),
+        Case('enterprise', 'GET', '/api/changes/stream', stream=True),
+        Case('enterprise', 'GET', '/api/dashboard/overview'),
+        Case('enterprise', 'GET', '/api/deliverables'),
+        Case('enterprise', 'GET', '/api/departments/performance'),
+        Case('enterprise', 'GET', '/api/escalations'),
+        Case('enterprise', 'GET', '/api/financial/overview', role='hr'),
+        Case('enterprise', 'GET', '/api/hr/resources', role='hr'),
+        Case('enterprise', 'GET', '/api/kpis/company'),
+        Case('enterprise', 'GET', '/api/metrics'),
+        Case('enterprise', 'GET', '/api/metrics/engineering'),
+        Case('enterprise', 'POST', '/api/metrics/engineering/bulk', body=_metric_rows),
+        Case('enterprise', 'GET', '/api/metrics/qa'),
+        Case('enterprise', 'POST', '/api/metrics/qa/bulk', body=_metric_rows),
+        Case('enterprise', 'GET', '/api/metrics/slow-queries'),
+        Case('enterprise', 'GET', '/api/projects/health'),
+        Case('enterprise', 'POST', '/api/projects/health/refresh'),
+        Case('enterprise', 'POST', '/api/projects/health/what-if', body={'shift_end_days': 14, 'add_hours': 40})
+    ]
+    for dataset in enterprise_app.EXPORT_DATASETS:
+        cases.append(Case('enterprise', 'GET', f'/api/exports/{dataset}?format=csv', role='hr'))
+    return cases
+
+
+def load_fixtures(conn):
+    """Ids the cases need, read from the loaded database"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM resources WHERE is_active = true ORDER BY id LIMIT 200")
+    resource_ids = [row[0] for row in cursor.fetchall()]
+    # Allocation cases add 10% at a time, so they use resources with room for it
+    cursor.execute("""
+        SELECT r.id FROM resources r
+        LEFT JOIN project_resources pr ON pr.resource_id = r.id AND pr.is_active = true
+        WHERE r.is_active = true
+        GROUP BY r.id HAVING COALESCE(SUM(pr.allocation_percentage), 0) <= 50
+        ORDER BY r.id LIMIT 200
+    """)
+    free_resource_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT id FROM projects WHERE status = 'In Progress' ORDER BY id LIMIT 50")
+    project_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT MIN(id) FROM departments")
+    department_id = cursor.fetchone()[0]
+    cursor.execute("SELECT MIN(id) FROM clients")
+    client_id = cursor.fetchone()[0]
+    cursor.execute("SELECT DISTINCT ON (role) role, id, email FROM users WHERE is_active IS NOT false ORDER BY role, id")
+    users = {role: (user_id, email) for role, user_id, email in cursor.fetchall()}
+    cursor.execute("""
+        SELECT (SELECT COUNT(*) FROM resources), (SELECT COUNT(*) FROM projects),
+               (SELECT COUNT(*) FROM deliverables), (SELECT COUNT(*) FROM engineering_metrics)
+    """)
+    sizes = dict(zip(('resources', 'projects', 'deliverables', 'engineering_metrics'), cursor.fetchone()))
+
+    if not resource_ids or not free_resource_ids or not project_ids or department_id is None or client_id is None:
+        raise SystemExit('Database has no benchmark data; load it with datagen.py first')
+    return {'resource_ids': resource_ids, 'free_resource_ids': free_resource_ids, 'project_ids': project_ids,
+            'department_id': department_id, 'client_id': client_id, 'users': users, 'sizes': sizes,
+            'run': int(time.time())}
+
+
+class Runner:
+    def __init__(self, fixtures, warm=False):
+        self.fixtures = fixtures
+        self.warm = warm
+        self.clients = {name: flask_app.test_client() for name, flask_app in APPS.items()}
+        self._tokens = {}
+
+    def token(self, app_name, role, fresh=False):
+        if role not in self.fixtures['users']:
+            raise SystemExit(f'No active {role} user in the users table')
+        if fresh or (app_name, role) not in self._tokens:
+            user_id, email = self.fixtures['users'][role]
+            with APPS[app_name].app_context():
+                token = create_access_token(identity=user_id, additional_claims={'email': email, 'role': role})
+            if fresh:
+                return token
+            self._tokens[app_name, role] = token
+        return self._tokens[app_name, role]
+
+    def clear_caches(self):
+        cache.clear()
+        invalidate_overview_snapshot()
+        invalidate_health_inputs()
+        invalidate_skill_index()
+        invalidate_capacity_index()
+        invalidate_user_access()
+
+    def request(self, case, iteration):
+        """Send one request; returns ``(status, body_bytes, seconds)``"""
+        path = case.path(self.fixtures, iteration) if callable(case.path) else case.path
+        body = case.body(self.fixtures, iteration) if callable(case.body) else case.body
+        headers = {}
+        if case.role:
+            headers['Authorization'] = f'Bearer {self.token(case.app, case.role, case.fresh_token)}'
+        if not self.warm:
+            self.clear_caches()
+
+        started = time.perf_counter()
+        response = self.clients[case.app].open(path, method=case.method, json=body, headers=headers,
+                                               buffered=not case.stream)
+        if case.stream:
+            # Time to the first event frame; the stream itself never ends
+            size = len(next(iter(response.response)))
+        else:
+            size = len(response.get_data())
+        elapsed = time.perf_counter() - started
+        response.close()
+        if response.status_code >= 500:
+            message = (response.get_json(silent=True) or {}).get('message', '')
+            raise SystemExit(f'{case.name}: status {response.status_code} {message}'.rstrip())
+        if case.check:
+            error = case.check(body, response.get_json(silent=True) or {})
+            if error:
+                raise SystemExit(f'{case.name}: {error}')
+        return response.status_code, size, elapsed
+
+    def run(self, case, iterations):
+        self.request(case, -1)
+
+        before = instrumentation.route_totals()
+        timings = []
+        statuses = set()
+        size = 0
+        for iteration in range(iterations):
+            status, size, elapsed = self.request(case, iteration)
+            statuses.add(status)
+            timings.append(elapsed * 1000)
+        after = instrumentation.route_totals()
+
+        queries = rows = 0
+        for key, totals in after.items():
+            previous = before.get(key, {})
+            queries += totals['queries'] - previous.get('queries', 0)
+            rows += totals['rows'] - previous.get('rows', 0)
+
+        tracemalloc.start()
+        self.request(case, iterations)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            'status': max(statuses),
+            'p50_ms': round(float(np.percentile(timings, 50)), 2),
+            'p95_ms': round(float(np.percentile(timings, 95)), 2),
+            'queries': round(queries / iterations, 2),
+            'rows': round(rows / iterations, 1),
+            'bytes': size,
+            'peak_kb': round(peak / 1024, 1)
+        }
+
+
+def compare(baseline, results, latency_tolerance=LATENCY_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """Regressions of ``results`` against ``baseline``, one message each"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['status'] != base['status']:
+            regressions.append(f"{name}: status {base['status']} -> {result['status']}")
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: queries {base['queries']} -> {result['queries']}")
+        if (result['p50_ms'] > base['p50_ms'] * (1 + latency_tolerance)
+                and result['p50_ms'] - base['p50_ms'] > LATENCY_FLOOR_MS):
+            regressions.append(f"{name}: p50 {base['p50_ms']}ms -> {result['p50_ms']}ms")
+        if (result['peak_kb'] > base['peak_kb'] * (1 + memory_tolerance)
+                and result['peak_kb'] - base['peak_kb'] > MEMORY_FLOOR_KB):
+            regressions.append(f"{name}: peak memory {base['peak_kb']}KB -> {result['peak_kb']}KB")
+    return regressions
+
+
+def print_report(results):
+    width = max(len(name) for name in results)
+    print(f"{'endpoint':<{width}}  status   p50 ms   p95 ms  queries      rows     bytes   peak KB")
+    for name, r in results.items():
+        print(f"{name:<{width}}  {r['status']:>6} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['queries']:>8} "
+              f"{r['rows']:>9} {r['bytes']:>9} {r['peak_kb']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every API route against the configured database')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--only', help='run endpoints whose name contains this text')
+    parser.add_argument('--warm', action='store_true', help='keep response and snapshot caches between requests')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help='record this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=LATENCY_TOLERANCE, help='allowed p50 latency growth')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        fixtures = load_fixtures(conn)
+    finally:
+        conn.close()
+
+    runner = Runner(fixtures, warm=args.warm)
+    results = {}
+    for case in build_cases():
+        if args.only and args.only not in case.name:
+            continue
+        results[case.name] = runner.run(case, args.iterations)
+    print_report(results)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'sizes': fixtures['sizes'], 'iterations': args.iterations, 'warm': args.warm,
+                       'endpoints': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline written to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}; run with --update-baseline')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['sizes'] != fixtures['sizes']:
+        print(f"Warning: baseline was recorded against {baseline['sizes']}, database has {fixtures['sizes']}")
+
+    regressions = compare(baseline['endpoints'], results, args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    print(f"{len(regressions)} regression(s) across {len(results)} endpoint(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
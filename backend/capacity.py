@@ -0,0 +1,379 @@
+"""Allocation capacity engine: sorted-segment load timelines per resource.
+
+A resource's active allocations fold into a step function: sorted segment
+start days, each with the summed allocation percentage up to the next start.
+A point lookup is one bisect, a window walks only the segments inside it,
+and overallocation is any segment above FULL_CAPACITY. Days are date
+ordinals; an allocation without an end date runs to OPEN_END.
+
+Writes check overallocation against the database inside their own
+transaction (``find_overallocations``). Reads are served by a process-wide
+``CapacityIndex`` kept in sync like the skill index. It is loaded once, then
+patched from the project_resources and resources deltas (``updated_at``
+plus sync tombstones) whenever a write invalidates either table, and at
+least every CAPACITY_INDEX_SYNC_INTERVAL seconds. Department timelines merge
+their members' allocations on first use after a change. The free-capacity
+search runs over one flat array of every resource's segments.
+"""
+import os
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, timedelta
+from itertools import accumulate
+
+import numpy as np
+
+from pagination import SYNC_TOKEN_QUERY
+from response_cache import table_versions
+
+# Seconds between delta syncs when no write has invalidated the index
+CAPACITY_INDEX_SYNC_INTERVAL = float(os.getenv('CAPACITY_INDEX_SYNC_INTERVAL', 30))
+# Default and longest window for timelines and searches, in days
+DEFAULT_WINDOW_DAYS = 90
+MAX_WINDOW_DAYS = int(os.getenv('CAPACITY_MAX_WINDOW_DAYS', 3 * 366))
+
+CAPACITY_INDEX_TABLES = ('project_resources', 'resources')
+
+FULL_CAPACITY = 100
+OPEN_END = date.max.toordinal()
+
+ALLOCATIONS_QUERY = """
+    SELECT id, resource_id, start_date, end_date, allocation_percentage,
+           is_active AND allocation_percentage > 0 AS counts
+    FROM project_resources
+"""
+
+RESOURCES_QUERY = """
+    SELECT id, name, department_id, COALESCE(is_active, TRUE) AS is_active
+    FROM resources
+"""
+
+TOMBSTONES_QUERY = """
+    SELECT row_id FROM sync_tombstones WHERE table_name = %s AND deleted_at >= %s
+"""
+
+
+class CapacityError(ValueError):
+    """Raised when a capacity query is invalid"""
+
+
+def _interval(start_date, end_date, percentage):
+    start = start_date.toordinal() if start_date else date.today().toordinal()
+    return start, end_date.toordinal() if end_date else OPEN_END, percentage
+
+
+def segments(intervals):
+    """Step function of the summed percentage of ``(start, end, percentage)`` intervals.
+
+    Returns ``(starts, loads)``: ``loads[i]`` holds from ``starts[i]`` until
+    the next start. The load is zero before the first start.
+    """
+    events = defaultdict(int)
+    for start, end, percentage in intervals:
+        events[start] += percentage
+        if end < OPEN_END:
+            events[end + 1] -= percentage
+    starts = sorted(events)
+    return starts, list(accumulate(events[day] for day in starts))
+
+
+def window(starts, loads, first, last):
+    """``(start, end, load)`` segments covering the days ``first`` to ``last``"""
+    i = bisect_right(starts, first) - 1
+    load = loads[i] if i >= 0 else 0
+    covered = []
+    segment_start = first
+    for j in range(i + 1, len(starts)):
+        if starts[j] > last:
+            break
+        if loads[j] != load:
+            covered.append((segment_start, starts[j] - 1, load))
+            segment_start, load = starts[j], loads[j]
+    covered.append((segment_start, last, load))
+    return covered
+
+
+def overallocated(starts, loads, first=0, last=OPEN_END):
+    """Segments between ``first`` and ``last`` loaded above FULL_CAPACITY"""
+    return [segment for segment in window(starts, loads, first, last) if segment[2] > FULL_CAPACITY]
+
+
+def _day(ordinal):
+    return date.fromordinal(ordinal).isoformat() if ordinal < OPEN_END else None
+
+
+def lock_resources(cursor, resource_ids):
+    """Serialize allocation writes per resource until the transaction ends.
+
+    Rows are locked in id order, so concurrent batches cannot deadlock.
+    """
+    cursor.execute("SELECT id FROM resources WHERE id = ANY(%s) ORDER BY id FOR UPDATE",
+                   (sorted(resource_ids),))
+
+
+def find_overallocations(cursor, windows):
+    """Overallocated periods as the current transaction sees them.
+
+    ``windows`` maps resource ids to the ``(first, last)`` dates to check.
+    Returns one entry per period above FULL_CAPACITY.
+    """
+    cursor = cursor.connection.cursor()
+    cursor.execute("""
+        SELECT resource_id, start_date, end_date, allocation_percentage
+        FROM project_resources
+        WHERE resource_id = ANY(%s) AND is_active = TRUE AND allocation_percentage > 0
+    """, (list(windows),))
+    intervals = defaultdict(list)
+    for resource_id, start_date, end_date, percentage in cursor.fetchall():
+        intervals[resource_id].append(_interval(start_date, end_date, percentage))
+
+    conflicts = []
+    for resource_id in sorted(intervals):
+        first, last = windows[resource_id]
+        starts, loads = segments(intervals[resource_id])
+        for start, end, load in overallocated(starts, loads, first.toordinal(),
+                                              last.toordinal() if last else OPEN_END):
+            conflicts.append({'resource_id': resource_id, 'start': _day(start), 'end': _day(end),
+                              'allocation_percentage': load})
+    return conflicts
+
+
+class CapacityIndex:
+    """Immutable snapshot of every active allocation, as per-resource segments.
+
+    ``updated`` returns a new index with a delta applied.
+    """
+
+    def __init__(self):
+        self.allocations = {}
+        self.by_resource = {}
+        self.segments = {}
+        self.resources = {}
+        self.members = {}
+        self.positions = {}
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.departments = np.zeros(0, dtype=np.int64)
+        self.active = np.zeros(0, dtype=bool)
+        # Every resource's segments: position, first day, last day, load
+        self.flat = tuple(np.zeros(0, dtype=np.int64) for _ in range(4))
+        self._department_segments = {}
+
+    def updated(self, allocations, deleted_allocations, resources, deleted_resources):
+        """New index with changed allocation and resource rows replaced and deleted ids removed"""
+        index = CapacityIndex()
+        index.allocations = dict(self.allocations)
+        index.by_resource = dict(self.by_resource)
+        index.segments = dict(self.segments)
+        index.resources = dict(self.resources)
+        index.members = dict(self.members)
+        index.positions = dict(self.positions)
+
+        changed = set()
+        for allocation_id, resource_id, start_date, end_date, percentage, counts in allocations:
+            previous = index.allocations.pop(allocation_id, None)
+            if previous is not None:
+                changed.add(previous[0])
+                index.by_resource[previous[0]] = index.by_resource[previous[0]] - {allocation_id}
+            if counts:
+                index.allocations[allocation_id] = (resource_id,) + _interval(start_date, end_date, percentage)
+                index.by_resource[resource_id] = index.by_resource.get(resource_id, frozenset()) | {allocation_id}
+                changed.add(resource_id)
+        for allocation_id in deleted_allocations:
+            previous = index.allocations.pop(allocation_id, None)
+            if previous is not None:
+                changed.add(previous[0])
+                index.by_resource[previous[0]] = index.by_resource[previous[0]] - {allocation_id}
+
+        departments = set()
+        touched = set()
+        for resource_id, name, department_id, is_active in resources:
+            previous = index.resources.get(resource_id)
+            if previous is not None and previous[1] is not None:
+                index.members[previous[1]] = index.members[previous[1]] - {resource_id}
+                departments.add(previous[1])
+            index.resources[resource_id] = (name, department_id, is_active)
+            if is_active and department_id is not None:
+                index.members[department_id] = index.members.get(department_id, frozenset()) | {resource_id}
+                departments.add(department_id)
+            if resource_id not in index.positions:
+                index.positions[resource_id] = len(index.positions)
+            touched.add(resource_id)
+        for resource_id in deleted_resources:
+            previous = index.resources.pop(resource_id, None)
+            if previous is not None and previous[1] is not None:
+                index.members[previous[1]] = index.members[previous[1]] - {resource_id}
+                departments.add(previous[1])
+            for allocation_id in index.by_resource.pop(resource_id, ()):
+                index.allocations.pop(allocation_id, None)
+            changed.add(resource_id)
+            touched.add(resource_id)
+
+        for resource_id in changed:
+            allocation_ids = index.by_resource.get(resource_id)
+            if allocation_ids:
+                index.segments[resource_id] = segments(index.allocations[i][1:] for i in allocation_ids)
+            else:
+                index.by_resource.pop(resource_id, None)
+                index.segments.pop(resource_id, None)
+            department_id = index.resources.get(resource_id, (None, None))[1]
+            departments.add(department_id)
+
+        # Per-position resource columns; positions are never reused
+        size = len(index.positions)
+        grow = size - len(self.ids)
+        index.ids = np.concatenate([self.ids, np.zeros(grow, dtype=np.int64)])
+        index.departments = np.concatenate([self.departments, np.full(grow, -1, dtype=np.int64)])
+        index.active = np.concatenate([self.active, np.zeros(grow, dtype=bool)])
+        for resource_id in touched:
+            position = index.positions[resource_id]
+            _, department_id, is_active = index.resources.get(resource_id, (None, None, False))
+            index.ids[position] = resource_id
+            index.departments[position] = department_id if department_id is not None else -1
+            index.active[position] = bool(is_active)
+
+        # Replace the changed resources' rows of the flat segment arrays
+        keep = ~np.isin(self.flat[0], [self.positions[r] for r in changed if r in self.positions])
+        rows = [[], [], [], []]
+        for resource_id in changed:
+            if resource_id in index.segments:
+                starts, loads = index.segments[resource_id]
+                ends = [start - 1 for start in starts[1:]] + [OPEN_END]
+                rows[0].extend([index.positions[resource_id]] * len(starts))
+                rows[1].extend(starts)
+                rows[2].extend(ends)
+                rows[3].extend(loads)
+        index.flat = tuple(np.concatenate([column[keep], np.array(new, dtype=np.int64)])
+                           for column, new in zip(self.flat, rows))
+
+        index._department_segments = {department_id: cached for department_id, cached
+                                      in self._department_segments.items() if department_id not in departments}
+        return index
+
+    def resource_timeline(self, resource_id, first, last):
+        """Allocated and free percentage of one resource from ``first`` to ``last``"""
+        starts, loads = self.segments.get(resource_id, ([], []))
+        return [{'start': _day(start), 'end': _day(end), 'allocated': load, 'free': max(FULL_CAPACITY - load, 0)}
+                for start, end, load in window(starts, loads, first.toordinal(), last.toordinal())]
+
+    def _department(self, department_id):
+        cached = self._department_segments.get(department_id)
+        if cached is None:
+            members = self.members.get(department_id, frozenset())
+            cached = segments(self.allocations[allocation_id][1:]
+                              for resource_id in members
+                              for allocation_id in self.by_resource.get(resource_id, ()))
+            self._department_segments[department_id] = cached
+        return cached
+
+    def department_timeline(self, department_id, first, last):
+        """Headcount, allocated and available FTEs of a department's active resources"""
+        headcount = len(self.members.get(department_id, ()))
+        starts, loads = self._department(department_id)
+        return headcount, [
+            {'start': _day(start), 'end': _day(end),
+             'allocated_fte': load / FULL_CAPACITY,
+             'available_fte': headcount - load / FULL_CAPACITY,
+             'utilization': round(load / headcount, 2) if headcount else None}
+            for start, end, load in window(starts, loads, first.toordinal(), last.toordinal())
+        ]
+
+    def available(self, first, last, min_free, department_id=None, limit=100):
+        """Active resources with at least ``min_free`` percent free on every day of the window.
+
+        Ranked by free capacity, then id. Returns the number of matches and the top ``limit``.
+        """
+        position, starts, ends, loads = self.flat
+        overlapping = (starts <= last.toordinal()) & (ends >= first.toordinal())
+        peak = np.zeros(len(self.ids), dtype=np.int64)
+        np.maximum.at(peak, position[overlapping], loads[overlapping])
+
+        free = FULL_CAPACITY - peak
+        matches = self.active & (free >= min_free)
+        if department_id is not None:
+            matches &= self.departments == department_id
+        candidates = np.flatnonzero(matches)
+        order = np.lexsort((self.ids[candidates], -free[candidates]))[:limit]
+
+        results = []
+        for i in candidates[order]:
+            resource_id = int(self.ids[i])
+            name, resource_department, _ = self.resources[resource_id]
+            results.append({'id': resource_id, 'name': name, 'department_id': resource_department,
+                            'free': int(free[i])})
+        return len(candidates), results
+
+
+def load_changes(conn, since=None):
+    """Allocation and resource rows changed since a sync token (everything without one)"""
+    cursor = conn.cursor()
+    cursor.execute(SYNC_TOKEN_QUERY)
+    sync_token = cursor.fetchone()[0]
+
+    if since is None:
+        cursor.execute(ALLOCATIONS_QUERY + " WHERE is_active = TRUE")
+        allocations = cursor.fetchall()
+        cursor.execute(RESOURCES_QUERY)
+        resources = cursor.fetchall()
+        return sync_token, allocations, [], resources, []
+
+    cursor.execute(ALLOCATIONS_QUERY + " WHERE updated_at >= %s", (since,))
+    allocations = cursor.fetchall()
+    cursor.execute(TOMBSTONES_QUERY, ('project_resources', since))
+    deleted_allocations = [row[0] for row in cursor.fetchall()]
+    cursor.execute(RESOURCES_QUERY + " WHERE updated_at >= %s", (since,))
+    resources = cursor.fetchall()
+    cursor.execute(TOMBSTONES_QUERY, ('resources', since))
+    deleted_resources = [row[0] for row in cursor.fetchall()]
+    return sync_token, allocations, deleted_allocations, resources, deleted_resources
+
+
+_index = None
+_index_versions = None
+_index_synced_at = 0.0
+_sync_token = None
+_index_lock = threading.Lock()
+
+
+def get_capacity_index(conn):
+    """Get the process-wide capacity index, syncing it first if allocations or resources changed"""
+    global _index, _index_versions, _index_synced_at, _sync_token
+
+    versions = table_versions(*CAPACITY_INDEX_TABLES)
+    if (_index is not None and versions == _index_versions
+            and time.monotonic() - _index_synced_at < CAPACITY_INDEX_SYNC_INTERVAL):
+        return _index
+
+    with _index_lock:
+        if (_index is None or versions != _index_versions
+                or time.monotonic() - _index_synced_at >= CAPACITY_INDEX_SYNC_INTERVAL):
+            synced_at = time.monotonic()
+            sync_token, *changes = load_changes(conn, _sync_token)
+            _index = (_index or CapacityIndex()).updated(*changes)
+            _sync_token = sync_token
+            _index_versions = versions
+            _index_synced_at = synced_at
+        return _index
+
+
+def invalidate_capacity_index():
+    """Drop the index so the next capacity query reloads it in full"""
+    global _index, _sync_token
+    with _index_lock:
+        _index = None
+        _sync_token = None
+
+
+def parse_window(args):
+    """``from`` and ``to`` dates from the query string; the default is the next DEFAULT_WINDOW_DAYS days"""
+    try:
+        first = date.fromisoformat(args['from']) if args.get('from') else date.today()
+        last = date.fromisoformat(args['to']) if args.get('to') else first + timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+    except ValueError:
+        raise CapacityError('from and to must be ISO dates')
+    if last < first:
+        raise CapacityError('to must not be before from')
+    if (last - first).days >= MAX_WINDOW_DAYS:
+        raise CapacityError(f'Window exceeds {MAX_WINDOW_DAYS} days')
+    return first, last
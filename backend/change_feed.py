@@ -0,0 +1,325 @@
+"""Push-based change feed: database NOTIFY payloads fanned out over SSE.
+
+Statement-level triggers publish the ids touched by every write on the
+``itdd_changes`` channel. Each worker process holds one LISTEN connection
+and fans its notifications out to any number of Server-Sent Events
+subscribers, each filtered by topic, project and the caller's role.
+
+Subscribers never slow down the listener: every subscription has a bounded
+buffer, and a consumer that falls behind has its buffer dropped and is sent
+a ``resync`` event, after which it should refetch (e.g. with ``?since=``).
+"""
+import asyncio
+import itertools
+import json
+import os
+import select
+import threading
+import time
+from collections import deque
+
+CHANGE_CHANNEL = 'itdd_changes'
+
+# Events buffered per subscriber before it is told to resync
+SUBSCRIBER_BUFFER = int(os.getenv('CHANGE_FEED_BUFFER', 256))
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = float(os.getenv('CHANGE_FEED_HEARTBEAT', 15))
+# Seconds to wait before reconnecting a lost listener connection
+RECONNECT_DELAY = float(os.getenv('CHANGE_FEED_RECONNECT_DELAY', 2))
+
+# Roles allowed to subscribe to each topic; None means every role
+TOPIC_ROLES = {
+    'project': None,
+    'resource': None,
+    'escalation': None,
+    'financial': ('hr', 'leadership')
+}
+
+# Topics whose events carry project ids and honour the project_id filter
+PROJECT_TOPICS = ('project', 'escalation')
+
+RESYNC = {'topic': 'resync'}
+HEARTBEAT = ': keep-alive\n\n'
+
+
+class FeedError(Exception):
+    """Raised when a subscription request is invalid or not permitted"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_subscription(args, role):
+    """Read ``topics`` and ``project_id`` from the query string.
+
+    Returns ``(topics, project_ids)``. Without ``topics`` every topic the
+    role may see is included; asking for a topic the role may not see is an
+    error rather than a silently empty stream.
+    """
+    allowed = {topic for topic, roles in TOPIC_ROLES.items() if roles is None or role in roles}
+
+    requested = [topic.strip() for topic in args.get('topics', '').split(',') if topic.strip()]
+    for topic in requested:
+        if topic not in TOPIC_ROLES:
+            raise FeedError(f'Unknown topic: {topic}')
+        if topic not in allowed:
+            raise FeedError(f'Access denied to topic: {topic}', 403)
+
+    try:
+        project_ids = {int(project_id) for project_id in args.getlist('project_id')} or None
+    except ValueError:
+        raise FeedError('project_id must be an integer')
+
+    return set(requested) or allowed, project_ids
+
+
+def format_event(event):
+    """Render an event as an SSE frame"""
+    if event is RESYNC:
+        return 'event: resync\ndata: {}\n\n'
+    payload = {key: value for key, value in event.items() if key != 'seq'}
+    return f"id: {event['seq']}\nevent: change\ndata: {json.dumps(payload)}\n\n"
+
+
+class Subscription:
+    """One client's filter and bounded event buffer"""
+
+    def __init__(self, topics, project_ids=None, buffer_size=SUBSCRIBER_BUFFER):
+        self.topics = topics
+        self.project_ids = project_ids
+        self.buffer_size = buffer_size
+        self.overflowed = False
+        self._events = deque()
+
+    def matches(self, event):
+        if event is RESYNC:
+            return True
+        if event.get('topic') not in self.topics:
+            return False
+        if self.project_ids is None or event['topic'] not in PROJECT_TOPICS:
+            return True
+        return not self.project_ids.isdisjoint(event.get('project_ids') or ())
+
+    def _push(self, event):
+        if len(self._events) >= self.buffer_size:
+            self._events.clear()
+            self.overflowed = True
+        else:
+            self._events.append(event)
+
+    def _pop(self):
+        if self.overflowed:
+            self.overflowed = False
+            self._events.clear()
+            return RESYNC
+        return self._events.popleft() if self._events else None
+
+
+class ThreadSubscription(Subscription):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._ready = threading.Condition()
+
+    def put(self, event):
+        with self._ready:
+            self._push(event)
+            self._ready.notify()
+
+    def get(self, timeout):
+        """Next event, RESYNC, or None when ``timeout`` passes without one"""
+        with self._ready:
+            if not self._events and not self.overflowed:
+                self._ready.wait(timeout)
+            return self._pop()
+
+
+class AsyncSubscription(Subscription):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._ready = asyncio.Event()
+
+    def put(self, event):
+        self._push(event)
+        self._ready.set()
+
+    async def get(self, timeout):
+        if not self._events and not self.overflowed:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._ready.clear()
+        return self._pop()
+
+
+class ChangeHub:
+    """Per-process LISTEN connection shared by every thread-based subscriber.
+
+    ``connect`` returns a new psycopg2 connection. The listener thread starts
+    with the first subscription and reconnects on failure, sending every
+    subscriber a resync since notifications may have been missed.
+    """
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._seq = itertools.count(1)
+
+    def subscribe(self, subscription):
+        with self._lock:
+            self._subscribers.add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name='change-feed', daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event):
+        if event is not RESYNC:
+            event['seq'] = next(self._seq)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if subscription.matches(event):
+                subscription.put(event)
+
+    def _listen(self):
+        reconnecting = False
+        while True:
+            conn = None
+            try:
+                conn = self._connect()
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {CHANGE_CHANNEL}")
+                if reconnecting:
+                    self.publish(RESYNC)
+                reconnecting = True
+
+                while True:
+                    if not select.select([conn], [], [], HEARTBEAT_SECONDS)[0]:
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.publish(json.loads(conn.notifies.pop(0).payload))
+            except Exception as e:
+                print(f"Change feed listener error: {e}")
+                time.sleep(RECONNECT_DELAY)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+class AsyncChangeHub:
+    """asyncio counterpart of ``ChangeHub``; ``connect`` is an async factory
+    returning an asyncpg connection.
+    """
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._subscribers = set()
+        self._task = None
+        self._seq = itertools.count(1)
+
+    def subscribe(self, subscription):
+        self._subscribers.add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event):
+        if event is not RESYNC:
+            event['seq'] = next(self._seq)
+        for subscription in list(self._subscribers):
+            if subscription.matches(event):
+                subscription.put(event)
+
+    def _on_notify(self, conn, pid, channel, payload):
+        self.publish(json.loads(payload))
+
+    async def _listen(self):
+        reconnecting = False
+        while True:
+            conn = None
+            try:
+                conn = await self._connect()
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(CHANGE_CHANNEL, self._on_notify)
+                if reconnecting:
+                    self.publish(RESYNC)
+                reconnecting = True
+                await lost.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Change feed listener error: {e}")
+                await asyncio.sleep(RECONNECT_DELAY)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+def stream_events(hub, subscription, is_valid, resume=False):
+    """SSE generator for a thread-based subscription.
+
+    ``is_valid`` is checked once per heartbeat interval; the stream ends once
+    it returns False (e.g. the token expired or was revoked) so the client
+    reconnects with fresh credentials. ``resume`` (a Last-Event-ID was sent)
+    starts with a resync since events are not replayed.
+    """
+    hub.subscribe(subscription)
+    try:
+        yield f'retry: {int(RECONNECT_DELAY * 1000)}\n\n'
+        if resume:
+            yield format_event(RESYNC)
+        next_check = time.monotonic() + HEARTBEAT_SECONDS
+        while True:
+            event = subscription.get(HEARTBEAT_SECONDS)
+            if time.monotonic() >= next_check:
+                if not is_valid():
+                    return
+                next_check = time.monotonic() + HEARTBEAT_SECONDS
+            yield format_event(event) if event is not None else HEARTBEAT
+    finally:
+        hub.unsubscribe(subscription)
+
+
+async def stream_events_async(hub, subscription, is_valid, resume=False):
+    """Async counterpart of ``stream_events``; ``is_valid`` is a coroutine function"""
+    hub.subscribe(subscription)
+    try:
+        yield f'retry: {int(RECONNECT_DELAY * 1000)}\n\n'
+        if resume:
+            yield format_event(RESYNC)
+        next_check = time.monotonic() + HEARTBEAT_SECONDS
+        while True:
+            event = await subscription.get(HEARTBEAT_SECONDS)
+            if time.monotonic() >= next_check:
+                if not await is_valid():
+                    return
+                next_check = time.monotonic() + HEARTBEAT_SECONDS
+            yield format_event(event) if event is not None else HEARTBEAT
+    finally:
+        hub.unsubscribe(subscription)
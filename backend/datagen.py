@@ -0,0 +1,470 @@
+"""Deterministic synthetic data for load and benchmark databases.
+
+Populates every business table at a configurable scale through COPY, in
+batches, with the schema's triggers left on so derived state (resource
+status, project health, metric rollups) is maintained the same way it is in
+production. The same seed and scale on an empty database always produce the
+same rows.
+
+    python datagen.py --scale large --seed 42 --reset
+
+``--reset`` truncates every generated table first (users are kept). Without
+it rows are appended after the current maximum ids.
+"""
+import argparse
+import csv
+import io
+import time
+from datetime import date
+
+import numpy as np
+import psycopg2
+
+from db import DB_CONFIG
+from health_engine import refresh_health
+
+SCALES = {
+    'small': {'resources': 1000, 'projects': 100, 'deliverables': 5000, 'metric_days': 90},
+    'medium': {'resources': 10000, 'projects': 1000, 'deliverables': 100000, 'metric_days': 180},
+    'large': {'resources': 100000, 'projects': 10000, 'deliverables': 2000000, 'metric_days': 365}
+}
+
+# Rows sent per COPY statement; each batch fires the statement triggers once
+BATCH_ROWS = 50000
+
+GENERATED_TABLES = (
+    'departments', 'skills', 'clients', 'resources', 'resource_skills', 'projects',
+    'project_resources', 'deliverables', 'escalations', 'engineering_metrics', 'qa_metrics',
+    'engineering_metrics_rollup', 'qa_metrics_rollup', 'department_stats', 'financial_overview',
+    'company_kpis', 'sync_tombstones'
+)
+
+LOCATIONS = ['Bangalore', 'Hyderabad', 'Pune', 'Chennai', 'New York', 'London', 'Remote']
+ROLES = ['Software Engineer', 'Senior Software Engineer', 'QA Engineer', 'DevOps Engineer',
+         'Business Analyst', 'Project Manager', 'UI/UX Designer', 'Data Engineer', 'Architect']
+LEVELS = ['Junior', 'Mid', 'Senior', 'Lead', 'Principal']
+SKILL_CATEGORIES = ['Programming', 'Framework', 'Database', 'Cloud', 'DevOps', 'Testing', 'Design', 'Management']
+DEMAND = ['Low', 'Medium', 'High', 'Critical']
+INDUSTRIES = ['Retail', 'Banking', 'Healthcare', 'Logistics', 'Telecom', 'Insurance', 'Media']
+TECHNOLOGIES = ['Python', 'React', 'PostgreSQL', 'AWS', 'Java', 'Kubernetes', 'Node.js', 'Azure', 'Go']
+PROJECT_STATUSES = ['Planning', 'In Progress', 'Completed', 'On Hold', 'Cancelled']
+PRIORITIES = ['Low', 'Medium', 'High', 'Critical']
+DELIVERABLE_STATUSES = ['Pending', 'In Progress', 'Completed', 'Delayed', 'Blocked']
+DELIVERABLE_TYPES = ['Feature', 'Bug Fix', 'Documentation', 'Testing', 'Deployment']
+ESCALATION_STATUSES = ['Open', 'In Progress', 'Resolved', 'Closed', 'Escalated']
+ESCALATION_TYPES = ['Technical', 'Resource', 'Budget', 'Timeline', 'Quality', 'Client']
+
+
+def _rng(seed, table):
+    # One independent stream per table, so changing one table's row count
+    # does not change the rows generated for the others
+    return np.random.default_rng([seed, GENERATED_TABLES.index(table)])
+
+
+def _dates(ordinals):
+    """ISO date strings for an array of proleptic Gregorian ordinals"""
+    epoch = np.datetime64('1970-01-01')
+    return (epoch + (np.asarray(ordinals) - date(1970, 1, 1).toordinal()).astype('timedelta64[D]')).astype(str)
+
+
+def _pick(rng, values, size, p=None):
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size, p=p)]
+
+
+def _nullable(values, mask):
+    """Column with None wherever ``mask`` is set (written as NULL)"""
+    values = np.asarray(values, dtype=object)
+    values[mask] = None
+    return values
+
+
+def copy_rows(cursor, table, columns, rows):
+    """COPY an iterable of row tuples into ``table`` in batches of BATCH_ROWS"""
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    total = 0
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending == BATCH_ROWS:
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            total += pending
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+        total += pending
+    return total
+
+
+def copy_columns(cursor, table, columns):
+    """COPY a dict of equal-length column arrays"""
+    names = list(columns)
+    return copy_rows(cursor, table, names, zip(*(np.asarray(columns[name]).tolist() for name in names)))
+
+
+class Generator:
+    def __init__(self, conn, seed, resources, projects, deliverables, metric_days, today=None):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.seed = seed
+        self.counts = {'resources': resources, 'projects': projects,
+                       'deliverables': deliverables, 'metric_days': metric_days}
+        self.today = (today or date.today()).toordinal()
+        self.ids = {}
+
+    def _next_ids(self, table, count):
+        self.cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        start = self.cursor.fetchone()[0] + 1
+        ids = np.arange(start, start + count)
+        self.ids[table] = ids
+        return ids
+
+    def _sync_sequence(self, table):
+        self.cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), GREATEST(MAX(id), 1)) FROM {table}")
+
+    def departments(self):
+        count = max(5, self.counts['resources'] // 2000)
+        rng = _rng(self.seed, 'departments')
+        ids = self._next_ids('departments', count)
+        return copy_columns(self.cursor, 'departments', {
+            'id': ids,
+            'name': [f'Department {i}' for i in ids],
+            'budget': np.round(rng.uniform(5e5, 5e6, count), 2),
+            'head_of_department': [f'Head {i}' for i in ids],
+            'location': _pick(rng, LOCATIONS, count)
+        })
+
+    def skills(self):
+        count = 300
+        rng = _rng(self.seed, 'skills')
+        ids = self._next_ids('skills', count)
+        return copy_columns(self.cursor, 'skills', {
+            'id': ids,
+            'name': [f'Skill {i}' for i in ids],
+            'category': _pick(rng, SKILL_CATEGORIES, count),
+            'market_demand': _pick(rng, DEMAND, count, p=[0.2, 0.4, 0.3, 0.1])
+        })
+
+    def clients(self):
+        count = max(5, self.counts['projects'] // 5)
+        rng = _rng(self.seed, 'clients')
+        ids = self._next_ids('clients', count)
+        return copy_columns(self.cursor, 'clients', {
+            'id': ids,
+            'name': [f'Client {i}' for i in ids],
+            'industry': _pick(rng, INDUSTRIES, count),
+            'contact_person': [f'Contact {i}' for i in ids],
+            'email': [f'contact{i}@client.example.com' for i in ids],
+            'is_active': rng.random(count) < 0.95
+        })
+
+    def resources(self):
+        count = self.counts['resources']
+        rng = _rng(self.seed, 'resources')
+        ids = self._next_ids('resources', count)
+        hire = self.today - rng.integers(30, 3650, count)
+        last_review = self.today - rng.integers(0, 365, count)
+        level = rng.choice(len(LEVELS), count, p=[0.3, 0.3, 0.25, 0.1, 0.05])
+        # Unallocated resources keep this status; allocations flip theirs to Billable
+        status = _pick(rng, ['Benched', 'Available', 'Shadow', 'On Leave'], count, p=[0.5, 0.3, 0.15, 0.05])
+        shadow = status == 'Shadow'
+        return copy_columns(self.cursor, 'resources', {
+            'id': ids,
+            'name': [f'Resource {i}' for i in ids],
+            'email': [f'resource{i}@example.com' for i in ids],
+            'department_id': rng.choice(self.ids['departments'], count),
+            'role': _pick(rng, ROLES, count),
+            'status': status,
+            'level': np.asarray(LEVELS, dtype=object)[level],
+            'hire_date': _dates(hire),
+            'location': _pick(rng, LOCATIONS, count),
+            'is_active': rng.random(count) < 0.97,
+            'shadow_progress': np.where(shadow, rng.integers(0, 101, count), 0),
+            'bench_start_date': _nullable(_dates(self.today - rng.integers(1, 120, count)), status != 'Benched'),
+            'performance_rating': np.round(rng.uniform(1.0, 5.0, count), 2),
+            'billable_rate': np.round(40 + level * 20 + rng.uniform(0, 20, count), 2),
+            'base_salary': np.round(40000 + level * 25000 + rng.uniform(0, 20000, count), 2),
+            'bonus': np.round(rng.uniform(0, 10000, count), 2),
+            'last_review_date': _dates(last_review),
+            'next_review_date': _dates(last_review + 182)
+        })
+
+    def resource_skills(self):
+        rng = _rng(self.seed, 'resource_skills')
+        skill_ids = self.ids['skills']
+
+        def rows():
+            for start in range(0, len(self.ids['resources']), 10000):
+                resource_ids = self.ids['resources'][start:start + 10000]
+                per_resource = rng.integers(2, 9, len(resource_ids))
+                # k distinct skills per resource: the k smallest of a random key per skill
+                picks = rng.random((len(resource_ids), len(skill_ids))).argsort(axis=1)[:, :8]
+                for resource_id, count, picked in zip(resource_ids.tolist(), per_resource.tolist(), picks):
+                    for skill_index in picked[:count].tolist():
+                        yield (resource_id, int(skill_ids[skill_index]),
+                               int(rng.integers(1, 6)), round(float(rng.uniform(0, 15)), 1))
+
+        return copy_rows(self.cursor, 'resource_skills',
+                         ['resource_id', 'skill_id', 'proficiency_level', 'years_experience'], rows())
+
+    def projects(self):
+        count = self.counts['projects']
+        rng = _rng(self.seed, 'projects')
+        ids = self._next_ids('projects', count)
+        status = _pick(rng, PROJECT_STATUSES, count, p=[0.15, 0.5, 0.2, 0.1, 0.05])
+        start = self.today - rng.integers(0, 720, count)
+        end = start + rng.integers(60, 540, count)
+        stacks = ['{' + ','.join(f'"{TECHNOLOGIES[i]}"' for i in rng.choice(len(TECHNOLOGIES), size, replace=False)) + '}'
+                  for size in rng.integers(1, 5, count).tolist()]
+        self.active_projects = ids[np.isin(status, ['Planning', 'In Progress'])]
+        return copy_columns(self.cursor, 'projects', {
+            'id': ids,
+            'name': [f'Project {i}' for i in ids],
+            'description': [f'Synthetic project {i}' for i in ids],
+            'client_id': rng.choice(self.ids['clients'], count),
+            'manager_id': rng.choice(self.ids['resources'], count),
+            'status': status,
+            'start_date': _dates(start),
+            'end_date': _dates(end),
+            'budget': np.round(rng.uniform(5e4, 5e6, count), 2),
+            'priority': _pick(rng, PRIORITIES, count, p=[0.2, 0.4, 0.3, 0.1]),
+            'technology_stack': stacks,
+            'is_active': ~np.isin(status, ['Completed', 'Cancelled'])
+        })
+
+    def project_resources(self):
+        rng = _rng(self.seed, 'project_resources')
+        targets = self.active_projects if len(self.active_projects) else self.ids['projects']
+        resource_ids = self.ids['resources']
+        allocated = resource_ids[rng.random(len(resource_ids)) < 0.7]
+        # A quarter of allocated resources are split across a second project
+        second = allocated[rng.random(len(allocated)) < 0.25]
+        rows = np.concatenate([allocated, second])
+        count = len(rows)
+        split = np.isin(rows, second)
+        return copy_columns(self.cursor, 'project_resources', {
+            'project_id': rng.choice(targets, count),
+            'resource_id': rows,
+            'allocation_percentage': np.where(split, 50, 100),
+            'start_date': _dates(self.today - rng.integers(0, 365, count)),
+            'role_in_project': _pick(rng, ROLES, count)
+        })
+
+    def deliverables(self):
+        rng = _rng(self.seed, 'deliverables')
+        project_ids = self.ids['projects']
+        # Grouped by project so each COPY batch touches a narrow range of
+        # projects and each project's health is recomputed about once
+        per_project = rng.multinomial(self.counts['deliverables'], np.full(len(project_ids), 1 / len(project_ids)))
+        owners = np.repeat(project_ids, per_project)
+        count = len(owners)
+        status = _pick(rng, DELIVERABLE_STATUSES, count, p=[0.2, 0.3, 0.35, 0.1, 0.05])
+        completed = status == 'Completed'
+        due = self.today + rng.integers(-365, 180, count)
+        estimated = rng.integers(8, 160, count)
+        return copy_columns(self.cursor, 'deliverables', {
+            'name': [f'Deliverable {i}' for i in range(1, count + 1)],
+            'project_id': owners,
+            'assigned_to': rng.choice(self.ids['resources'], count),
+            'status': status,
+            'priority': _pick(rng, PRIORITIES, count, p=[0.2, 0.4, 0.3, 0.1]),
+            'due_date': _dates(due),
+            'completion_date': _nullable(_dates(due - rng.integers(0, 10, count)), ~completed),
+            'completion_percentage': np.where(completed, 100, rng.integers(0, 100, count)),
+            'estimated_hours': estimated,
+            'actual_hours': (estimated * rng.uniform(0.3, 1.5, count)).astype(np.int64),
+            'deliverable_type': _pick(rng, DELIVERABLE_TYPES, count)
+        })
+
+    def escalations(self):
+        rng = _rng(self.seed, 'escalations')
+        count = self.counts['projects'] * 2
+        status = _pick(rng, ESCALATION_STATUSES, count, p=[0.3, 0.25, 0.2, 0.15, 0.1])
+        raised = self.today - rng.integers(0, 180, count)
+        resolved = np.isin(status, ['Resolved', 'Closed'])
+        return copy_columns(self.cursor, 'escalations', {
+            'title': [f'Escalation {i}' for i in range(1, count + 1)],
+            'description': ['Synthetic escalation'] * count,
+            'project_id': rng.choice(self.ids['projects'], count),
+            'priority': _pick(rng, PRIORITIES, count, p=[0.2, 0.4, 0.3, 0.1]),
+            'status': status,
+            'escalation_type': _pick(rng, ESCALATION_TYPES, count),
+            'raised_by': rng.choice(self.ids['resources'], count),
+            'assigned_to': rng.choice(self.ids['resources'], count),
+            'raised_date': _dates(raised),
+            'due_date': _dates(raised + rng.integers(3, 30, count)),
+            'resolved_date': _nullable(_dates(raised + rng.integers(1, 30, count)), ~resolved)
+        })
+
+    def _metric_rows(self, table, make_columns):
+        rng = _rng(self.seed, table)
+        days = self.counts['metric_days']
+        metric_dates = _dates(np.arange(self.today - days + 1, self.today + 1))
+
+        def rows():
+            # One project block at a time keeps memory flat at any scale
+            for start in range(0, len(self.ids['projects']), 1000):
+                block = self.ids['projects'][start:start + 1000]
+                count = len(block) * days
+                columns = make_columns(rng, count)
+                columns = {'project_id': np.repeat(block, days), 'metric_date': np.tile(metric_dates, len(block)),
+                           **columns}
+                names = list(columns)
+                yield names, zip(*(np.asarray(columns[name]).tolist() for name in names))
+
+        total = 0
+        for names, block_rows in rows():
+            total += copy_rows(self.cursor, table, names, block_rows)
+        return total
+
+    def engineering_metrics(self):
+        def columns(rng, count):
+            reported = rng.integers(0, 20, count)
+            return {
+                'commits_count': rng.integers(0, 60, count),
+                'lines_of_code': rng.integers(0, 5000, count),
+                'code_quality_score': rng.integers(50, 101, count),
+                'test_coverage': rng.integers(30, 101, count),
+                'bugs_reported': reported,
+                'bugs_resolved': (reported * rng.uniform(0.4, 1.0, count)).astype(np.int64),
+                'code_review_time_avg': np.round(rng.uniform(0.5, 48, count), 2),
+                'deployment_frequency': rng.integers(0, 10, count),
+                'lead_time_hours': np.round(rng.uniform(1, 200, count), 2),
+                'developer_productivity_score': rng.integers(40, 101, count),
+                'technical_debt_ratio': np.round(rng.uniform(0, 40, count), 2)
+            }
+        return self._metric_rows('engineering_metrics', columns)
+
+    def qa_metrics(self):
+        def columns(rng, count):
+            total = rng.integers(50, 500, count)
+            passed = (total * rng.uniform(0.7, 1.0, count)).astype(np.int64)
+            found = rng.integers(0, 30, count)
+            return {
+                'test_cases_total': total,
+                'test_cases_passed': passed,
+                'test_cases_failed': total - passed,
+                'automation_coverage': rng.integers(20, 101, count),
+                'manual_test_hours': rng.integers(0, 40, count),
+                'defects_found': found,
+                'defects_fixed': (found * rng.uniform(0.5, 1.0, count)).astype(np.int64),
+                'defect_removal_efficiency': np.round(rng.uniform(60, 100, count), 2),
+                'test_execution_rate': np.round(rng.uniform(60, 100, count), 2),
+                'regression_test_success': np.round(rng.uniform(70, 100, count), 2),
+                'performance_test_score': rng.integers(50, 101, count),
+                'security_test_score': rng.integers(50, 101, count)
+            }
+        return self._metric_rows('qa_metrics', columns)
+
+    def financial_overview(self):
+        rng = _rng(self.seed, 'financial_overview')
+        today = date.fromordinal(self.today)
+        current = today.year * 12 + today.month - 1
+        months = [date(month // 12, month % 12 + 1, 1) for month in range(current - 35, current + 1)]
+        self.cursor.execute("SELECT month FROM financial_overview")
+        existing = {row[0] for row in self.cursor.fetchall()}
+        months = [month for month in months if month not in existing]
+        count = len(months)
+        budget = rng.uniform(5e6, 2e7, count)
+        revenue = budget * rng.uniform(1.05, 1.4, count)
+        billable = rng.integers(self.counts['resources'] // 2, self.counts['resources'] + 1, count)
+        return copy_columns(self.cursor, 'financial_overview', {
+            'month': [month.isoformat() for month in months],
+            'total_budget': np.round(budget, 2),
+            'budget_utilized': np.round(budget * rng.uniform(0.6, 1.0, count), 2),
+            'revenue_generated': np.round(revenue, 2),
+            'profit_margin': np.round((revenue - budget) / revenue * 100, 2),
+            'burn_rate': np.round(budget / 30, 2),
+            'project_count': np.full(count, self.counts['projects']),
+            'billable_resources': billable,
+            'cost_per_resource': np.round(budget / np.maximum(billable, 1), 2),
+            'revenue_per_resource': np.round(revenue / np.maximum(billable, 1), 2)
+        })
+
+    def company_kpis(self):
+        rng = _rng(self.seed, 'company_kpis')
+        self.cursor.execute("SELECT kpi_date FROM company_kpis")
+        existing = {row[0].toordinal() for row in self.cursor.fetchall()}
+        ordinals = np.array([d for d in range(self.today - 364, self.today + 1) if d not in existing], dtype=np.int64)
+        count = len(ordinals)
+        return copy_columns(self.cursor, 'company_kpis', {
+            'kpi_date': _dates(ordinals),
+            'revenue': np.round(rng.uniform(2e5, 1e6, count), 2),
+            'profit_margin': np.round(rng.uniform(10, 35, count), 2),
+            'employee_utilization': np.round(rng.uniform(60, 95, count), 2),
+            'client_satisfaction': np.round(rng.uniform(3.0, 5.0, count), 2),
+            'project_delivery_rate': np.round(rng.uniform(70, 100, count), 2),
+            'quality_score': np.round(rng.uniform(70, 100, count), 2),
+            'employee_satisfaction': np.round(rng.uniform(3.0, 5.0, count), 2),
+            'innovation_index': np.round(rng.uniform(50, 100, count), 2),
+            'market_share': np.round(rng.uniform(1, 20, count), 2),
+            'customer_retention': np.round(rng.uniform(70, 100, count), 2)
+        })
+
+    def run(self, log=print):
+        steps = ['departments', 'skills', 'clients', 'resources', 'resource_skills', 'projects',
+                 'project_resources', 'deliverables', 'escalations', 'engineering_metrics', 'qa_metrics',
+                 'financial_overview', 'company_kpis']
+        for step in steps:
+            started = time.perf_counter()
+            rows = getattr(self, step)()
+            self.conn.commit()
+            log(f"{step:<20} {rows:>10} rows  {time.perf_counter() - started:8.1f}s")
+
+        for table in ('departments', 'skills', 'clients', 'resources', 'resource_skills', 'projects',
+                      'project_resources', 'deliverables', 'escalations', 'engineering_metrics',
+                      'qa_metrics', 'financial_overview', 'company_kpis'):
+            self._sync_sequence(table)
+
+        # Timeline health depends on today's date, which the deliverable
+        # triggers only see for projects that received deliverables
+        scored, updated = refresh_health(self.conn)
+        self.conn.commit()
+        log(f"health refresh       {scored:>10} projects, {updated} updated")
+
+        self.conn.autocommit = True
+        self.cursor.execute("ANALYZE")
+        self.conn.autocommit = False
+
+
+def reset(conn):
+    """Empty every generated table and restart its ids; users are kept"""
+    cursor = conn.cursor()
+    cursor.execute(f"TRUNCATE {', '.join(GENERATED_TABLES)} RESTART IDENTITY CASCADE")
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load deterministic synthetic data')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='truncate generated tables first')
+    for name in ('resources', 'projects', 'deliverables', 'metric_days'):
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, help=f'override the scale\'s {name}')
+    args = parser.parse_args()
+
+    counts = dict(SCALES[args.scale])
+    for name in counts:
+        if getattr(args, name) is not None:
+            counts[name] = getattr(args, name)
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        if args.reset:
+            reset(conn)
+        started = time.perf_counter()
+        Generator(conn, args.seed, **counts).run()
+        print(f"Loaded {args.scale} scale (seed {args.seed}) in {time.perf_counter() - started:.1f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
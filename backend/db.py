@@ -0,0 +1,655 @@
+import math
+import os
+import threading
+import time
+from functools import wraps
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+from flask import g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from dotenv import load_dotenv
+
+import instrumentation
+from response_cache import cache
+
+load_dotenv()
+
+# Database configuration
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'database': os.getenv('DB_NAME', 'zapcom_resource_db'),
+    'user': os.getenv('DB_USER', 'postgres'),
+    'password': os.getenv('DB_PASSWORD', 'password'),
+    'port': os.getenv('DB_PORT', '5432')
+}
+
+# Connection pool configuration
+POOL_CONFIG = {
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 20)),
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+    'health_check_after': float(os.getenv('DB_POOL_HEALTH_CHECK_AFTER', 30))
+}
+
+# Read replicas as host or host:port; database and credentials come from DB_CONFIG
+REPLICA_HOSTS = [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+
+REPLICA_CONFIG = {
+    # Replicas further behind the primary than this serve no reads
+    'max_lag': float(os.getenv('DB_REPLICA_MAX_LAG', 5)),
+    'lag_check_interval': float(os.getenv('DB_REPLICA_LAG_CHECK_INTERVAL', 1)),
+    'connect_timeout': int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', 2))
+}
+
+# The primary's current WAL position; replicas that have replayed it hold
+# every write committed before it was read
+PRIMARY_LSN_QUERY = "SELECT pg_current_wal_lsn()::text"
+
+# A replica's replay position and the age of the last transaction it replayed,
+# or in_recovery = false when the server is not a standby (e.g. promoted)
+REPLICA_POSITION_QUERY = """
+    SELECT pg_is_in_recovery() AS in_recovery,
+           pg_last_wal_replay_lsn()::text AS replay_lsn,
+           EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) AS replay_age
+"""
+
+# Write positions live in the response cache backend under these keys: a
+# writer's own and '*' (any writer), each raised to the primary's WAL
+# position after the write committed. RedisCache shares them across workers;
+# the default in-process cache only sees writes made through its own worker.
+WRITE_POSITION_KEY = 'write_position:{}'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def parse_lsn(lsn):
+    """A pg_lsn in its ``XXXXXXXX/XXXXXXXX`` text form as an integer, or None"""
+    if lsn is None:
+        return None
+    high, _, low = lsn.partition('/')
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+def replica_position(primary_lsn, sampled_at, in_recovery, replay_lsn, replay_age):
+    """``(replayed LSN, wall-clock time replayed through)`` from a probe.
+
+    ``primary_lsn`` is the primary's position read at ``sampled_at`` just
+    before the replica was queried. A replica that has replayed it holds
+    everything written up to then; otherwise it holds everything up to its
+    last replayed transaction. Returns None for a server that is not a
+    standby.
+    """
+    if not in_recovery or replay_lsn is None:
+        return None
+    replayed = parse_lsn(replay_lsn)
+    if primary_lsn is not None and replayed >= primary_lsn:
+        return replayed, sampled_at
+    if replay_age is None:
+        return replayed, None
+    return replayed, time.time() - float(replay_age)
+
+
+def replica_config(host):
+    """DB_CONFIG pointed at a ``host`` or ``host:port`` entry of DB_REPLICA_HOSTS"""
+    host, _, port = host.partition(':')
+    return {**DB_CONFIG, 'host': host, 'port': port or DB_CONFIG['port'],
+            'connect_timeout': REPLICA_CONFIG['connect_timeout']}
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection becomes available within the pool timeout"""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe PostgreSQL connection pool.
+
+    Connections idle for longer than ``health_check_after`` seconds are pinged
+    before being handed out, and connections older than ``max_lifetime`` are
+    recycled. Callers block for up to ``timeout`` seconds when every
+    connection is checked out.
+    """
+
+    def __init__(self, db_config, min_size=2, max_size=20, timeout=10,
+                 max_lifetime=1800, health_check_after=30):
+        self.db_config = db_config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+
+        self._idle = []
+        self._in_use = {}
+        self._created_at = {}
+        self._pending = 0
+        self._lock = threading.Condition(threading.Lock())
+        self._pid = os.getpid()
+        self._closed = False
+
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'connections_opened': 0,
+            'connections_recycled': 0,
+            'health_check_failures': 0
+        }
+
+        for _ in range(min_size):
+            conn = self._connect()
+            self._idle.append((conn, time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.db_config, connection_factory=instrumentation.connection_factory())
+        self._created_at[id(conn)] = time.monotonic()
+        self._stats['connections_opened'] += 1
+        return conn
+
+    def _discard(self, conn):
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, conn):
+        age = time.monotonic() - self._created_at.get(id(conn), 0)
+        return self.max_lifetime and age > self.max_lifetime
+
+    def _healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_after:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _check_fork(self):
+        # Connections must never be shared across gunicorn worker processes
+        if os.getpid() != self._pid:
+            self._idle = []
+            self._in_use = {}
+            self._created_at = {}
+            self._pending = 0
+            self._pid = os.getpid()
+
+    def getconn(self):
+        """Check a connection out of the pool, waiting up to ``timeout`` seconds"""
+        started = time.monotonic()
+        waited = False
+
+        while True:
+            candidate = None
+            with self._lock:
+                self._check_fork()
+                while True:
+                    if self._closed:
+                        raise PoolError("connection pool is closed")
+                    if self._idle:
+                        candidate = self._idle.pop()
+                        self._pending += 1
+                        break
+                    if len(self._in_use) + self._pending < self.max_size:
+                        self._pending += 1
+                        break
+
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f"No database connection available after {self.timeout}s "
+                            f"({len(self._in_use)}/{self.max_size} in use)"
+                        )
+                    waited = True
+                    self._lock.wait(remaining)
+
+            # Health checks and new handshakes run outside the lock so a slow
+            # server does not stall requests that are returning connections
+            conn = None
+            try:
+                if candidate is None:
+                    conn = self._connect()
+                else:
+                    conn, idle_since = candidate
+                    if self._expired(conn):
+                        self._stats['connections_recycled'] += 1
+                        self._discard(conn)
+                        conn = None
+                    elif not self._healthy(conn, idle_since):
+                        self._stats['health_check_failures'] += 1
+                        self._discard(conn)
+                        conn = None
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    if conn is not None:
+                        self._checkout(conn, started, waited)
+                    else:
+                        self._lock.notify()
+            if conn is not None:
+                return conn
+
+    def _checkout(self, conn, started, waited):
+        wait_time = time.monotonic() - started
+        self._in_use[id(conn)] = conn
+        self._stats['checkouts'] += 1
+        self._stats['wait_time_total'] += wait_time
+        self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+        if waited:
+            self._stats['waits'] += 1
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool, rolling back any open transaction"""
+        if not discard and not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._lock:
+            self._check_fork()
+            if self._in_use.pop(id(conn), None) is None:
+                return
+
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+            elif self._expired(conn):
+                self._stats['connections_recycled'] += 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._lock:
+            checkouts = self._stats['checkouts']
+            return {
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+                'min_size': self.min_size,
+                'checkouts': checkouts,
+                'waits': self._stats['waits'],
+                'timeouts': self._stats['timeouts'],
+                'wait_time_avg_ms': round(self._stats['wait_time_total'] / checkouts * 1000, 3) if checkouts else 0,
+                'wait_time_max_ms': round(self._stats['wait_time_max'] * 1000, 3),
+                'connections_opened': self._stats['connections_opened'],
+                'connections_recycled': self._stats['connections_recycled'],
+                'health_check_failures': self._stats['health_check_failures']
+            }
+
+    def closeall(self):
+        with self._lock:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._discard(conn)
+            for conn in list(self._in_use.values()):
+                self._discard(conn)
+            self._idle = []
+            self._in_use = {}
+            self._lock.notify_all()
+
+
+class ReplicaRouter:
+    """Tracks how far each read replica has replayed and picks one for a read.
+
+    Positions are measured by the caller with ``PRIMARY_LSN_QUERY`` and
+    ``REPLICA_POSITION_QUERY`` (on whichever driver it uses), turned into
+    ``replica_position`` and passed to ``record``. A replica is eligible while
+    it is provably within ``max_lag`` of now; a caller whose last write ended
+    at WAL position ``wrote_lsn`` also needs a replica that has replayed it.
+    Eligible replicas take reads in turn.
+    """
+
+    def __init__(self, count, max_lag=5, lag_check_interval=1):
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        # WAL position and wall-clock time every replica is known to have replayed up to
+        self._replayed_lsn = [None] * count
+        self._replayed_through = [None] * count
+        self._lag = [None] * count
+        self._measured_at = [0.0] * count
+        self._probing = [False] * count
+        self._reads = [0] * count
+        self._primary_reads = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def due(self):
+        """Replicas whose position should be measured now; each is handed to one caller at a time"""
+        now = time.time()
+        with self._lock:
+            due = [i for i, measured_at in enumerate(self._measured_at)
+                   if not self._probing[i] and now - measured_at >= self.lag_check_interval]
+            for i in due:
+                self._probing[i] = True
+        return due
+
+    def record(self, index, position):
+        """Store a ``replica_position``, or None for a replica that is unreachable or not replaying"""
+        now = time.time()
+        replayed_lsn, replayed_through = position if position is not None else (None, None)
+        with self._lock:
+            self._replayed_lsn[index] = replayed_lsn
+            self._replayed_through[index] = replayed_through
+            self._lag[index] = max(now - replayed_through, 0.0) if replayed_through is not None else None
+            self._measured_at[index] = now
+            self._probing[index] = False
+
+    def _fresh(self, i, now):
+        replayed_through = self._replayed_through[i]
+        return replayed_through is not None and now - replayed_through <= self.max_lag
+
+    def any_eligible(self):
+        """True if some replica is within ``max_lag``, before any write is considered"""
+        now = time.time()
+        with self._lock:
+            return any(self._fresh(i, now) for i in range(len(self._replayed_through)))
+
+    def choose(self, wrote_lsn=None):
+        """Index of the replica to read from, or None to read from the primary"""
+        now = time.time()
+        with self._lock:
+            count = len(self._replayed_through)
+            for offset in range(count):
+                i = (self._next + offset) % count
+                if not self._fresh(i, now):
+                    continue
+                if wrote_lsn is not None and self._replayed_lsn[i] < wrote_lsn:
+                    continue
+                self._next = i + 1
+                self._reads[i] += 1
+                return i
+            self._primary_reads += 1
+        return None
+
+    def read_primary(self):
+        """Count a read sent to the primary without asking ``choose``"""
+        with self._lock:
+            self._primary_reads += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'primary_reads': self._primary_reads,
+                'replicas': [
+                    {'lag_s': round(lag, 3) if lag is not None else None, 'reads': reads}
+                    for lag, reads in zip(self._lag, self._reads)
+                ]
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG, **POOL_CONFIG)
+    return _pool
+
+
+def get_pool_stats():
+    """Pool statistics, or None if no connection has been requested yet"""
+    return _pool.stats() if _pool is not None else None
+
+
+def write_keys(user_id):
+    """Write position keys raised by a write from ``user_id``"""
+    return ['*'] if user_id is None else [f'user:{user_id}', '*']
+
+
+def _write_position_timeout():
+    # Once a write is DB_REPLICA_MAX_LAG old every replica eligible for reads
+    # has replayed it, so the position only has to outlive that
+    return math.ceil(REPLICA_CONFIG['max_lag'] + REPLICA_CONFIG['lag_check_interval'])
+
+
+def mark_write(conn, user_id):
+    """Record the primary's WAL position after ``user_id``'s write committed on ``conn``.
+
+    Their next reads, and responses cached for everyone, avoid replicas that
+    have not replayed up to it. This is the only write-position query on the
+    primary; reads look positions up in the response cache.
+    """
+    conn.rollback()
+    cursor = conn.cursor()
+    cursor.execute(PRIMARY_LSN_QUERY)
+    lsn = parse_lsn(cursor.fetchone()[0])
+    conn.rollback()
+    timeout = _write_position_timeout()
+    for key in write_keys(user_id):
+        key = WRITE_POSITION_KEY.format(key)
+        # Concurrent writers may finish out of order; keep the furthest position
+        current = cache.get(key)
+        if current is None or current < lsn:
+            cache.set(key, lsn, timeout=timeout)
+
+
+def last_write_key(user_id, shared=False):
+    """Write position key a read by ``user_id`` must wait for; any writer's for a ``shared`` read"""
+    return '*' if shared or user_id is None else f'user:{user_id}'
+
+
+def last_write(user_id, shared=False):
+    """WAL position of ``user_id``'s last write, or any user's for a ``shared`` read.
+
+    Read from the response cache, so it costs no primary round trip.
+    """
+    return cache.get(WRITE_POSITION_KEY.format(last_write_key(user_id, shared)))
+
+
+_replica_pools = None
+_replica_router = None
+
+
+def get_replica_router():
+    """Process-wide replica router, shared by the sync and async serving modes"""
+    global _replica_router
+    if _replica_router is None:
+        with _pool_lock:
+            if _replica_router is None:
+                _replica_router = ReplicaRouter(len(REPLICA_HOSTS), REPLICA_CONFIG['max_lag'],
+                                                REPLICA_CONFIG['lag_check_interval'])
+    return _replica_router
+
+
+def get_replica_pools():
+    """Connection pools for the configured replicas, created on first use"""
+    global _replica_pools
+    if _replica_pools is None:
+        with _pool_lock:
+            if _replica_pools is None:
+                # No eager connections, so a replica that is down cannot fail startup
+                _replica_pools = [ConnectionPool(replica_config(host), **{**POOL_CONFIG, 'min_size': 0})
+                                  for host in REPLICA_HOSTS]
+    return _replica_pools
+
+
+def _primary_lsn():
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(PRIMARY_LSN_QUERY)
+        return parse_lsn(cursor.fetchone()[0])
+    finally:
+        pool.putconn(conn)
+
+
+def _measure_position(pool, primary_lsn, sampled_at):
+    conn = pool.getconn()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(REPLICA_POSITION_QUERY)
+        row = cursor.fetchone()
+        cursor.close()
+    finally:
+        pool.putconn(conn)
+    return replica_position(primary_lsn, sampled_at, *row)
+
+
+def _probe_replicas():
+    router = get_replica_router()
+    pools = get_replica_pools()
+    due = router.due()
+    if not due:
+        return
+    sampled_at = time.time()
+    try:
+        primary_lsn = _primary_lsn()
+    except Exception as e:
+        print(f"Primary WAL position check failed: {e}")
+        primary_lsn = None
+    for index in due:
+        try:
+            position = _measure_position(pools[index], primary_lsn, sampled_at)
+        except Exception as e:
+            print(f"Replica {REPLICA_HOSTS[index]} lag check failed: {e}")
+            position = None
+        router.record(index, position)
+
+
+_probe_thread = None
+_probe_pid = None
+
+
+def start_replica_probe():
+    """Probe replica positions every DB_REPLICA_LAG_CHECK_INTERVAL seconds on a background thread.
+
+    Started once per process (forked workers start their own), so requests
+    never wait on a probe.
+    """
+    global _probe_thread, _probe_pid
+    if _probe_pid == os.getpid():
+        return
+    with _pool_lock:
+        if _probe_pid == os.getpid():
+            return
+
+        def probe_forever():
+            while True:
+                _probe_replicas()
+                time.sleep(REPLICA_CONFIG['lag_check_interval'])
+
+        _probe_thread = threading.Thread(target=probe_forever, name='replica-probe', daemon=True)
+        _probe_thread.start()
+        _probe_pid = os.getpid()
+
+
+def _current_user():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+def _replica_connection():
+    """A connection to an eligible replica for this request's reads, or None"""
+    start_replica_probe()
+    router = get_replica_router()
+    if not router.any_eligible():
+        # Skip the write-position lookup when no replica could serve anyway
+        router.read_primary()
+        return None
+    wrote_lsn = last_write(_current_user(), shared=g.get('caching_response', False))
+    index = router.choose(wrote_lsn)
+    if index is None:
+        return None
+    pool = get_replica_pools()[index]
+    try:
+        return pool, pool.getconn()
+    except Exception as e:
+        print(f"Replica {REPLICA_HOSTS[index]} connection error: {e}")
+        router.record(index, None)
+        return None
+
+
+def read_from_replica(f):
+    """Serve a read-only route from a read replica when one is caught up.
+
+    Reads stay on the primary when no replica is within DB_REPLICA_MAX_LAG,
+    when no replica has replayed the WAL position of the caller's last write,
+    when the response is cached for other users and no replica has replayed
+    the latest write by anyone, and for ``since`` delta syncs (sync tokens come from the
+    primary's pg_stat_activity). Apply directly below ``@app.route`` so it
+    runs before anything else takes a connection.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.db_read_only = request.method in SAFE_METHODS and 'since' not in request.args
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def get_replica_stats():
+    """Replica lag and read counts, or None without replicas"""
+    if not REPLICA_HOSTS:
+        return None
+    stats = get_replica_router().stats()
+    for host, replica in zip(REPLICA_HOSTS, stats['replicas']):
+        replica['host'] = host
+    return stats
+
+def get_db_connection():
+    """Get the pooled database connection for the current request.
+
+    Routes marked ``read_from_replica`` get a replica connection when one is
+    eligible; everything else uses the primary.
+    """
+    if 'db_conn' in g:
+        return g.db_conn
+    try:
+        started = time.perf_counter()
+        replica = _replica_connection() if REPLICA_HOSTS and g.get('db_read_only') else None
+        pool, conn = replica or (get_pool(), get_pool().getconn())
+        instrumentation.record_acquire(time.perf_counter() - started)
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return None
+    g.db_conn = conn
+    g.db_pool = pool
+    if REPLICA_HOSTS and has_request_context() and request.method not in SAFE_METHODS:
+        g.db_writer = _current_user()
+    return conn
+
+
+def release_db_connection(exception=None):
+    """Return the request's connection to the pool on teardown"""
+    conn = g.pop('db_conn', None)
+    wrote = 'db_writer' in g
+    writer = g.pop('db_writer', None)
+    if conn is not None:
+        if wrote:
+            try:
+                mark_write(conn, writer)
+            except Exception as e:
+                print(f"Write position update failed: {e}")
+        g.pop('db_pool').putconn(conn)
+
+
+def init_app(app):
+    """Return request connections to the pool when the app context ends"""
+    app.teardown_appcontext(release_db_connection)
+
@@ -0,0 +1,89 @@
+"""Drift check and repair for the department_stats counters.
+
+department_stats is maintained by statement-level triggers on resources
+(see ``maintain_department_stats()`` in the schema), so it only drifts if
+the triggers were bypassed: ``session_replication_role = replica``, a
+restore without triggers, or manual edits. This job recounts every resource
+and compares the result with the stored counters in a single statement, so
+both sides come from one snapshot and concurrent writes cannot show up as
+drift. ``--repair`` rebuilds the counters with ``rebuild_department_stats()``.
+
+    DB_NAME=itdd_bench python department_stats.py
+    DB_NAME=itdd_bench python department_stats.py --repair
+
+The run exits non-zero when drift is found and not repaired, so it can run
+from cron or CI. Cached analytics responses pick up a repair when they
+expire (CACHE_DEFAULT_TIMEOUT).
+"""
+import argparse
+import sys
+
+import psycopg2
+
+from db import DB_CONFIG
+
+COUNTER_COLUMNS = (
+    'total_resources', 'billable_resources', 'benched_resources', 'shadow_resources',
+    'available_resources', 'on_leave_resources', 'transition_resources', 'active_resources',
+    'active_billable_resources', 'rating_sum', 'rated_resources'
+)
+
+RESOURCE_ROWS = 'SELECT 1 AS sign, department_id, status, is_active, performance_rating FROM resources'
+
+
+def find_drift(cursor):
+    """Departments whose stored counters differ from a recount of resources.
+
+    Returns ``{department_id: {column: (stored, actual)}}`` for the differing
+    columns only; a missing counter row counts as zeros.
+    """
+    cursor.execute("SELECT department_stats_delta_sql(%s)", (RESOURCE_ROWS,))
+    actual_sql = cursor.fetchone()[0]
+    columns = ', '.join(f'COALESCE(s.{c}, 0), COALESCE(a.{c}, 0)' for c in COUNTER_COLUMNS)
+    cursor.execute(f"""
+        SELECT COALESCE(s.department_id, a.department_id), {columns}
+        FROM department_stats s
+        FULL JOIN ({actual_sql}) a ON COALESCE(a.department_id, 0) = COALESCE(s.department_id, 0)
+    """)
+
+    drift = {}
+    for row in cursor.fetchall():
+        department_id, values = row[0], row[1:]
+        differing = {column: (values[2 * i], values[2 * i + 1])
+                     for i, column in enumerate(COUNTER_COLUMNS) if values[2 * i] != values[2 * i + 1]}
+        if differing:
+            drift[department_id] = differing
+    return drift
+
+
+def reconcile(conn, repair=False):
+    """Check the counters, rebuilding them when ``repair`` is set and drift was found"""
+    cursor = conn.cursor()
+    drift = find_drift(cursor)
+    conn.rollback()
+    if drift and repair:
+        cursor.execute("SELECT rebuild_department_stats()")
+        conn.commit()
+    return drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check department_stats against the resources table')
+    parser.add_argument('--repair', action='store_true', help='rebuild the counters if they drifted')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        drift = reconcile(conn, args.repair)
+    finally:
+        conn.close()
+
+    for department_id, differing in sorted(drift.items(), key=lambda item: item[0] or 0):
+        details = ', '.join(f'{column} {stored} != {actual}' for column, (stored, actual) in differing.items())
+        print(f"DRIFT department {department_id if department_id is not None else '(none)'}: {details}")
+    print(f"{len(drift)} department(s) drifted" + (', counters rebuilt' if drift and args.repair else ''))
+    return 1 if drift and not args.repair else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,32 @@
 
-from flask import Flask, request, jsonify, abort
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt
 import psycopg2
 from psycopg2.extras import RealDictCursor
-import bcrypt
 from datetime import datetime, timedelta
 import os
+import time
 from dotenv import load_dotenv
 from functools import wraps
 
+import db
+from db import get_db_connection, read_from_replica
+from overview import get_overview_snapshot, get_role_sections, build_overview, invalidate_overview_snapshot
+import response_cache
+import serialization
+import instrumentation
+import auth
+from auth import AuthBusy, check_password
+from response_cache import cached_response, invalidate_tables
+from pagination import list_response
+from queries import ROUTE_QUERIES, execute, route_query
+from rollups import ROLLUP_RESOLUTIONS, build_rollup_query
+from health_engine import ScenarioError, get_health_inputs, refresh_health, simulate
+from change_feed import ChangeHub, FeedError, ThreadSubscription, parse_subscription, stream_events
+from exports import EXPORT_DATASETS, EXPORT_FORMATS, build_export_query, export_response
+from ingest import IngestError, parse_payload, validate_rows, reject_unknown_projects, upsert_metrics
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -19,32 +36,21 @@ app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
 jwt = JWTManager(app)
 CORS(app, origins=["http://localhost:5173"])
 
-# Database configuration
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'database': os.getenv('DB_NAME', 'zapcom_resource_db'),
-    'user': os.getenv('DB_USER', 'postgres'),
-    'password': os.getenv('DB_PASSWORD', 'password'),
-    'port': os.getenv('DB_PORT', '5432')
-}
+db.init_app(app)
+instrumentation.init_app(app)
+serialization.init_app(app)
+response_cache.init_app(app)
+auth.init_app(jwt)
 
-def get_db_connection():
-    """Get database connection"""
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        return None
+# One LISTEN connection per worker process feeds every change stream
+change_hub = ChangeHub(lambda: psycopg2.connect(**db.DB_CONFIG))
 
 # Role-based access control decorators
 def require_role(*allowed_roles):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            claims = get_jwt()
-            user_role = claims.get('role')
-            if user_role not in allowed_roles:
+            if not auth.claims_have_role(get_jwt(), *allowed_roles):
                 return jsonify({'message': 'Access denied'}), 403
             return f(*args, **kwargs)
         return decorated_function
@@ -66,10 +72,11 @@ def login():
             return jsonify({'message': 'Database connection failed'}), 500
             
         cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
+        execute(cursor, ROUTE_QUERIES['user_by_email'], (email,), 'user_by_email')
         user = cursor.fetchone()
         
-        if user and bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+        # Hashing runs on the bounded bcrypt pool, not the request worker
+        if user and user['is_active'] is not False and check_password(password, user['password_hash']):
             access_token = create_access_token(
                 identity=user['id'],
                 additional_claims={
@@ -90,14 +97,37 @@ def login():
         else:
             return jsonify({'message': 'Invalid credentials'}), 401
             
+    except AuthBusy as e:
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'message': f'Login error: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
+
+@app.route('/api/auth/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    """Revoke the token used for this request"""
+    try:
+        auth.revoke_current_token()
+        return jsonify({'message': 'Logged out'}), 200
+        
+    except Exception as e:
+        return jsonify({'message': f'Logout error: {str(e)}'}), 500
+
+@app.route('/api/auth/revoke/<int:user_id>', methods=['POST'])
+@jwt_required()
+@require_role('admin')
+def revoke_user_tokens(user_id):
+    """Revoke all tokens issued to a user, e.g. after a role change or offboarding"""
+    try:
+        auth.revoke_user(user_id)
+        return jsonify({'message': f'Tokens for user {user_id} revoked'}), 200
+        
+    except Exception as e:
+        return jsonify({'message': f'Error revoking tokens: {str(e)}'}), 500
 
 # Dashboard Overview Routes
 @app.route('/api/dashboard/overview', methods=['GET'])
+@read_from_replica
 @jwt_required()
 def get_dashboard_overview():
     try:
@@ -105,129 +135,78 @@ def get_dashboard_overview():
         user_role = claims.get('role')
         
         conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Common metrics for all roles
-        overview = {}
-        
-        # Project health summary
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_projects,
-                COUNT(CASE WHEN health_status = 'Green' THEN 1 END) as green_projects,
-                COUNT(CASE WHEN health_status = 'Yellow' THEN 1 END) as yellow_projects,
-                COUNT(CASE WHEN health_status = 'Red' THEN 1 END) as red_projects,
-                AVG(health_score) as avg_health_score
-            FROM projects WHERE is_active = TRUE
-        """)
-        overview['project_health'] = cursor.fetchone()
-        
-        # Resource utilization
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_resources,
-                COUNT(CASE WHEN status = 'Billable' THEN 1 END) as billable_resources,
-                COUNT(CASE WHEN status = 'Benched' THEN 1 END) as benched_resources,
-                ROUND(COUNT(CASE WHEN status = 'Billable' THEN 1 END)::decimal / COUNT(*) * 100, 2) as utilization_rate
-            FROM resources WHERE is_active = TRUE
-        """)
-        overview['resource_utilization'] = cursor.fetchone()
-        
-        # Deliverables summary
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_deliverables,
-                COUNT(CASE WHEN status = 'Completed' THEN 1 END) as completed_deliverables,
-                COUNT(CASE WHEN status = 'Delayed' THEN 1 END) as delayed_deliverables,
-                COUNT(CASE WHEN due_date < CURRENT_DATE AND status != 'Completed' THEN 1 END) as overdue_deliverables
-            FROM deliverables
-        """)
-        overview['deliverables'] = cursor.fetchone()
-        
-        # Engineering metrics
-        cursor.execute("""
-            SELECT 
-                AVG(code_quality_score) as avg_code_quality,
-                AVG(test_coverage) as avg_test_coverage,
-                SUM(bugs_reported) as total_bugs_reported,
-                SUM(bugs_resolved) as total_bugs_resolved
-            FROM engineering_metrics 
-            WHERE metric_date >= CURRENT_DATE - INTERVAL '30 days'
-        """)
-        overview['engineering_metrics'] = cursor.fetchone()
-        
-        # QA metrics
-        cursor.execute("""
-            SELECT 
-                AVG(automation_coverage) as avg_automation_coverage,
-                AVG(defect_removal_efficiency) as avg_defect_removal_efficiency,
-                SUM(test_cases_total) as total_test_cases,
-                SUM(test_cases_passed) as total_passed
-            FROM qa_metrics 
-            WHERE metric_date >= CURRENT_DATE - INTERVAL '30 days'
-        """)
-        overview['qa_metrics'] = cursor.fetchone()
-        
-        # Role-specific data
-        if user_role in ['hr', 'leadership']:
-            # Financial overview
-            cursor.execute("""
-                SELECT 
-                    SUM(budget_allocated) as total_budget,
-                    SUM(budget_utilized) as total_utilized,
-                    SUM(revenue_generated) as total_revenue,
-                    AVG(profit_margin) as avg_profit_margin,
-                    AVG(burn_rate) as avg_burn_rate
-                FROM financial_tracking 
-                WHERE period_start >= CURRENT_DATE - INTERVAL '3 months'
-            """)
-            overview['financial'] = cursor.fetchone()
-            
-        if user_role == 'hr':
-            # HR-specific metrics
-            cursor.execute("""
-                SELECT 
-                    AVG(base_salary) as avg_salary,
-                    AVG(total_compensation) as avg_total_compensation,
-                    COUNT(*) as total_employees_with_salary
-                FROM salary_details sd
-                JOIN resources r ON sd.resource_id = r.id
-                WHERE r.is_active = TRUE
-            """)
-            overview['hr_metrics'] = cursor.fetchone()
+        # Common sections come from one shared snapshot; role-specific
+        # sections are queried separately and only for the roles that see them
+        snapshot = get_overview_snapshot(conn)
+        overview = build_overview(snapshot, get_role_sections(conn, user_role))
         
         return jsonify(overview), 200
         
     except Exception as e:
         return jsonify({'message': f'Error fetching dashboard overview: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 # Project Health Routes
 @app.route('/api/projects/health', methods=['GET'])
+@read_from_replica
 @jwt_required()
+@cached_response('projects', 'deliverables')
 def get_projects_health():
     try:
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        cursor.execute("""
-            SELECT * FROM v_project_health 
-            ORDER BY health_score DESC
-        """)
+        execute(cursor, ROUTE_QUERIES['projects_health'], name='projects_health')
         projects = cursor.fetchall()
         
         return jsonify([dict(project) for project in projects]), 200
         
     except Exception as e:
         return jsonify({'message': f'Error fetching project health: {str(e)}'}), 500
-    finally:
+
+@app.route('/api/projects/health/refresh', methods=['POST'])
+@jwt_required()
+@require_role('admin')
+def refresh_projects_health():
+    """Rescore every project for today's date, e.g. from a nightly job"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        scored, updated = refresh_health(conn)
+        conn.commit()
+        
+        if updated:
+            invalidate_tables('projects')
+            invalidate_overview_snapshot()
+        return jsonify({'message': 'Project health refreshed', 'scored': scored, 'updated': updated}), 200
+        
+    except Exception as e:
         if conn:
-            conn.close()
+            conn.rollback()
+        return jsonify({'message': f'Error refreshing project health: {str(e)}'}), 500
+
+@app.route('/api/projects/health/what-if', methods=['POST'])
+@jwt_required()
+def simulate_projects_health():
+    """Score shifted end dates or extra hours without writing anything"""
+    try:
+        scenario = request.get_json(silent=True)
+        if not isinstance(scenario, dict):
+            return jsonify({'message': 'Expected a scenario object'}), 400
+        
+        conn = get_db_connection()
+        inputs = get_health_inputs(conn)
+        
+        return jsonify(simulate(inputs, scenario)), 200
+        
+    except ScenarioError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error simulating project health: {str(e)}'}), 500
 
 # Deliverables Routes
 @app.route('/api/deliverables', methods=['GET'])
+@read_from_replica
 @jwt_required()
 def get_deliverables():
     try:
@@ -235,112 +214,141 @@ def get_deliverables():
         status = request.args.get('status')
         
         conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        query = """
-            SELECT d.*, p.name as project_name, r.name as assigned_to_name
-            FROM deliverables d
-            LEFT JOIN projects p ON d.project_id = p.id
-            LEFT JOIN resources r ON d.assigned_to = r.id
-            WHERE 1=1
-        """
-        params = []
-        
-        if project_id:
-            query += " AND d.project_id = %s"
-            params.append(project_id)
-            
-        if status:
-            query += " AND d.status = %s"
-            params.append(status)
-            
-        query += " ORDER BY d.due_date"
+        query, params = route_query('deliverables', project_id=project_id, status=status)
         
-        cursor.execute(query, params)
-        deliverables = cursor.fetchall()
-        
-        return jsonify([dict(deliverable) for deliverable in deliverables]), 200
+        return list_response(conn, query, params, [('due_date', 'ASC'), ('id', 'ASC')],
+                             sync_table='deliverables', name='deliverables')
         
     except Exception as e:
         return jsonify({'message': f'Error fetching deliverables: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 # Engineering Metrics Routes
 @app.route('/api/metrics/engineering', methods=['GET'])
+@read_from_replica
 @jwt_required()
 def get_engineering_metrics():
     try:
         project_id = request.args.get('project_id')
         days = int(request.args.get('days', 30))
+        resolution = request.args.get('resolution', 'day')
         
         conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        query = """
-            SELECT em.*, p.name as project_name
-            FROM engineering_metrics em
-            LEFT JOIN projects p ON em.project_id = p.id
-            WHERE em.metric_date >= CURRENT_DATE - INTERVAL '%s days'
-        """
-        params = [days]
-        
-        if project_id:
-            query += " AND em.project_id = %s"
-            params.append(project_id)
-            
-        query += " ORDER BY em.metric_date DESC, p.name"
+        # Long ranges read pre-aggregated weekly/monthly buckets
+        if resolution != 'day':
+            if resolution not in ROLLUP_RESOLUTIONS:
+                return jsonify({'message': f'Unsupported resolution: {resolution}'}), 400
+            query, params, order = build_rollup_query('engineering_metrics', resolution, days, project_id,
+                                                      request.args.get('scope') == 'org')
+            return list_response(conn, query, params, order)
         
-        cursor.execute(query, params)
-        metrics = cursor.fetchall()
+        query, params = route_query('engineering_metrics', [days], project_id=project_id)
         
-        return jsonify([dict(metric) for metric in metrics]), 200
+        return list_response(conn, query, params,
+                             [('metric_date', 'DESC'), ('project_name', 'ASC'), ('id', 'ASC')],
+                             name='engineering_metrics')
         
     except Exception as e:
         return jsonify({'message': f'Error fetching engineering metrics: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 # QA Metrics Routes
 @app.route('/api/metrics/qa', methods=['GET'])
+@read_from_replica
 @jwt_required()
 def get_qa_metrics():
     try:
         project_id = request.args.get('project_id')
         days = int(request.args.get('days', 30))
+        resolution = request.args.get('resolution', 'day')
         
         conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        query = """
-            SELECT qm.*, p.name as project_name
-            FROM qa_metrics qm
-            LEFT JOIN projects p ON qm.project_id = p.id
-            WHERE qm.metric_date >= CURRENT_DATE - INTERVAL '%s days'
-        """
-        params = [days]
-        
-        if project_id:
-            query += " AND qm.project_id = %s"
-            params.append(project_id)
-            
-        query += " ORDER BY qm.metric_date DESC, p.name"
+        # Long ranges read pre-aggregated weekly/monthly buckets
+        if resolution != 'day':
+            if resolution not in ROLLUP_RESOLUTIONS:
+                return jsonify({'message': f'Unsupported resolution: {resolution}'}), 400
+            query, params, order = build_rollup_query('qa_metrics', resolution, days, project_id,
+                                                      request.args.get('scope') == 'org')
+            return list_response(conn, query, params, order)
         
-        cursor.execute(query, params)
-        metrics = cursor.fetchall()
+        query, params = route_query('qa_metrics', [days], project_id=project_id)
         
-        return jsonify([dict(metric) for metric in metrics]), 200
+        return list_response(conn, query, params,
+                             [('metric_date', 'DESC'), ('project_name', 'ASC'), ('id', 'ASC')],
+                             name='qa_metrics')
         
     except Exception as e:
         return jsonify({'message': f'Error fetching QA metrics: {str(e)}'}), 500
-    finally:
+
+# Bulk Metrics Ingest Routes
+def ingest_metrics_batch(table):
+    """Validate and upsert a batch of metric rows in a single transaction"""
+    conn = None
+    try:
+        rows = parse_payload(request)
+        strict = request.args.get('strict', '').lower() == 'true'
+        
+        valid, rejects = validate_rows(table, rows)
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        if valid:
+            valid = reject_unknown_projects(cursor, valid, rejects)
+        rejects.sort(key=lambda reject: reject['row'])
+        
+        if strict and rejects:
+            conn.rollback()
+            return jsonify({
+                'message': 'Batch rejected',
+                'received': len(rows),
+                'inserted': 0,
+                'updated': 0,
+                'rejected': len(rejects),
+                'rejects': rejects
+            }), 422
+        
+        inserted = updated = 0
+        if valid:
+            inserted, updated = upsert_metrics(cursor, table, valid)
+        conn.commit()
+        
+        if valid:
+            invalidate_tables(table)
+            invalidate_overview_snapshot()
+        
+        return jsonify({
+            'message': 'Batch processed',
+            'received': len(rows),
+            'inserted': inserted,
+            'updated': updated,
+            'rejected': len(rejects),
+            'rejects': rejects
+        }), 200 if valid else 422
+        
+    except IngestError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
         if conn:
-            conn.close()
+            conn.rollback()
+        return jsonify({'message': f'Error ingesting {table}: {str(e)}'}), 500
+
+@app.route('/api/metrics/engineering/bulk', methods=['POST'])
+@jwt_required()
+@require_role('admin', 'delivery_owner')
+def bulk_ingest_engineering_metrics():
+    return ingest_metrics_batch('engineering_metrics')
+
+@app.route('/api/metrics/qa/bulk', methods=['POST'])
+@jwt_required()
+@require_role('admin', 'delivery_owner')
+def bulk_ingest_qa_metrics():
+    return ingest_metrics_batch('qa_metrics')
 
 # Escalations Routes
 @app.route('/api/escalations', methods=['GET'])
+@read_from_replica
 @jwt_required()
 def get_escalations():
     try:
@@ -348,38 +356,18 @@ def get_escalations():
         status = request.args.get('status', 'Open')
         
         conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        query = """
-            SELECT e.*, p.name as project_name, 
-                   rb.name as raised_by_name, ab.name as assigned_to_name
-            FROM escalations e
-            LEFT JOIN projects p ON e.project_id = p.id
-            LEFT JOIN resources rb ON e.raised_by = rb.id
-            LEFT JOIN resources ab ON e.assigned_to = ab.id
-            WHERE e.status = %s
-        """
-        params = [status]
-        
-        if project_id:
-            query += " AND e.project_id = %s"
-            params.append(project_id)
-            
-        query += " ORDER BY e.raised_date DESC"
+        query, params = route_query('escalations', [status], project_id=project_id)
         
-        cursor.execute(query, params)
-        escalations = cursor.fetchall()
-        
-        return jsonify([dict(escalation) for escalation in escalations]), 200
+        return list_response(conn, query, params, [('raised_date', 'DESC'), ('id', 'DESC')],
+                             sync_table='escalations', name='escalations')
         
     except Exception as e:
         return jsonify({'message': f'Error fetching escalations: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 # Financial Routes (HR and Leadership only)
 @app.route('/api/financial/overview', methods=['GET'])
+@read_from_replica
 @jwt_required()
 @require_role('hr', 'leadership')
 def get_financial_overview():
@@ -389,63 +377,52 @@ def get_financial_overview():
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        cursor.execute("""
-            SELECT * FROM v_financial_summary 
-            WHERE month >= CURRENT_DATE - INTERVAL '%s months'
-            ORDER BY month DESC
-        """, [months])
+        execute(cursor, ROUTE_QUERIES['financial_overview'], [months], 'financial_overview')
         financial_data = cursor.fetchall()
         
         return jsonify([dict(row) for row in financial_data]), 200
         
     except Exception as e:
         return jsonify({'message': f'Error fetching financial overview: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 # Department Performance Routes
 @app.route('/api/departments/performance', methods=['GET'])
+@read_from_replica
 @jwt_required()
+@cached_response('departments', 'resources')
 def get_department_performance():
     try:
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        cursor.execute("SELECT * FROM v_department_performance ORDER BY dept_health_score DESC")
+        execute(cursor, ROUTE_QUERIES['department_performance'], name='department_performance')
         departments = cursor.fetchall()
         
         return jsonify([dict(dept) for dept in departments]), 200
         
     except Exception as e:
         return jsonify({'message': f'Error fetching department performance: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 # HR-specific Routes
 @app.route('/api/hr/resources', methods=['GET'])
+@read_from_replica
 @jwt_required()
 @require_role('hr')
 def get_resources_with_salary():
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        cursor.execute("SELECT * FROM v_resource_performance_hr ORDER BY name")
-        resources = cursor.fetchall()
-        
-        return jsonify([dict(resource) for resource in resources]), 200
+        return list_response(conn, ROUTE_QUERIES['hr_resources'], [], [('name', 'ASC'), ('resource_id', 'ASC')],
+                             name='hr_resources')
         
     except Exception as e:
         return jsonify({'message': f'Error fetching HR resources: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 # Company KPIs Routes
 @app.route('/api/kpis/company', methods=['GET'])
+@read_from_replica
 @jwt_required()
+@cached_response('company_kpis')
 def get_company_kpis():
     try:
         days = int(request.args.get('days', 90))
@@ -453,25 +430,67 @@ def get_company_kpis():
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        cursor.execute("""
-            SELECT * FROM company_kpis 
-            WHERE kpi_date >= CURRENT_DATE - INTERVAL '%s days'
-            ORDER BY kpi_date DESC
-        """, [days])
+        execute(cursor, ROUTE_QUERIES['company_kpis'], [days], 'company_kpis')
         kpis = cursor.fetchall()
         
         return jsonify([dict(kpi) for kpi in kpis]), 200
         
     except Exception as e:
         return jsonify({'message': f'Error fetching company KPIs: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
+
+# Export Routes (HR and Leadership only)
+@app.route('/api/exports/<dataset>', methods=['GET'])
+@read_from_replica
+@jwt_required()
+@require_role('hr', 'leadership')
+def export_dataset(dataset):
+    try:
+        export_format = request.args.get('format', 'csv').lower()
+        
+        if dataset not in EXPORT_DATASETS:
+            return jsonify({'message': f'Unknown export dataset: {dataset}'}), 404
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'message': f'Unsupported export format: {export_format}'}), 400
+        
+        conn = get_db_connection()
+        query, params = build_export_query(dataset, request.args)
+        
+        return export_response(conn, dataset, export_format, query, params)
+        
+    except Exception as e:
+        return jsonify({'message': f'Error exporting {dataset}: {str(e)}'}), 500
+
+# Change Feed Routes
+@app.route('/api/changes/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_changes():
+    """Server-Sent Events feed of row changes, filtered by topic, project and role"""
+    try:
+        claims = get_jwt()
+        topics, project_ids = parse_subscription(request.args, claims.get('role'))
+    except FeedError as e:
+        return jsonify({'message': str(e)}), e.status
+    
+    # Streams outlive requests; end them once the token expires or is revoked
+    def is_valid():
+        return claims['exp'] > time.time() and not auth.is_token_revoked(None, claims)
+    
+    events = stream_events(change_hub, ThreadSubscription(topics, project_ids), is_valid,
+                           resume='Last-Event-ID' in request.headers)
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # Health check
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()}), 200
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.utcnow().isoformat(),
+        'db_pool': db.get_pool_stats(),
+        'db_replicas': db.get_replica_stats(),
+        'cache': response_cache.get_cache_stats(),
+        'change_feed': {'subscribers': change_hub.subscriber_count()}
+    }), 200
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
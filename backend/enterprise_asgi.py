@@ -0,0 +1,620 @@
+"""Async (ASGI) serving mode for the enterprise API.
+
+Read-heavy dashboard and analytics routes are served natively on an asyncpg
+pool, with independent queries run concurrently. Every other route (login,
+exports, bulk ingest, ...) is dispatched to the synchronous Flask app in a
+worker thread, so clients see the same routes and JSON shapes either way.
+
+Run with: hypercorn enterprise_asgi:application -b 0.0.0.0:5000 -w 4
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from functools import wraps
+
+import asyncpg
+import jwt as pyjwt
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, Response, g, has_request_context, jsonify, make_response, request
+from quart.wrappers.response import DataBody
+from werkzeug.exceptions import HTTPException
+
+import auth
+import db
+import instrumentation
+import response_cache
+import serialization
+from db import DB_CONFIG, POOL_CONFIG, REPLICA_CONFIG, REPLICA_HOSTS
+from enterprise_app import app as flask_app
+from overview import get_overview_snapshot_async, get_role_sections_async, build_overview
+from rollups import ROLLUP_RESOLUTIONS, build_rollup_query
+from change_feed import (AsyncChangeHub, AsyncSubscription, FeedError, parse_subscription,
+                         stream_events_async)
+from pagination import (STREAM_BATCH_SIZE, SYNC_EXPIRED_MESSAGE, SYNC_TOKEN_QUERY, changed_ids_query,
+                        decode_cursor, delta_body, delta_query, list_mode, order_by, page_body, page_query,
+                        parse_limit, parse_since, since_expired)
+from queries import PREPARED_STATEMENTS, ROUTE_QUERIES, positional, route_query
+
+# Largest request body forwarded to the Flask app (bulk ingest, imports)
+MAX_BODY_SIZE = int(os.getenv('ASGI_MAX_BODY_SIZE', 64 * 1024 * 1024))
+
+CORS_ORIGINS = ["http://localhost:5173"]
+
+
+class AsyncJSONProvider(serialization.ORJSONProvider):
+    def wants_columnar(self):
+        return has_request_context() and request.args.get('format') == 'columnar'
+
+
+app = Quart(__name__)
+app.json = AsyncJSONProvider(app)
+
+_pool = None
+_replica_pools = []
+_replica_probe = None
+
+# Dedicated LISTEN connection (outside the pool) shared by every change stream
+change_hub = AsyncChangeHub(lambda: asyncpg.connect(
+    host=DB_CONFIG['host'],
+    database=DB_CONFIG['database'],
+    user=DB_CONFIG['user'],
+    password=DB_CONFIG['password'],
+    port=int(DB_CONFIG['port'])
+))
+_column_types = {}
+
+
+@app.before_serving
+async def open_pool():
+    global _pool
+    _pool = await asyncpg.create_pool(
+        host=DB_CONFIG['host'],
+        database=DB_CONFIG['database'],
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        port=int(DB_CONFIG['port']),
+        min_size=POOL_CONFIG['min_size'],
+        max_size=POOL_CONFIG['max_size'],
+        # asyncpg prepares and caches every statement per connection
+        statement_cache_size=100 if PREPARED_STATEMENTS else 0,
+        init=_init_connection
+    )
+
+    global _replica_probe
+    for host in REPLICA_HOSTS:
+        config = db.replica_config(host)
+        _replica_pools.append(await asyncpg.create_pool(
+            host=config['host'],
+            database=config['database'],
+            user=config['user'],
+            password=config['password'],
+            port=int(config['port']),
+            timeout=config['connect_timeout'],
+            # No eager connections, so a replica that is down cannot fail startup
+            min_size=0,
+            max_size=POOL_CONFIG['max_size'],
+            statement_cache_size=100 if PREPARED_STATEMENTS else 0,
+            init=_init_connection
+        ))
+    if _replica_pools:
+        _replica_probe = asyncio.get_running_loop().create_task(_probe_replicas())
+
+
+@app.after_serving
+async def close_pool():
+    await change_hub.close()
+    if _replica_probe is not None:
+        _replica_probe.cancel()
+    for pool in _replica_pools:
+        await pool.close()
+    await _pool.close()
+
+
+async def _init_connection(conn):
+    # Match psycopg2, which decodes json columns instead of returning text
+    for type_name in ('json', 'jsonb'):
+        await conn.set_type_codec(type_name, encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+
+
+async def _probe_replicas():
+    """Measure every replica's replay position for the router shared with the Flask app"""
+    router = db.get_replica_router()
+    while True:
+        due = router.due()
+        if due:
+            sampled_at = time.time()
+            try:
+                primary_lsn = db.parse_lsn(await _pool.fetchval(db.PRIMARY_LSN_QUERY))
+            except Exception as e:
+                print(f"Primary WAL position check failed: {e}")
+                primary_lsn = None
+            for index in due:
+                try:
+                    async with _replica_pools[index].acquire(timeout=POOL_CONFIG['timeout']) as conn:
+                        row = await conn.fetchrow(db.REPLICA_POSITION_QUERY)
+                    position = db.replica_position(primary_lsn, sampled_at, *row)
+                except Exception as e:
+                    print(f"Replica {REPLICA_HOSTS[index]} lag check failed: {e}")
+                    position = None
+                router.record(index, position)
+        await asyncio.sleep(REPLICA_CONFIG['lag_check_interval'])
+
+
+async def _read_pool():
+    """Pool for this request's reads; see ``db.read_from_replica`` for when a replica is used"""
+    if not _replica_pools:
+        return _pool
+    router = db.get_replica_router()
+    if not router.any_eligible():
+        router.read_primary()
+        return _pool
+    user_id = g.jwt.get('sub') if 'jwt' in g else None
+    shared = g.get('caching_response', False)
+    with flask_app.app_context():
+        wrote_lsn = db.last_write(user_id, shared)
+    index = router.choose(wrote_lsn)
+    return _pool if index is None else _replica_pools[index]
+
+
+@asynccontextmanager
+async def get_db_connection(primary=False):
+    """Acquire a pooled asyncpg connection (use with ``async with``).
+
+    Native routes only read, so this is a replica connection when one is
+    eligible, unless ``primary`` is set.
+    """
+    pool = _pool if primary else await _read_pool()
+    async with pool.acquire(timeout=POOL_CONFIG['timeout']) as conn:
+        yield conn
+
+
+@app.after_request
+async def add_cors_headers(response):
+    origin = request.headers.get('Origin')
+    if origin in CORS_ORIGINS:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.vary.add('Origin')
+    return response
+
+
+@app.before_request
+async def start_request_metrics():
+    # Native routes query through asyncpg, so only latency, status and size are recorded
+    if instrumentation.METRICS_ENABLED:
+        g.request_metrics = instrumentation.start_request(request.url_rule.rule)
+
+
+@app.after_request
+async def finish_request_metrics(response):
+    current = g.pop('request_metrics', None)
+    if current is not None:
+        instrumentation.finish_request(current, request.method, response.status_code, response.content_length)
+    return response
+
+
+@app.after_request
+async def compress_response(response):
+    """Async counterpart of ``serialization.compress_response``"""
+    if not isinstance(response.response, DataBody):
+        return response
+    encoding = serialization.response_encoding(response, request.accept_encodings)
+    if encoding:
+        serialization.compress_body(response, await response.get_data(), encoding)
+    return response
+
+
+@app.after_request
+async def conditional_get(response):
+    """Async counterpart of ``response_cache.conditional_get``"""
+    if not response_cache.wants_etag(request.method, response) or not isinstance(response.response, DataBody):
+        return response
+    await response.add_etag()
+    response.headers.setdefault('Cache-Control', response_cache.CONDITIONAL_CACHE_CONTROL)
+    return await response.make_conditional(request)
+
+
+# JWT handling mirrors flask_jwt_extended so tokens and error bodies are
+# interchangeable between the two serving modes
+def get_jwt():
+    return g.jwt
+
+
+def jwt_required(locations=('headers',)):
+    def decorator(f):
+        @wraps(f)
+        async def decorated_function(*args, **kwargs):
+            header = request.headers.get('Authorization', '')
+            if header.startswith('Bearer '):
+                token = header[7:]
+            elif 'query_string' in locations and request.args.get('jwt'):
+                token = request.args['jwt']
+            else:
+                return jsonify({'msg': 'Missing Authorization Header'}), 401
+            try:
+                claims = pyjwt.decode(token, flask_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+            except pyjwt.ExpiredSignatureError:
+                return jsonify({'msg': 'Token has expired'}), 401
+            except pyjwt.InvalidTokenError as e:
+                return jsonify({'msg': str(e)}), 422
+            if claims.get('type') != 'access':
+                return jsonify({'msg': 'Only non-refresh tokens are allowed'}), 422
+            # Checked against this process's copy of the revocation list
+            with flask_app.app_context():
+                revoked = await auth.is_token_revoked_async(_pool, claims)
+            if revoked:
+                return jsonify({'msg': 'Token has been revoked'}), 401
+            g.jwt = claims
+            return await f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def require_role(*allowed_roles):
+    def decorator(f):
+        @wraps(f)
+        async def decorated_function(*args, **kwargs):
+            if not auth.claims_have_role(get_jwt(), *allowed_roles):
+                return jsonify({'message': 'Access denied'}), 403
+            return await f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def cached_response(*tables, timeout=None):
+    """Async counterpart of ``response_cache.cached_response``.
+
+    Keys and entries are shared with the Flask app, so a response cached by
+    either serving mode is a hit for the other.
+    """
+    def decorator(f):
+        @wraps(f)
+        async def decorated_function(*args, **kwargs):
+            with flask_app.app_context():
+                key = response_cache.response_key(request.path, request.args, get_jwt().get('role'), tables)
+                cached = response_cache.cache.get(key)
+            etag = response_cache.response_etag(key)
+
+            if cached is not None:
+                response_cache.record_lookup(request.endpoint, 'hits')
+                return response_cache.hit_response(app.response_class, cached, etag, request.if_none_match)
+
+            response_cache.record_lookup(request.endpoint, 'misses')
+            g.caching_response = True
+            response = await make_response(await f(*args, **kwargs))
+            data = await response.get_data() if isinstance(response.response, DataBody) else None
+            with flask_app.app_context():
+                return response_cache.store_response(key, etag, response, data, timeout)
+        return decorated_function
+    return decorator
+
+
+def _coerce(value, type_name):
+    # Cursor values round-trip through JSON as strings; asyncpg needs typed values
+    if not isinstance(value, str):
+        return value
+    if type_name == 'date':
+        return date.fromisoformat(value)
+    if type_name in ('timestamp', 'timestamptz'):
+        return datetime.fromisoformat(value)
+    if type_name == 'numeric':
+        return Decimal(value)
+    if type_name in ('int2', 'int4', 'int8'):
+        return int(value)
+    return value
+
+
+async def _order_column_types(conn, query):
+    types = _column_types.get(query)
+    if types is None:
+        statement = await conn.prepare(positional(query))
+        types = {attribute.name: attribute.type.name for attribute in statement.get_attributes()}
+        _column_types[query] = types
+    return types
+
+
+async def _stream_rows(query, params):
+    try:
+        async with get_db_connection() as conn:
+            async with conn.transaction():
+                yield '['
+                first = True
+                async for row in conn.cursor(positional(query), *params, prefetch=STREAM_BATCH_SIZE):
+                    if not first:
+                        yield ','
+                    first = False
+                    yield app.json.dumps(dict(row))
+                yield ']'
+    except Exception as e:
+        # Re-raised so the response is aborted rather than ended as a valid array
+        print(f"Error streaming rows: {e}")
+        raise
+
+
+async def _delta_response(query, params, order, table):
+    try:
+        since = parse_since(request.args['since'])
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    # Sync tokens come from the primary's pg_stat_activity
+    async with get_db_connection(primary=True) as conn:
+        sync_token = await conn.fetchval(SYNC_TOKEN_QUERY)
+        if since_expired(since, sync_token):
+            return jsonify({'message': SYNC_EXPIRED_MESSAGE}), 410
+
+        if since is None:
+            rows = await conn.fetch(positional(query + order_by(order)), *params)
+            return jsonify(delta_body(rows, [], sync_token)), 200
+
+        rows = await conn.fetch(positional(delta_query(query, order)), *params, since)
+        changed_query, changed_params = changed_ids_query(table, since)
+        changed = await conn.fetch(positional(changed_query), *changed_params)
+
+    return jsonify(delta_body(rows, [row['id'] for row in changed], sync_token)), 200
+
+
+async def list_response(query, params, order, sync_table=None):
+    """Async counterpart of ``pagination.list_response``; cursors and sync tokens are interchangeable"""
+    params = list(params)
+    mode = list_mode(request.args, sync_table)
+
+    if mode == 'delta':
+        return await _delta_response(query, params, order, sync_table)
+
+    if mode == 'stream':
+        return Response(_stream_rows(query + order_by(order), params), mimetype='application/json')
+
+    async with get_db_connection() as conn:
+        if mode == 'all':
+            rows = await conn.fetch(positional(query + order_by(order)), *params)
+            return jsonify([dict(row) for row in rows]), 200
+
+        try:
+            limit = parse_limit(request.args)
+            values = decode_cursor(request.args['cursor'], order) if request.args.get('cursor') else None
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        if values is not None:
+            types = await _order_column_types(conn, query)
+            values = [_coerce(value, types.get(column)) for value, (column, _) in zip(values, order)]
+
+        page, page_params = page_query(query, params, order, limit, values)
+        rows = await conn.fetch(positional(page), *page_params)
+
+    return jsonify(page_body(rows, order, limit)), 200
+
+
+# Dashboard Overview Routes
+@app.route('/api/dashboard/overview', methods=['GET'])
+@jwt_required()
+async def get_dashboard_overview():
+    try:
+        user_role = get_jwt().get('role')
+
+        # Sections are refreshed concurrently, each on its own connection
+        pool = await _read_pool()
+        snapshot = await get_overview_snapshot_async(pool)
+        overview = build_overview(snapshot, await get_role_sections_async(pool, user_role))
+
+        return jsonify(overview), 200
+
+    except Exception as e:
+        return jsonify({'message': f'Error fetching dashboard overview: {str(e)}'}), 500
+
+# Project Health Routes
+@app.route('/api/projects/health', methods=['GET'])
+@jwt_required()
+@cached_response('projects', 'deliverables')
+async def get_projects_health():
+    try:
+        async with get_db_connection() as conn:
+            projects = await conn.fetch(ROUTE_QUERIES['projects_health'])
+
+        return jsonify([dict(project) for project in projects]), 200
+
+    except Exception as e:
+        return jsonify({'message': f'Error fetching project health: {str(e)}'}), 500
+
+# Deliverables Routes
+@app.route('/api/deliverables', methods=['GET'])
+@jwt_required()
+async def get_deliverables():
+    try:
+        project_id = request.args.get('project_id')
+        status = request.args.get('status')
+
+        query, params = route_query('deliverables', project_id=int(project_id) if project_id else None,
+                                    status=status)
+
+        return await list_response(query, params, [('due_date', 'ASC'), ('id', 'ASC')], sync_table='deliverables')
+
+    except Exception as e:
+        return jsonify({'message': f'Error fetching deliverables: {str(e)}'}), 500
+
+# Engineering Metrics Routes
+@app.route('/api/metrics/engineering', methods=['GET'])
+@jwt_required()
+async def get_engineering_metrics():
+    try:
+        project_id = request.args.get('project_id')
+        days = int(request.args.get('days', 30))
+        resolution = request.args.get('resolution', 'day')
+
+        # Long ranges read pre-aggregated weekly/monthly buckets
+        if resolution != 'day':
+            if resolution not in ROLLUP_RESOLUTIONS:
+                return jsonify({'message': f'Unsupported resolution: {resolution}'}), 400
+            query, params, order = build_rollup_query('engineering_metrics', resolution, days, project_id,
+                                                      request.args.get('scope') == 'org')
+            return await list_response(query, params, order)
+
+        query, params = route_query('engineering_metrics', [days],
+                                    project_id=int(project_id) if project_id else None)
+
+        return await list_response(query, params,
+                                   [('metric_date', 'DESC'), ('project_name', 'ASC'), ('id', 'ASC')])
+
+    except Exception as e:
+        return jsonify({'message': f'Error fetching engineering metrics: {str(e)}'}), 500
+
+# QA Metrics Routes
+@app.route('/api/metrics/qa', methods=['GET'])
+@jwt_required()
+async def get_qa_metrics():
+    try:
+        project_id = request.args.get('project_id')
+        days = int(request.args.get('days', 30))
+        resolution = request.args.get('resolution', 'day')
+
+        # Long ranges read pre-aggregated weekly/monthly buckets
+        if resolution != 'day':
+            if resolution not in ROLLUP_RESOLUTIONS:
+                return jsonify({'message': f'Unsupported resolution: {resolution}'}), 400
+            query, params, order = build_rollup_query('qa_metrics', resolution, days, project_id,
+                                                      request.args.get('scope') == 'org')
+            return await list_response(query, params, order)
+
+        query, params = route_query('qa_metrics', [days], project_id=int(project_id) if project_id else None)
+
+        return await list_response(query, params,
+                                   [('metric_date', 'DESC'), ('project_name', 'ASC'), ('id', 'ASC')])
+
+    except Exception as e:
+        return jsonify({'message': f'Error fetching QA metrics: {str(e)}'}), 500
+
+# Escalations Routes
+@app.route('/api/escalations', methods=['GET'])
+@jwt_required()
+async def get_escalations():
+    try:
+        project_id = request.args.get('project_id')
+        status = request.args.get('status', 'Open')
+
+        query, params = route_query('escalations', [status], project_id=int(project_id) if project_id else None)
+
+        return await list_response(query, params, [('raised_date', 'DESC'), ('id', 'DESC')],
+                                   sync_table='escalations')
+
+    except Exception as e:
+        return jsonify({'message': f'Error fetching escalations: {str(e)}'}), 500
+
+# Financial Routes (HR and Leadership only)
+@app.route('/api/financial/overview', methods=['GET'])
+@jwt_required()
+@require_role('hr', 'leadership')
+async def get_financial_overview():
+    try:
+        months = int(request.args.get('months', 6))
+
+        async with get_db_connection() as conn:
+            financial_data = await conn.fetch(positional(ROUTE_QUERIES['financial_overview']), months)
+
+        return jsonify([dict(row) for row in financial_data]), 200
+
+    except Exception as e:
+        return jsonify({'message': f'Error fetching financial overview: {str(e)}'}), 500
+
+# Department Performance Routes
+@app.route('/api/departments/performance', methods=['GET'])
+@jwt_required()
+@cached_response('departments', 'resources')
+async def get_department_performance():
+    try:
+        async with get_db_connection() as conn:
+            departments = await conn.fetch(ROUTE_QUERIES['department_performance'])
+
+        return jsonify([dict(dept) for dept in departments]), 200
+
+    except Exception as e:
+        return jsonify({'message': f'Error fetching department performance: {str(e)}'}), 500
+
+# HR-specific Routes
+@app.route('/api/hr/resources', methods=['GET'])
+@jwt_required()
+@require_role('hr')
+async def get_resources_with_salary():
+    try:
+        return await list_response(ROUTE_QUERIES['hr_resources'], [], [('name', 'ASC'), ('resource_id', 'ASC')])
+
+    except Exception as e:
+        return jsonify({'message': f'Error fetching HR resources: {str(e)}'}), 500
+
+# Company KPIs Routes
+@app.route('/api/kpis/company', methods=['GET'])
+@jwt_required()
+@cached_response('company_kpis')
+async def get_company_kpis():
+    try:
+        days = int(request.args.get('days', 90))
+
+        async with get_db_connection() as conn:
+            kpis = await conn.fetch(positional(ROUTE_QUERIES['company_kpis']), days)
+
+        return jsonify([dict(kpi) for kpi in kpis]), 200
+
+    except Exception as e:
+        return jsonify({'message': f'Error fetching company KPIs: {str(e)}'}), 500
+
+# Change Feed Routes
+@app.route('/api/changes/stream', methods=['GET'])
+@jwt_required(locations=('headers', 'query_string'))
+async def stream_changes():
+    try:
+        claims = get_jwt()
+        topics, project_ids = parse_subscription(request.args, claims.get('role'))
+    except FeedError as e:
+        return jsonify({'message': str(e)}), e.status
+
+    async def is_valid():
+        if claims['exp'] <= time.time():
+            return False
+        with flask_app.app_context():
+            return not await auth.is_token_revoked_async(_pool, claims)
+
+    events = stream_events_async(change_hub, AsyncSubscription(topics, project_ids), is_valid,
+                                 resume='Last-Event-ID' in request.headers)
+    response = Response(events, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.timeout = None
+    return response
+
+
+# Health check
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.utcnow().isoformat(),
+        'mode': 'asgi',
+        'db_pool': {
+            'min_size': _pool.get_min_size(),
+            'max_size': _pool.get_max_size(),
+            'size': _pool.get_size(),
+            'idle': _pool.get_idle_size()
+        },
+        'db_replicas': db.get_replica_stats(),
+        'cache': response_cache.get_cache_stats(),
+        'change_feed': {'subscribers': change_hub.subscriber_count()}
+    }), 200
+
+
+_flask_fallback = AsyncioWSGIMiddleware(flask_app, max_body_size=MAX_BODY_SIZE)
+
+
+async def application(scope, receive, send):
+    """Serve natively async routes from Quart and everything else from Flask"""
+    if scope['type'] == 'http':
+        adapter = app.url_map.bind('')
+        try:
+            # Preflight requests go to Flask too, where flask_cors answers them
+            if scope['method'] == 'OPTIONS':
+                raise HTTPException()
+            adapter.match(scope['path'], method=scope['method'])
+        except HTTPException:
+            await _flask_fallback(scope, receive, send)
+            return
+    await app(scope, receive, send)
@@ -0,0 +1,218 @@
+import os
+import queue
+import tempfile
+import threading
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Response, current_app, send_file, stream_with_context
+from psycopg2.extras import RealDictCursor
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+# Exportable views and tables. ``date_column`` enables the ``days`` filter and
+# ``project_column`` the ``project_id`` filter.
+EXPORT_DATASETS = {
+    'resource_allocation': {
+        'source': 'v_resource_allocation',
+        'order_by': 'name, id'
+    },
+    'project_overview': {
+        'source': 'v_project_overview',
+        'order_by': 'name, id',
+        'project_column': 'id'
+    },
+    'engineering_metrics': {
+        'source': 'engineering_metrics',
+        'order_by': 'metric_date DESC, project_id',
+        'date_column': 'metric_date',
+        'project_column': 'project_id'
+    },
+    'qa_metrics': {
+        'source': 'qa_metrics',
+        'order_by': 'metric_date DESC, project_id',
+        'date_column': 'metric_date',
+        'project_column': 'project_id'
+    },
+    'company_kpis': {
+        'source': 'company_kpis',
+        'order_by': 'kpi_date DESC',
+        'date_column': 'kpi_date'
+    }
+}
+
+FETCH_BATCH_SIZE = 5000
+COPY_CHUNK_SIZE = 64 * 1024
+COPY_QUEUE_CHUNKS = 32
+
+
+def build_export_query(dataset, args):
+    """Build the SELECT for a dataset from its registry entry and request filters"""
+    spec = EXPORT_DATASETS[dataset]
+    query = f"SELECT * FROM {spec['source']} WHERE 1=1"
+    params = []
+
+    if spec.get('date_column') and args.get('days'):
+        query += f" AND {spec['date_column']} >= CURRENT_DATE - %s * INTERVAL '1 day'"
+        params.append(int(args['days']))
+
+    if spec.get('project_column') and args.get('project_id'):
+        query += f" AND {spec['project_column']} = %s"
+        params.append(int(args['project_id']))
+
+    query += f" ORDER BY {spec['order_by']}"
+    return query, params
+
+
+class _ChunkWriter:
+    """File-like sink for COPY that hands fixed-size chunks to a bounded queue"""
+
+    def __init__(self, chunks, cancelled):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.buffer = bytearray()
+
+    def put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                raise IOError('Export cancelled by client')
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data):
+        self.buffer += data if isinstance(data, bytes) else data.encode('utf-8')
+        if len(self.buffer) >= COPY_CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.put(bytes(self.buffer))
+            self.buffer = bytearray()
+
+
+def _copy_csv(conn, query, params):
+    # COPY runs on a worker thread and is throttled by the bounded queue, so a
+    # slow client applies backpressure instead of buffering the export
+    cursor = conn.cursor()
+    copy_sql = f"COPY ({cursor.mogrify(query, params).decode('utf-8')}) TO STDOUT WITH (FORMAT CSV, HEADER)"
+    chunks = queue.Queue(maxsize=COPY_QUEUE_CHUNKS)
+    cancelled = threading.Event()
+    writer = _ChunkWriter(chunks, cancelled)
+    errors = []
+
+    def produce():
+        try:
+            cursor.copy_expert(copy_sql, writer)
+            writer.flush()
+        except Exception as e:
+            if not cancelled.is_set():
+                print(f"Error exporting CSV: {e}")
+                errors.append(e)
+        finally:
+            try:
+                writer.put(None)
+            except IOError:
+                pass
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            yield chunk
+        if errors:
+            # Abort the chunked response so a failed COPY never ends as a complete file
+            raise errors[0]
+    finally:
+        cancelled.set()
+        while producer.is_alive():
+            try:
+                chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        producer.join()
+        cursor.close()
+
+
+def _stream_ndjson(conn, query, params):
+    cursor = conn.cursor(name=f"export_{uuid.uuid4().hex}", cursor_factory=RealDictCursor)
+    cursor.itersize = FETCH_BATCH_SIZE
+    try:
+        cursor.execute(query, params)
+        for row in cursor:
+            yield current_app.json.dumps(dict(row)) + '\n'
+    except Exception as e:
+        print(f"Error exporting NDJSON: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def _xlsx_value(value):
+    if isinstance(value, (str, int, float, Decimal, bool, date)) or value is None:
+        if isinstance(value, datetime) and value.tzinfo is not None:
+            return value.replace(tzinfo=None)
+        return value
+    if isinstance(value, (list, tuple)):
+        return ', '.join(str(item) for item in value if item is not None)
+    return str(value)
+
+
+def _write_xlsx(conn, query, params, dataset):
+    from openpyxl import Workbook
+
+    # Write-only workbooks stream rows to disk instead of holding cells in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=dataset[:31])
+
+    cursor = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+    cursor.itersize = FETCH_BATCH_SIZE
+    try:
+        cursor.execute(query, params)
+        header_written = False
+        for row in cursor:
+            if not header_written:
+                sheet.append([column.name for column in cursor.description])
+                header_written = True
+            sheet.append([_xlsx_value(value) for value in row])
+        if not header_written and cursor.description:
+            sheet.append([column.name for column in cursor.description])
+    finally:
+        cursor.close()
+
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(handle)
+    workbook.save(path)
+    return path
+
+
+def export_response(conn, dataset, export_format, query, params):
+    """Stream a dataset export in ``export_format`` (csv, ndjson or xlsx)"""
+    filename = f"{dataset}_{date.today().isoformat()}.{export_format}"
+    mimetype = EXPORT_FORMATS[export_format]
+
+    if export_format == 'xlsx':
+        path = _write_xlsx(conn, query, params, dataset)
+        # Unlink right away; the open handle keeps the file readable until sent
+        workbook_file = open(path, 'rb')
+        os.remove(path)
+        return send_file(workbook_file, mimetype=mimetype, as_attachment=True, download_name=filename)
+
+    if export_format == 'csv':
+        generator = _copy_csv(conn, query, params)
+    else:
+        generator = _stream_ndjson(conn, query, params)
+
+    response = Response(stream_with_context(generator), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
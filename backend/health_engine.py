@@ -0,0 +1,262 @@
+import os
+import threading
+import time
+from datetime import date
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+# Seconds the loaded project columns are reused by what-if simulations
+HEALTH_INPUTS_TTL = float(os.getenv('HEALTH_INPUTS_TTL', 60))
+
+# Budget, dates and deliverable aggregates for every project, one row each.
+# Deliverables are aggregated in a subquery so the projects can be locked.
+INPUTS_QUERY = """
+    SELECT p.id, p.name, p.budget, p.start_date, p.end_date,
+           p.health_score, p.health_status, p.delivery_risk,
+           COALESCE(d.total_actual_hours, 0) AS total_actual_hours,
+           COALESCE(d.total_deliverables, 0) AS total_deliverables,
+           COALESCE(d.completed_deliverables, 0) AS completed_deliverables
+    FROM projects p
+    LEFT JOIN (
+        SELECT project_id,
+               SUM(actual_hours) AS total_actual_hours,
+               COUNT(*) AS total_deliverables,
+               COUNT(CASE WHEN status = 'Completed' THEN 1 END) AS completed_deliverables
+        FROM deliverables
+        GROUP BY project_id
+    ) d ON d.project_id = p.id
+    ORDER BY p.id
+"""
+
+_inputs = None
+_inputs_at = 0.0
+_inputs_lock = threading.Lock()
+
+
+class ScenarioError(Exception):
+    """Raised when a what-if scenario cannot be applied"""
+
+
+def _ordinal(value):
+    return value.toordinal() if value is not None else 0
+
+
+def load_health_inputs(conn, lock=False):
+    """Load every project's health inputs into columnar numpy arrays.
+
+    With ``lock`` the project rows are locked in id order until the
+    transaction ends, so a concurrent trigger refresh cannot be overwritten.
+    """
+    cursor = conn.cursor()
+    cursor.execute(INPUTS_QUERY + (" FOR UPDATE OF p" if lock else ""))
+    rows = cursor.fetchall()
+
+    (ids, names, budgets, starts, ends, scores, statuses, risks,
+     hours, totals, completed) = zip(*rows) if rows else ([],) * 11
+    return {
+        'id': np.array(ids, dtype=np.int64),
+        'name': list(names),
+        'budget': np.array([float(b) if b is not None else np.nan for b in budgets]),
+        'has_start': np.array([s is not None for s in starts], dtype=bool),
+        'start': np.array([_ordinal(s) for s in starts], dtype=np.int64),
+        'has_end': np.array([e is not None for e in ends], dtype=bool),
+        'end': np.array([_ordinal(e) for e in ends], dtype=np.int64),
+        'health_score': np.array([s if s is not None else -1 for s in scores], dtype=np.int64),
+        'health_status': np.array(statuses, dtype=object),
+        'delivery_risk': np.array(risks, dtype=object),
+        'hours': np.array([float(h) for h in hours]),
+        'total': np.array(totals, dtype=np.int64),
+        'completed': np.array(completed, dtype=np.int64)
+    }
+
+
+def get_health_inputs(conn):
+    """Get the shared project columns, reloading them once they exceed the TTL"""
+    global _inputs, _inputs_at
+
+    if _inputs is not None and time.monotonic() - _inputs_at < HEALTH_INPUTS_TTL:
+        return _inputs
+
+    with _inputs_lock:
+        if _inputs is None or time.monotonic() - _inputs_at >= HEALTH_INPUTS_TTL:
+            _inputs = load_health_inputs(conn)
+            _inputs_at = time.monotonic()
+        return _inputs
+
+
+def invalidate_health_inputs():
+    """Force the next simulation to reload the project columns"""
+    global _inputs_at
+    _inputs_at = 0.0
+
+
+def _round(values):
+    # NUMERIC -> INTEGER casts round half away from zero; inputs are >= 0 here
+    return np.floor(values + 0.5).astype(np.int64)
+
+
+def score_projects(inputs, today=None, end_shift=0, extra_hours=0):
+    """Score every project in one vectorized pass.
+
+    Mirrors ``project_health_scores()`` in the schema: budget 30%, timeline
+    40% and deliverables 30%, with the same integer rounding. ``end_shift``
+    (days) and ``extra_hours`` may be scalars or per-project arrays.
+    """
+    today = (today or date.today()).toordinal()
+
+    budget = inputs['budget']
+    has_budget = np.nan_to_num(budget) > 0
+    burn = (inputs['hours'] + extra_hours) * 75.0 / np.where(has_budget, budget, 1) * 100
+    budget_health = np.where(has_budget, _round(np.clip(100 - (burn - 80) * 5, 0, 100)), 100)
+
+    end = inputs['end'] + np.where(inputs['has_end'], end_shift, 0)
+    duration = end - inputs['start']
+    in_flight = inputs['has_start'] & (today > inputs['start']) & (duration > 0)
+    progress = (today - inputs['start']) * 100 // np.where(in_flight, duration, 1)
+    timeline_health = np.select(
+        [~inputs['has_end'], today > end, in_flight],
+        [100, 0, np.clip(100 - (progress - 50) * 2, 0, 100)],
+        100
+    )
+
+    total = inputs['total']
+    deliverable_health = np.where(total > 0, inputs['completed'] * 100 // np.maximum(total, 1), 100)
+
+    # (b * 0.3 + t * 0.4 + d * 0.3)::INTEGER, kept in integers to round exactly
+    health_score = (3 * budget_health + 4 * timeline_health + 3 * deliverable_health + 5) // 10
+    return {
+        'budget_health': budget_health,
+        'timeline_health': timeline_health,
+        'deliverable_health': deliverable_health,
+        'health_score': health_score,
+        'health_status': np.select([health_score >= 80, health_score >= 60], ['Green', 'Yellow'], 'Red'),
+        'delivery_risk': np.select([health_score >= 80, health_score >= 60], ['Low', 'Medium'], 'High')
+    }
+
+
+def refresh_health(conn, today=None):
+    """Rescore every project and write the changed ones back in one UPDATE.
+
+    Timeline health depends on the current date, so this should run daily in
+    addition to the deliverable triggers. Returns ``(scored, updated)``.
+    """
+    inputs = load_health_inputs(conn, lock=True)
+    scores = score_projects(inputs, today)
+
+    changed = np.flatnonzero(
+        (scores['health_score'] != inputs['health_score'])
+        | (scores['health_status'] != inputs['health_status'])
+        | (scores['delivery_risk'] != inputs['delivery_risk'])
+    )
+    rows = list(zip(
+        inputs['id'][changed].tolist(),
+        scores['health_score'][changed].tolist(),
+        scores['health_status'][changed].tolist(),
+        scores['delivery_risk'][changed].tolist()
+    ))
+    if rows:
+        cursor = conn.cursor()
+        execute_values(cursor, """
+            UPDATE projects p
+            SET health_score = v.health_score,
+                health_status = v.health_status,
+                delivery_risk = v.delivery_risk
+            FROM (VALUES %s) AS v(id, health_score, health_status, delivery_risk)
+            WHERE p.id = v.id
+        """, rows, page_size=len(rows))
+
+    invalidate_health_inputs()
+    return len(inputs['id']), len(rows)
+
+
+def _per_project(inputs, value, name):
+    """Expand a scenario value (number or {project_id: number}) to a column"""
+    if value is None:
+        return 0
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    if not isinstance(value, dict):
+        raise ScenarioError(f'{name} must be a number or an object keyed by project id')
+
+    column = np.zeros(len(inputs['id']))
+    for project_id, amount in value.items():
+        try:
+            index = np.searchsorted(inputs['id'], int(project_id))
+        except (TypeError, ValueError):
+            raise ScenarioError(f'{name} keys must be project ids')
+        if index >= len(inputs['id']) or inputs['id'][index] != int(project_id):
+            raise ScenarioError(f'Project {project_id} not found')
+        if not isinstance(amount, (int, float)) or isinstance(amount, bool):
+            raise ScenarioError(f'{name} values must be numbers')
+        column[index] = amount
+    return column
+
+
+def simulate(inputs, scenario):
+    """Score a what-if scenario against the baseline for the same date.
+
+    ``scenario`` may set ``shift_end_days`` and ``add_hours`` (each a number
+    for every selected project, or an object keyed by project id),
+    ``project_ids`` to limit the result and ``as_of`` (ISO date).
+    """
+    try:
+        today = date.fromisoformat(scenario['as_of']) if scenario.get('as_of') else date.today()
+    except (TypeError, ValueError):
+        raise ScenarioError('as_of must be an ISO date')
+
+    project_ids = scenario.get('project_ids')
+    if project_ids is None:
+        selected = np.ones(len(inputs['id']), dtype=bool)
+    elif isinstance(project_ids, list) and all(isinstance(p, int) and not isinstance(p, bool) for p in project_ids):
+        selected = np.isin(inputs['id'], project_ids)
+    else:
+        raise ScenarioError('project_ids must be a list of project ids')
+
+    end_shift = np.rint(_per_project(inputs, scenario.get('shift_end_days'), 'shift_end_days')).astype(np.int64)
+    extra_hours = _per_project(inputs, scenario.get('add_hours'), 'add_hours')
+
+    baseline = score_projects(inputs, today)
+    simulated = score_projects(inputs, today, np.where(selected, end_shift, 0), np.where(selected, extra_hours, 0))
+
+    indexes = np.flatnonzero(selected)
+    projects = [{
+        'project_id': int(inputs['id'][i]),
+        'name': inputs['name'][i],
+        'baseline': {
+            'health_score': int(baseline['health_score'][i]),
+            'health_status': str(baseline['health_status'][i])
+        },
+        'simulated': {
+            'health_score': int(simulated['health_score'][i]),
+            'health_status': str(simulated['health_status'][i]),
+            'delivery_risk': str(simulated['delivery_risk'][i]),
+            'budget_health': int(simulated['budget_health'][i]),
+            'timeline_health': int(simulated['timeline_health'][i]),
+            'deliverable_health': int(simulated['deliverable_health'][i])
+        }
+    } for i in indexes]
+
+    def status_counts(scores):
+        statuses = scores['health_status'][indexes]
+        return {status: int(np.count_nonzero(statuses == status)) for status in ('Green', 'Yellow', 'Red')}
+
+    return {
+        'as_of': today.isoformat(),
+        'summary': {'baseline': status_counts(baseline), 'simulated': status_counts(simulated)},
+        'projects': projects
+    }
+
+
+if __name__ == '__main__':
+    # Daily refresh entry point, e.g. from cron shortly after midnight
+    import psycopg2
+    from db import DB_CONFIG
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        scored, updated = refresh_health(conn)
+        conn.commit()
+        print(f"Rescored {scored} projects, updated {updated}")
+    finally:
+        conn.close()
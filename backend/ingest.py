@@ -0,0 +1,213 @@
+import csv
+import io
+import os
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+MAX_INGEST_ROWS = int(os.getenv('MAX_INGEST_ROWS', 200000))
+
+INT_MAX = 2147483647
+
+# Metric columns accepted per table as (name, kind, min, max). Bounds mirror
+# the CHECK constraints and column precision in the schema. Omitted columns
+# are 0 on new rows and keep their stored value on existing rows.
+METRIC_TABLES = {
+    'engineering_metrics': [
+        ('commits_count', 'int', 0, INT_MAX),
+        ('lines_of_code', 'int', 0, INT_MAX),
+        ('code_quality_score', 'int', 0, 100),
+        ('test_coverage', 'int', 0, 100),
+        ('bugs_reported', 'int', 0, INT_MAX),
+        ('bugs_resolved', 'int', 0, INT_MAX),
+        ('code_review_time_avg', 'decimal', 0, Decimal('999.99')),
+        ('deployment_frequency', 'int', 0, INT_MAX),
+        ('lead_time_hours', 'decimal', 0, Decimal('999999.99')),
+        ('developer_productivity_score', 'int', 0, 100),
+        ('technical_debt_ratio', 'decimal', 0, Decimal('999.99'))
+    ],
+    'qa_metrics': [
+        ('test_cases_total', 'int', 0, INT_MAX),
+        ('test_cases_passed', 'int', 0, INT_MAX),
+        ('test_cases_failed', 'int', 0, INT_MAX),
+        ('automation_coverage', 'int', 0, 100),
+        ('manual_test_hours', 'int', 0, INT_MAX),
+        ('defects_found', 'int', 0, INT_MAX),
+        ('defects_fixed', 'int', 0, INT_MAX),
+        ('defect_removal_efficiency', 'decimal', 0, 100),
+        ('test_execution_rate', 'decimal', 0, 100),
+        ('regression_test_success', 'decimal', 0, 100),
+        ('performance_test_score', 'int', 0, 100),
+        ('security_test_score', 'int', 0, 100)
+    ]
+}
+
+
+class IngestError(ValueError):
+    pass
+
+
+def parse_payload(req):
+    """Read a batch from a JSON body (list or ``{"rows": [...]}``) or a CSV body"""
+    if req.mimetype in ('text/csv', 'application/csv'):
+        rows = list(csv.DictReader(io.StringIO(req.get_data(as_text=True))))
+    else:
+        data = req.get_json(silent=True)
+        rows = data.get('rows') if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            raise IngestError('Expected a JSON array of rows or {"rows": [...]}')
+
+    if not rows:
+        raise IngestError('Batch is empty')
+    if len(rows) > MAX_INGEST_ROWS:
+        raise IngestError(f'Batch exceeds {MAX_INGEST_ROWS} rows')
+    return rows
+
+
+def _parse_int(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError
+        return int(value)
+    return int(str(value).strip())
+
+
+def _parse_decimal(value):
+    if isinstance(value, bool):
+        raise ValueError
+    try:
+        result = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError
+    if not result.is_finite():
+        raise ValueError
+    return result
+
+
+def validate_rows(table, rows):
+    """Validate a batch in one pass.
+
+    Returns ``(valid, rejects)`` where ``valid`` is a list of ``(row_index,
+    values)`` tuples in column order and ``rejects`` lists every rejected
+    row with all of its errors.
+    """
+    columns = METRIC_TABLES[table]
+    valid = []
+    rejects = []
+    seen = {}
+
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            rejects.append({'row': index, 'errors': ['Row must be an object']})
+            continue
+
+        errors = []
+        values = []
+
+        try:
+            project_id = _parse_int(row.get('project_id'))
+            if project_id < 1 or project_id > INT_MAX:
+                raise ValueError
+        except (TypeError, ValueError):
+            project_id = None
+            errors.append('project_id must be a positive integer')
+
+        try:
+            metric_date = date.fromisoformat(str(row.get('metric_date')).strip())
+        except ValueError:
+            metric_date = None
+            errors.append('metric_date must be an ISO date (YYYY-MM-DD)')
+
+        for name, kind, minimum, maximum in columns:
+            value = row.get(name)
+            if value is None or value == '':
+                values.append(None)
+                continue
+            value_type = type(value)
+            # JSON numbers skip string parsing; Postgres rounds to column precision
+            if not (value_type is int or (value_type is float and kind == 'decimal')):
+                try:
+                    value = _parse_int(value) if kind == 'int' else _parse_decimal(value)
+                except (TypeError, ValueError):
+                    errors.append(f'{name} must be {"an integer" if kind == "int" else "a number"}')
+                    continue
+            if value != value or value < minimum or value > maximum:
+                errors.append(f'{name} must be between {minimum} and {maximum}')
+                continue
+            values.append(value)
+
+        if project_id is not None and metric_date is not None:
+            key = (project_id, metric_date)
+            if key in seen:
+                errors.append(f'Duplicate project_id/metric_date, first seen at row {seen[key]}')
+            else:
+                seen[key] = index
+
+        if errors:
+            rejects.append({'row': index, 'errors': errors})
+        else:
+            valid.append((index, [project_id, metric_date] + values))
+
+    return valid, rejects
+
+
+def reject_unknown_projects(cursor, valid, rejects):
+    """Drop rows whose project does not exist, checked with one query for the batch"""
+    project_ids = list({values[0] for _, values in valid})
+    cursor.execute("SELECT id FROM projects WHERE id = ANY(%s)", (project_ids,))
+    known = {row[0] for row in cursor.fetchall()}
+
+    kept = []
+    for index, values in valid:
+        if values[0] in known:
+            kept.append((index, values))
+        else:
+            rejects.append({'row': index, 'errors': [f'Project {values[0]} does not exist']})
+    return kept
+
+
+def upsert_metrics(cursor, table, valid):
+    """COPY validated rows into a staging table and upsert them in one statement.
+
+    Omitted metrics are staged as NULL: new rows store 0 for them and
+    existing rows keep their current values, read back from the staging row
+    that conflicted. Returns ``(inserted, updated)`` counts.
+    """
+    columns = ['project_id', 'metric_date'] + [name for name, _, _, _ in METRIC_TABLES[table]]
+    column_list = ', '.join(columns)
+
+    cursor.execute(f"""
+        CREATE TEMP TABLE metrics_staging ON COMMIT DROP AS
+        SELECT {column_list} FROM {table} WITH NO DATA
+    """)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for _, values in valid:
+        writer.writerow(values)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY metrics_staging ({column_list}) FROM STDIN WITH (FORMAT CSV)", buffer)
+    cursor.execute("CREATE INDEX ON metrics_staging (project_id, metric_date)")
+
+    metrics = columns[2:]
+    inserts = ', '.join(f"COALESCE({name}, 0)" for name in metrics)
+    updates = ', '.join(f"COALESCE(s.{name}, t.{name})" for name in metrics)
+    cursor.execute(f"""
+        WITH upserted AS (
+            INSERT INTO {table} AS t ({column_list})
+            SELECT project_id, metric_date, {inserts} FROM metrics_staging
+            ON CONFLICT (project_id, metric_date) DO UPDATE SET ({', '.join(metrics)}) = (
+                SELECT {updates} FROM metrics_staging s
+                WHERE s.project_id = EXCLUDED.project_id AND s.metric_date = EXCLUDED.metric_date
+            )
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT COUNT(*) FILTER (WHERE inserted) AS inserted,
+               COUNT(*) FILTER (WHERE NOT inserted) AS updated
+        FROM upserted
+    """)
+    inserted, updated = cursor.fetchone()
+    return inserted, updated
@@ -0,0 +1,413 @@
+"""Per-route request metrics and a slow-query log, exported for Prometheus.
+
+Pooled connections hand out cursors that time every statement and add it to
+the current request's totals. When the request finishes those totals, its
+latency, response size and connection wait are folded into per-route
+counters. Counters live in process memory, so each gunicorn worker reports
+its own and Prometheus should scrape every worker.
+
+Set ``METRICS_ENABLED=false`` to turn everything off; connections are then
+plain psycopg2 connections and no request hooks are installed.
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import g, has_request_context, jsonify, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from psycopg2 import extensions
+
+import queries
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+# Bearer token for scraping /api/metrics; an admin's access token works too.
+# Unset, only admins can read metrics.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+# Statements slower than this (milliseconds) go to the slow-query log
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 250))
+SLOW_QUERY_LOG_SIZE = int(os.getenv('SLOW_QUERY_LOG_SIZE', 200))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ACQUIRE_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+# Endpoints that serve metrics are not measured themselves
+UNMEASURED_ENDPOINTS = ('metrics', 'slow_queries')
+
+_routes = {}
+_routes_lock = threading.Lock()
+_slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout"""
+
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(self.bounds, self.counts):
+            running += count
+            yield bound, running
+
+
+class RouteStats:
+    __slots__ = ('latency', 'acquire', 'statuses', 'queries', 'db_time', 'rows', 'bytes')
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.acquire = Histogram(ACQUIRE_BUCKETS)
+        self.statuses = {}
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.bytes = 0
+
+
+# -----------------------------------------------------------------------------
+# Query timing
+# -----------------------------------------------------------------------------
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_REPEATED_TUPLES = re.compile(r"(\((?:\?, )*\?\))(?:, \1)+")
+_REPEATED_ITEMS = re.compile(r"\?(?:, \?)+")
+_WHITESPACE = re.compile(r"\s+")
+_PREPARE = re.compile(r"^\s*PREPARE\s+\w+\s+AS\s+", re.IGNORECASE)
+_EXECUTE = re.compile(r"^\s*EXECUTE\s+(\w+)", re.IGNORECASE)
+
+
+def prepared_text(sql):
+    """The statement text behind a ``queries.execute`` PREPARE or EXECUTE, else ``sql``"""
+    if not isinstance(sql, str):
+        return sql
+    prepare = _PREPARE.match(sql)
+    if prepare:
+        return sql[prepare.end():]
+    execute = _EXECUTE.match(sql)
+    return (queries.statement_sql(execute.group(1)) or sql) if execute else sql
+
+
+def normalize_sql(sql):
+    """Strip literals and placeholders so similar statements group together"""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    elif not isinstance(sql, str):
+        sql = str(sql)
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _REPEATED_TUPLES.sub(r'\1, ...', sql)
+    return _REPEATED_ITEMS.sub('?, ...', sql)
+
+
+def _current():
+    return g.get('request_metrics') if has_request_context() else None
+
+
+def record_query(sql, elapsed, rows):
+    current = _current()
+    if current is not None:
+        current['queries'] += 1
+        current['db_time'] += elapsed
+        current['rows'] += rows
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        route = current['route'] if current is not None else None
+        normalized = normalize_sql(prepared_text(sql))
+        _slow_queries.append({
+            'route': route,
+            'sql': normalized,
+            'duration_ms': round(elapsed * 1000, 2),
+            'at': datetime.utcnow().isoformat()
+        })
+        print(f"Slow query ({elapsed * 1000:.1f} ms) on {route or 'background'}: {normalized}")
+
+
+def record_acquire(elapsed):
+    """Record the time the current request waited for a pooled connection"""
+    current = _current()
+    if current is not None:
+        current['acquire'] = elapsed
+
+
+_statement_listeners = []
+
+
+def add_statement_listener(listener):
+    """Call ``listener(route, sql)`` with every statement as sent, parameters bound"""
+    _statement_listeners.append(listener)
+
+
+def remove_statement_listener(listener):
+    _statement_listeners.remove(listener)
+
+
+def _notify_statement(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    current = _current()
+    route = current['route'] if current is not None else None
+    for listener in list(_statement_listeners):
+        listener(route, sql)
+
+
+class TimedCursorMixin:
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            rows = self.rowcount if self.description is not None and self.rowcount > 0 else 0
+            record_query(query, time.perf_counter() - started, rows)
+            if _statement_listeners:
+                _notify_statement(self.query or query)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, time.perf_counter() - started, 0)
+            if _statement_listeners:
+                _notify_statement(self.query or query)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            record_query(sql, time.perf_counter() - started, max(self.rowcount, 0))
+            if _statement_listeners:
+                _notify_statement(sql)
+
+
+_timed_cursors = {}
+
+
+def _timed_cursor(factory):
+    timed = _timed_cursors.get(factory)
+    if timed is None:
+        timed = type(f'Timed{factory.__name__}', (TimedCursorMixin, factory), {})
+        _timed_cursors[factory] = timed
+    return timed
+
+
+class InstrumentedConnection(extensions.connection):
+    """psycopg2 connection whose cursors report their statements"""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor
+        kwargs['cursor_factory'] = _timed_cursor(factory)
+        return super().cursor(*args, **kwargs)
+
+
+def connection_factory():
+    """Connection class for the pool, or None when metrics are disabled"""
+    return InstrumentedConnection if METRICS_ENABLED else None
+
+
+# -----------------------------------------------------------------------------
+# Request accounting
+# -----------------------------------------------------------------------------
+
+def start_request(route):
+    return {'route': route, 'started': time.perf_counter(),
+            'queries': 0, 'db_time': 0.0, 'rows': 0, 'acquire': None}
+
+
+def finish_request(current, method, status, size):
+    elapsed = time.perf_counter() - current['started']
+    key = (current['route'], method)
+    with _routes_lock:
+        stats = _routes.get(key)
+        if stats is None:
+            stats = _routes[key] = RouteStats()
+        stats.latency.observe(elapsed)
+        if current['acquire'] is not None:
+            stats.acquire.observe(current['acquire'])
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        stats.queries += current['queries']
+        stats.db_time += current['db_time']
+        stats.rows += current['rows']
+        stats.bytes += size or 0
+
+
+def route_totals():
+    """Copy of the per-route counters, e.g. to diff around a benchmark run"""
+    with _routes_lock:
+        return {key: {'requests': stats.latency.count, 'queries': stats.queries, 'db_time': stats.db_time,
+                      'rows': stats.rows, 'bytes': stats.bytes}
+                for key, stats in _routes.items()}
+
+
+def _before_request():
+    if request.endpoint not in UNMEASURED_ENDPOINTS:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        g.request_metrics = start_request(route)
+
+
+def _after_request(response):
+    current = g.pop('request_metrics', None)
+    if current is not None:
+        # Streamed bodies have no length up front and are not counted
+        finish_request(current, request.method, response.status_code, response.content_length)
+    return response
+
+
+# -----------------------------------------------------------------------------
+# Export
+# -----------------------------------------------------------------------------
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _histogram_lines(name, histogram, labels):
+    for bound, count in histogram.cumulative():
+        yield f'{name}_bucket{_labels(**labels, le=bound)} {count}'
+    yield f'{name}_bucket{_labels(**labels, le="+Inf")} {histogram.count}'
+    yield f'{name}_sum{_labels(**labels)} {histogram.total}'
+    yield f'{name}_count{_labels(**labels)} {histogram.count}'
+
+
+def render_metrics(extra_gauges=None):
+    """All route metrics in the Prometheus text exposition format"""
+    with _routes_lock:
+        routes = sorted(_routes.items())
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        family('itdd_http_requests_total', 'counter', 'Requests handled, by route, method and status', [
+            f'itdd_http_requests_total{_labels(route=route, method=method, status=status)} {count}'
+            for (route, method), stats in routes for status, count in sorted(stats.statuses.items())
+        ])
+        family('itdd_http_request_duration_seconds', 'histogram', 'Time from request start to response', [
+            line for (route, method), stats in routes
+            for line in _histogram_lines('itdd_http_request_duration_seconds', stats.latency,
+                                         {'route': route, 'method': method})
+        ])
+        family('itdd_db_acquire_seconds', 'histogram', 'Time spent waiting for a pooled connection', [
+            line for (route, method), stats in routes if stats.acquire.count
+            for line in _histogram_lines('itdd_db_acquire_seconds', stats.acquire,
+                                         {'route': route, 'method': method})
+        ])
+        for name, attribute, help_text in (
+            ('itdd_db_queries_total', 'queries', 'SQL statements executed'),
+            ('itdd_db_query_seconds_total', 'db_time', 'Time spent executing SQL statements'),
+            ('itdd_db_rows_total', 'rows', 'Rows returned by SQL statements'),
+            ('itdd_http_response_bytes_total', 'bytes', 'Response body bytes sent (buffered responses)')
+        ):
+            family(name, 'counter', help_text, [
+                f'{name}{_labels(route=route, method=method)} {getattr(stats, attribute)}'
+                for (route, method), stats in routes
+            ])
+
+    family('itdd_slow_queries_logged', 'gauge', 'Entries in the slow-query log', [
+        f'itdd_slow_queries_logged {len(_slow_queries)}'
+    ])
+    for name, (help_text, value) in (extra_gauges or {}).items():
+        family(name, 'gauge', help_text, [f'{name} {value}'])
+    return '\n'.join(lines) + '\n'
+
+
+def slow_query_report():
+    """Recent slow statements, newest first, plus totals per normalized statement"""
+    entries = list(_slow_queries)
+    summary = {}
+    for entry in entries:
+        item = summary.setdefault(entry['sql'], {'sql': entry['sql'], 'count': 0, 'total_ms': 0.0,
+                                                 'max_ms': 0.0, 'routes': set()})
+        item['count'] += 1
+        item['total_ms'] += entry['duration_ms']
+        item['max_ms'] = max(item['max_ms'], entry['duration_ms'])
+        item['routes'].add(entry['route'])
+
+    statements = sorted(summary.values(), key=lambda item: item['total_ms'], reverse=True)
+    for item in statements:
+        item['total_ms'] = round(item['total_ms'], 2)
+        item['routes'] = sorted(route or 'background' for route in item['routes'])
+    return {'threshold_ms': SLOW_QUERY_MS, 'statements': statements, 'recent': entries[::-1]}
+
+
+def _unauthorized():
+    """An error response unless the request carries METRICS_TOKEN or an admin's access token"""
+    if METRICS_TOKEN and request.headers.get('Authorization') == f'Bearer {METRICS_TOKEN}':
+        return None
+    try:
+        verify_jwt_in_request()
+    except Exception:
+        return jsonify({'message': 'Metrics require METRICS_TOKEN or an admin token'}), 401
+    if get_jwt().get('role') != 'admin':
+        return jsonify({'message': 'Access denied'}), 403
+    return None
+
+
+def _pool_gauges():
+    import db  # db imports this module for its connection factory
+
+    pool = db.get_pool_stats()
+    if pool is None:
+        return {}
+    return {
+        'itdd_db_pool_in_use': ('Pooled connections checked out', pool['in_use']),
+        'itdd_db_pool_idle': ('Pooled connections idle', pool['idle']),
+        'itdd_db_pool_max_size': ('Pool size limit', pool['max_size']),
+        'itdd_db_pool_timeouts': ('Connection requests that timed out', pool['timeouts'])
+    }
+
+
+def metrics():
+    if not METRICS_ENABLED:
+        return jsonify({'message': 'Metrics are disabled'}), 404
+    denied = _unauthorized()
+    if denied is not None:
+        return denied
+    return render_metrics(_pool_gauges()), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+def slow_queries():
+    if not METRICS_ENABLED:
+        return jsonify({'message': 'Metrics are disabled'}), 404
+    denied = _unauthorized()
+    if denied is not None:
+        return denied
+    return jsonify(slow_query_report()), 200
+
+
+def init_app(app):
+    """Measure every request and serve ``/api/metrics``.
+
+    Call before ``serialization.init_app`` so response sizes are measured
+    after compression (after_request hooks run in reverse order).
+    """
+    app.add_url_rule('/api/metrics', 'metrics', metrics, methods=['GET'])
+    app.add_url_rule('/api/metrics/slow-queries', 'slow_queries', slow_queries, methods=['GET'])
+    if METRICS_ENABLED:
+        app.before_request(_before_request)
+        app.after_request(_after_request)
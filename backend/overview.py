@@ -0,0 +1,240 @@
+import asyncio
+import os
+import threading
+import time
+
+from psycopg2.extras import RealDictCursor
+
+# Seconds a dashboard overview snapshot is served before it is recomputed
+OVERVIEW_SNAPSHOT_TTL = float(os.getenv('OVERVIEW_SNAPSHOT_TTL', 60))
+
+# One aggregate per common overview section; each yields exactly one row
+SECTION_QUERIES = {
+    'project_health': """
+        SELECT
+            COUNT(*) as total_projects,
+            COUNT(CASE WHEN health_status = 'Green' THEN 1 END) as green_projects,
+            COUNT(CASE WHEN health_status = 'Yellow' THEN 1 END) as yellow_projects,
+            COUNT(CASE WHEN health_status = 'Red' THEN 1 END) as red_projects,
+            AVG(health_score) as avg_health_score
+        FROM projects WHERE is_active = TRUE
+    """,
+    'resource_utilization': """
+        SELECT
+            COUNT(*) as total_resources,
+            COUNT(CASE WHEN status = 'Billable' THEN 1 END) as billable_resources,
+            COUNT(CASE WHEN status = 'Benched' THEN 1 END) as benched_resources,
+            ROUND(COUNT(CASE WHEN status = 'Billable' THEN 1 END)::decimal / NULLIF(COUNT(*), 0) * 100, 2) as utilization_rate
+        FROM resources WHERE is_active = TRUE
+    """,
+    'deliverables': """
+        SELECT
+            COUNT(*) as total_deliverables,
+            COUNT(CASE WHEN status = 'Completed' THEN 1 END) as completed_deliverables,
+            COUNT(CASE WHEN status = 'Delayed' THEN 1 END) as delayed_deliverables,
+            COUNT(CASE WHEN due_date < CURRENT_DATE AND status != 'Completed' THEN 1 END) as overdue_deliverables
+        FROM deliverables
+    """,
+    'engineering_metrics': """
+        SELECT
+            AVG(code_quality_score) as avg_code_quality,
+            AVG(test_coverage) as avg_test_coverage,
+            SUM(bugs_reported) as total_bugs_reported,
+            SUM(bugs_resolved) as total_bugs_resolved
+        FROM engineering_metrics
+        WHERE metric_date >= CURRENT_DATE - INTERVAL '30 days'
+    """,
+    'qa_metrics': """
+        SELECT
+            AVG(automation_coverage) as avg_automation_coverage,
+            AVG(defect_removal_efficiency) as avg_defect_removal_efficiency,
+            SUM(test_cases_total) as total_test_cases,
+            SUM(test_cases_passed) as total_passed
+        FROM qa_metrics
+        WHERE metric_date >= CURRENT_DATE - INTERVAL '30 days'
+    """
+}
+
+# Sections only some roles see. Each runs as its own query, only for those
+# roles, so a failure in one of them never takes down the common snapshot.
+ROLE_SECTION_QUERIES = {
+    'financial': """
+        SELECT
+            SUM(total_budget) as total_budget,
+            SUM(budget_utilized) as total_utilized,
+            SUM(revenue_generated) as total_revenue,
+            AVG(profit_margin) as avg_profit_margin,
+            AVG(burn_rate) as avg_burn_rate
+        FROM financial_overview
+        WHERE month >= CURRENT_DATE - INTERVAL '3 months'
+    """,
+    'hr_metrics': """
+        SELECT
+            AVG(base_salary) as avg_salary,
+            AVG(base_salary + COALESCE(bonus, 0)) as avg_total_compensation,
+            COUNT(*) as total_employees_with_salary
+        FROM resources
+        WHERE is_active = TRUE AND base_salary IS NOT NULL
+    """
+}
+
+# Every common section in one round trip for the synchronous app. The cross join of
+# the single-row CTEs is a single row holding all sections' columns.
+OVERVIEW_QUERY = (
+    "WITH " + ",\n".join(f"{section} AS ({query})" for section, query in SECTION_QUERIES.items())
+    + "\nSELECT * FROM " + ", ".join(SECTION_QUERIES)
+)
+
+# Columns that belong to each response section
+OVERVIEW_SECTIONS = {
+    'project_health': ['total_projects', 'green_projects', 'yellow_projects',
+                       'red_projects', 'avg_health_score'],
+    'resource_utilization': ['total_resources', 'billable_resources',
+                             'benched_resources', 'utilization_rate'],
+    'deliverables': ['total_deliverables', 'completed_deliverables',
+                     'delayed_deliverables', 'overdue_deliverables'],
+    'engineering_metrics': ['avg_code_quality', 'avg_test_coverage',
+                            'total_bugs_reported', 'total_bugs_resolved'],
+    'qa_metrics': ['avg_automation_coverage', 'avg_defect_removal_efficiency',
+                   'total_test_cases', 'total_passed'],
+    'financial': ['total_budget', 'total_utilized', 'total_revenue',
+                  'avg_profit_margin', 'avg_burn_rate'],
+    'hr_metrics': ['avg_salary', 'avg_total_compensation',
+                   'total_employees_with_salary']
+}
+
+# Sections every role sees, and the extra sections unlocked per role
+COMMON_SECTIONS = ['project_health', 'resource_utilization', 'deliverables',
+                   'engineering_metrics', 'qa_metrics']
+ROLE_SECTIONS = {
+    'hr': ['financial', 'hr_metrics'],
+    'leadership': ['financial']
+}
+
+_snapshot = None
+_snapshot_at = 0.0
+_snapshot_lock = threading.Lock()
+_async_snapshot_lock = None
+
+# Role section -> (computed at, columns); same TTL and invalidation as the snapshot
+_role_sections = {}
+
+
+def _compute_snapshot(conn):
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(OVERVIEW_QUERY)
+    row = cursor.fetchone()
+    return {section: {column: row[column] for column in OVERVIEW_SECTIONS[section]}
+            for section in SECTION_QUERIES}
+
+
+def get_overview_snapshot(conn):
+    """Get the shared overview snapshot, refreshing it once it exceeds the TTL.
+
+    Only one request recomputes a stale snapshot; concurrent requests keep
+    serving the previous snapshot until the refresh lands.
+    """
+    global _snapshot, _snapshot_at
+
+    if _snapshot is not None and time.monotonic() - _snapshot_at < OVERVIEW_SNAPSHOT_TTL:
+        return _snapshot
+
+    if _snapshot is not None and not _snapshot_lock.acquire(blocking=False):
+        return _snapshot
+    if _snapshot is None:
+        _snapshot_lock.acquire()
+
+    try:
+        if _snapshot is None or time.monotonic() - _snapshot_at >= OVERVIEW_SNAPSHOT_TTL:
+            _snapshot = _compute_snapshot(conn)
+            _snapshot_at = time.monotonic()
+        return _snapshot
+    finally:
+        _snapshot_lock.release()
+
+
+async def _fetch_section(pool, query):
+    async with pool.acquire() as conn:
+        return await conn.fetchrow(query)
+
+
+async def get_overview_snapshot_async(pool):
+    """Async counterpart of ``get_overview_snapshot`` for an asyncpg pool.
+
+    Sections are queried concurrently on separate pooled connections, so a
+    refresh takes as long as the slowest section rather than their sum. The
+    snapshot, TTL and invalidation are shared with the synchronous app.
+    """
+    global _snapshot, _snapshot_at, _async_snapshot_lock
+
+    if _snapshot is not None and time.monotonic() - _snapshot_at < OVERVIEW_SNAPSHOT_TTL:
+        return _snapshot
+
+    if _async_snapshot_lock is None:
+        _async_snapshot_lock = asyncio.Lock()
+    if _snapshot is not None and _async_snapshot_lock.locked():
+        return _snapshot
+
+    async with _async_snapshot_lock:
+        if _snapshot is None or time.monotonic() - _snapshot_at >= OVERVIEW_SNAPSHOT_TTL:
+            rows = await asyncio.gather(*(_fetch_section(pool, query) for query in SECTION_QUERIES.values()))
+            _snapshot = {
+                section: {column: row[column] for column in OVERVIEW_SECTIONS[section]}
+                for section, row in zip(SECTION_QUERIES, rows)
+            }
+            _snapshot_at = time.monotonic()
+        return _snapshot
+
+
+def _cached_role_sections(role):
+    sections, missing = {}, []
+    for section in ROLE_SECTIONS.get(role, []):
+        cached = _role_sections.get(section)
+        if cached is not None and time.monotonic() - cached[0] < OVERVIEW_SNAPSHOT_TTL:
+            sections[section] = cached[1]
+        else:
+            missing.append(section)
+    return sections, missing
+
+
+def _store_role_section(section, row):
+    value = {column: row[column] for column in OVERVIEW_SECTIONS[section]}
+    _role_sections[section] = (time.monotonic(), value)
+    return value
+
+
+def get_role_sections(conn, role):
+    """The extra sections ``role`` may see, each queried on its own.
+
+    A failing section query raises, failing the whole overview; nothing is
+    cached for it, so the next request retries it.
+    """
+    sections, missing = _cached_role_sections(role)
+    for section in missing:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(ROLE_SECTION_QUERIES[section])
+        sections[section] = _store_role_section(section, cursor.fetchone())
+    return sections
+
+
+async def get_role_sections_async(pool, role):
+    """Async counterpart of ``get_role_sections`` for an asyncpg pool"""
+    sections, missing = _cached_role_sections(role)
+    rows = await asyncio.gather(*(_fetch_section(pool, ROLE_SECTION_QUERIES[section]) for section in missing))
+    for section, row in zip(missing, rows):
+        sections[section] = _store_role_section(section, row)
+    return sections
+
+
+def invalidate_overview_snapshot():
+    """Force the next overview request to recompute the snapshot"""
+    global _snapshot_at
+    _snapshot_at = 0.0
+    _role_sections.clear()
+
+
+def build_overview(snapshot, role_sections):
+    """Assemble a role's overview response from the shared snapshot and its role sections"""
+    overview = {section: snapshot[section] for section in COMMON_SECTIONS}
+    overview.update(role_sections)
+    return overview
@@ -0,0 +1,246 @@
+import base64
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from flask import Response, current_app, jsonify, request, stream_with_context
+from psycopg2.extras import RealDictCursor
+
+from queries import execute
+
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 2000
+
+# Days tombstones are kept; older ``since`` values must reload the full list
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv('SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+# High-water mark for the next delta. updated_at is the writer's transaction
+# start, so rows from transactions still open may later commit with an older
+# updated_at than now(); starting the next delta at the oldest open
+# transaction's start guarantees they are not missed.
+SYNC_TOKEN_QUERY = """
+    SELECT LEAST(now(), MIN(xact_start))::timestamp AS sync_token
+    FROM pg_stat_activity
+    WHERE datname = current_database() AND xact_start IS NOT NULL
+"""
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(row, order):
+    values = [row[column] for column, _ in order]
+    raw = json.dumps(values, default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor, order):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise InvalidCursor('Malformed cursor')
+    if not isinstance(values, list) or len(values) != len(order):
+        raise InvalidCursor('Cursor does not match this endpoint')
+    return values
+
+
+def keyset_condition(order, values):
+    """Build the WHERE fragment selecting rows strictly after ``values`` in ``order``.
+
+    Supports mixed sort directions by expanding to
+    ``(c1 > v1) OR (c1 = v1 AND c2 > v2) OR ...``.
+    """
+    clauses = []
+    params = []
+    for i, (column, direction) in enumerate(order):
+        parts = []
+        for prev_column, _ in order[:i]:
+            parts.append(f"{prev_column} = %s")
+        op = '<' if direction == 'DESC' else '>'
+        parts.append(f"{column} {op} %s")
+        clauses.append('(' + ' AND '.join(parts) + ')')
+        params.extend(values[:i + 1])
+    return '(' + ' OR '.join(clauses) + ')', params
+
+
+def order_by(order):
+    return ' ORDER BY ' + ', '.join(f"{column} {direction}" for column, direction in order)
+
+
+# The pieces below hold no connection, so the Flask and ASGI list responses
+# build identical SQL and bodies from them
+
+
+def list_mode(args, sync_table=None):
+    """How a list route answers query ``args``: ``delta``, ``stream``, ``all`` or ``page``"""
+    if sync_table and 'since' in args:
+        return 'delta'
+    if args.get('stream', '').lower() == 'true':
+        return 'stream'
+    if 'limit' not in args and 'cursor' not in args:
+        return 'all'
+    return 'page'
+
+
+def parse_limit(args):
+    """Page size from ``limit`` (default 100, at most MAX_PAGE_SIZE)"""
+    try:
+        limit = min(int(args.get('limit', 100)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        raise ValueError('limit must be a positive integer')
+    return limit
+
+
+def page_query(query, params, order, limit, values=None):
+    """SQL and parameters for the page of ``query`` after cursor ``values``.
+
+    One row more than ``limit`` is fetched to tell whether another page follows.
+    """
+    params = list(params)
+    page = f"SELECT * FROM ({query}) AS page"
+    if values is not None:
+        condition, condition_params = keyset_condition(order, values)
+        page += f" WHERE {condition}"
+        params.extend(condition_params)
+    return page + order_by(order) + " LIMIT %s", params + [limit + 1]
+
+
+def page_body(rows, order, limit):
+    """``{"data": [...], "next_cursor": ...}`` for rows fetched with ``page_query``"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'data': [dict(row) for row in rows],
+        'next_cursor': encode_cursor(rows[-1], order) if has_more else None
+    }
+
+
+SYNC_EXPIRED_MESSAGE = 'since is older than the sync retention window; reload the full list'
+
+
+def delta_query(query, order):
+    """``query`` limited to rows changed at or after a ``since`` parameter appended last"""
+    return f"SELECT * FROM ({query}) AS delta WHERE updated_at >= %s" + order_by(order)
+
+
+def changed_ids_query(table, since):
+    """SQL and parameters for the ids of ``table`` rows changed or deleted since ``since``"""
+    return f"""
+        SELECT id FROM {table} WHERE updated_at >= %s
+        UNION
+        SELECT row_id FROM sync_tombstones WHERE table_name = %s AND deleted_at >= %s
+    """, (since, table, since)
+
+
+def delta_body(rows, changed_ids, sync_token):
+    """Delta response body; changed rows that no longer match the route's filters count as deleted"""
+    returned = {row['id'] for row in rows}
+    return {'data': [dict(row) for row in rows],
+            'deleted': sorted(row_id for row_id in changed_ids if row_id not in returned),
+            'sync_token': sync_token.isoformat()}
+
+
+def _stream_rows(conn, query, params):
+    cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=RealDictCursor)
+    cursor.itersize = STREAM_BATCH_SIZE
+    try:
+        cursor.execute(query, params)
+        yield '['
+        first = True
+        for row in cursor:
+            if not first:
+                yield ','
+            first = False
+            yield current_app.json.dumps(dict(row))
+        yield ']'
+    except Exception as e:
+        # Re-raised so the server aborts the chunked response; ending it
+        # normally would hand the client a truncated array with a 200
+        print(f"Error streaming rows: {e}")
+        raise
+    finally:
+        cursor.close()
+
+
+def parse_since(value):
+    """Parse a ``since`` sync token; ``0`` asks for an initial full sync"""
+    if value == '0':
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError('since must be a sync token or 0')
+
+
+def since_expired(since, sync_token):
+    return since is not None and since.replace(tzinfo=None) < sync_token - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+
+
+def _delta_response(conn, query, params, order, table, name):
+    try:
+        since = parse_since(request.args['since'])
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    execute(cursor, SYNC_TOKEN_QUERY, name='sync_token')
+    sync_token = cursor.fetchone()['sync_token']
+    if since_expired(since, sync_token):
+        return jsonify({'message': SYNC_EXPIRED_MESSAGE}), 410
+
+    if since is None:
+        execute(cursor, query + order_by(order), params, name)
+        return jsonify(delta_body(cursor.fetchall(), [], sync_token)), 200
+
+    execute(cursor, delta_query(query, order), params + [since], name)
+    rows = cursor.fetchall()
+    changed_query, changed_params = changed_ids_query(table, since)
+    execute(cursor, changed_query, changed_params, f'{table}_deleted')
+    return jsonify(delta_body(rows, [row['id'] for row in cursor.fetchall()], sync_token)), 200
+
+
+def list_response(conn, query, params, order, sync_table=None, name=None):
+    """Run a list query in the mode requested by the query string.
+
+    ``order`` is a list of ``(output_column, 'ASC' | 'DESC')`` pairs that
+    uniquely orders the result; ``query`` must not have its own ORDER BY.
+
+    - default: the full result as a JSON array
+    - ``limit``/``cursor``: one keyset page as ``{"data": [...], "next_cursor": ...}``
+    - ``stream=true``: the full result streamed from a server-side cursor
+    - ``since``: with ``sync_table``, only the rows of that table changed or
+      deleted since a previous response's ``sync_token`` (``0`` for all) as
+      ``{"data": [...], "deleted": [ids], "sync_token": ...}``; the query
+      must return the table's ``id`` and ``updated_at``
+
+    With a registry ``name`` (see ``queries``) every statement except the
+    streamed one runs as a prepared statement.
+    """
+    params = list(params)
+    mode = list_mode(request.args, sync_table)
+
+    if mode == 'delta':
+        return _delta_response(conn, query, params, order, sync_table, name)
+
+    if mode == 'stream':
+        generator = _stream_rows(conn, query + order_by(order), params)
+        return Response(stream_with_context(generator), mimetype='application/json')
+
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    if mode == 'all':
+        execute(cursor, query + order_by(order), params, name)
+        return jsonify([dict(row) for row in cursor.fetchall()]), 200
+
+    try:
+        limit = parse_limit(request.args)
+        values = decode_cursor(request.args['cursor'], order) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    execute(cursor, *page_query(query, params, order, limit, values), name)
+    return jsonify(page_body(cursor.fetchall(), order, limit)), 200
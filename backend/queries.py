@@ -0,0 +1,165 @@
+"""Registry of route queries, server-prepared once per pooled connection.
+
+Each route query is defined here once and shared by the Flask and ASGI
+apps. Parameters are always bound values (intervals are built with
+``make_interval``), so the statement text is the same for every request and
+can be prepared.
+
+``execute`` prepares a statement on first use on a connection and runs it
+with ``EXECUTE`` afterwards, skipping parse and plan work on the hot paths.
+Statement names are the registry name plus a digest of the final text, so
+the page, cursor and delta variants built by ``list_response`` are prepared
+separately. On asyncpg connections the driver's own statement cache does the
+same for any repeated text.
+
+Set ``PREPARED_STATEMENTS=false`` behind a transaction-pooling proxy such as
+PgBouncer, where a session's prepared statements are not kept.
+"""
+import hashlib
+import os
+import threading
+import weakref
+
+PREPARED_STATEMENTS = os.getenv('PREPARED_STATEMENTS', 'true').lower() == 'true'
+
+# Route queries by name. List queries have no ORDER BY of their own;
+# list_response adds the keyset order.
+ROUTE_QUERIES = {
+    'user_by_email': "SELECT id, name, email, role, password_hash, is_active FROM users WHERE email = %s",
+    'projects_health': "SELECT * FROM v_project_health ORDER BY health_score DESC",
+    'deliverables': """
+        SELECT d.*, p.name as project_name, r.name as assigned_to_name
+        FROM deliverables d
+        LEFT JOIN projects p ON d.project_id = p.id
+        LEFT JOIN resources r ON d.assigned_to = r.id
+        WHERE TRUE
+    """,
+    'engineering_metrics': """
+        SELECT em.*, p.name as project_name
+        FROM engineering_metrics em
+        LEFT JOIN projects p ON em.project_id = p.id
+        WHERE em.metric_date >= CURRENT_DATE - make_interval(days => %s)
+    """,
+    'qa_metrics': """
+        SELECT qm.*, p.name as project_name
+        FROM qa_metrics qm
+        LEFT JOIN projects p ON qm.project_id = p.id
+        WHERE qm.metric_date >= CURRENT_DATE - make_interval(days => %s)
+    """,
+    'escalations': """
+        SELECT e.*, p.name as project_name,
+               rb.name as raised_by_name, ab.name as assigned_to_name
+        FROM escalations e
+        LEFT JOIN projects p ON e.project_id = p.id
+        LEFT JOIN resources rb ON e.raised_by = rb.id
+        LEFT JOIN resources ab ON e.assigned_to = ab.id
+        WHERE e.status = %s
+    """,
+    'financial_overview': """
+        SELECT * FROM v_financial_summary
+        WHERE month >= CURRENT_DATE - make_interval(months => %s)
+        ORDER BY month DESC
+    """,
+    # Reads the trigger-maintained department_stats counters, one row per
+    # department. The health score weights utilization 60% and the average
+    # performance rating (out of 5) 40%.
+    'department_performance': """
+        SELECT d.id AS department_id, d.name AS department_name,
+               COALESCE(s.active_resources, 0) AS total_resources,
+               COALESCE(s.active_billable_resources, 0) AS billable_resources,
+               ROUND(s.active_billable_resources::decimal / NULLIF(s.active_resources, 0) * 100, 1)
+                   AS utilization_rate,
+               ROUND(s.rating_sum / NULLIF(s.rated_resources, 0), 2) AS avg_performance_rating,
+               ROUND(COALESCE(
+                   0.6 * s.active_billable_resources::decimal / NULLIF(s.active_resources, 0) * 100
+                   + 0.4 * s.rating_sum / NULLIF(s.rated_resources, 0) * 20, 0))::INTEGER AS dept_health_score
+        FROM departments d
+        LEFT JOIN department_stats s ON s.department_id = d.id
+        WHERE COALESCE(d.is_active, TRUE)
+        ORDER BY dept_health_score DESC, d.id
+    """,
+    'hr_resources': "SELECT * FROM v_resource_performance_hr",
+    'company_kpis': """
+        SELECT * FROM company_kpis
+        WHERE kpi_date >= CURRENT_DATE - make_interval(days => %s)
+        ORDER BY kpi_date DESC
+    """
+}
+
+# Optional filters per list query, appended in this order when given
+ROUTE_FILTERS = {
+    'deliverables': {'project_id': 'd.project_id = %s', 'status': 'd.status = %s'},
+    'engineering_metrics': {'project_id': 'em.project_id = %s'},
+    'qa_metrics': {'project_id': 'qm.project_id = %s'},
+    'escalations': {'project_id': 'e.project_id = %s'}
+}
+
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+# Statement name -> prepared text, e.g. for EXPLAIN EXECUTE in query_plans.py
+_statements = {}
+
+
+def route_query(name, params=(), **filters):
+    """SQL and parameters for a registered query with the given filters applied.
+
+    Filters whose value is None or empty are left out.
+    """
+    query = ROUTE_QUERIES[name]
+    params = list(params)
+    for column, condition in ROUTE_FILTERS.get(name, {}).items():
+        value = filters.pop(column, None)
+        if value not in (None, ''):
+            query += f" AND {condition}"
+            params.append(value)
+    if filters:
+        raise KeyError(f"{name} has no filter {', '.join(filters)}")
+    return query, params
+
+
+def positional(query):
+    """Rewrite psycopg2-style %s placeholders as $1, $2, ..."""
+    parts = query.split('%s')
+    return ''.join(part + (f'${i}' if i < len(parts) else '') for i, part in enumerate(parts, 1))
+
+
+def statement_name(name, query):
+    return f"{name}_{hashlib.sha1(query.encode('utf-8')).hexdigest()[:10]}"
+
+
+def statement_sql(statement):
+    """Text a statement was prepared with, or None if it was never prepared"""
+    return _statements.get(statement)
+
+
+def _prepared_on(conn):
+    with _prepared_lock:
+        prepared = _prepared.get(conn)
+        if prepared is None:
+            prepared = _prepared[conn] = set()
+        return prepared
+
+
+def execute(cursor, query, params=(), name=None):
+    """Run ``query`` on a psycopg2 cursor as a prepared statement.
+
+    Without a ``name``, or with prepared statements disabled, this is a
+    plain ``cursor.execute``. The statement is prepared on the cursor's
+    connection the first time it is seen there; PREPARE is not undone by a
+    rollback, so it stays valid for the connection's lifetime.
+    """
+    if name is None or not PREPARED_STATEMENTS:
+        cursor.execute(query, params)
+        return
+
+    statement = statement_name(name, query)
+    prepared = _prepared_on(cursor.connection)
+    if statement not in prepared:
+        _statements[statement] = positional(query)
+        cursor.execute(f"PREPARE {statement} AS {_statements[statement]}")
+        prepared.add(statement)
+
+    if params:
+        cursor.execute(f"EXECUTE {statement} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f"EXECUTE {statement}")
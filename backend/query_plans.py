@@ -0,0 +1,368 @@
+"""Query plan regression harness and index advisor for the route queries.
+
+Every route is driven once through the benchmark cases (plus filtered
+variants of the list routes) while the instrumented cursors report each
+statement as sent. Each distinct statement is then run under
+``EXPLAIN (ANALYZE, BUFFERS)`` in a transaction that is rolled back, so
+write statements leave no trace.
+
+Plans are checked for sequential scans over many rows, sorts and hashes
+that spill to disk and filters that discard most of the rows they read.
+For the affected tables the advisor proposes composite or partial indexes
+(equality columns first, then the sort or range column) unless an existing
+index already starts with those columns. Results are compared with a stored
+baseline and the run exits non-zero when a statement gains a problem or its
+estimated cost grows.
+
+    DB_NAME=itdd_bench python datagen.py --scale medium --reset
+    DB_NAME=itdd_bench python query_plans.py
+    DB_NAME=itdd_bench python query_plans.py --update-baseline
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+import psycopg2
+
+import instrumentation
+import queries
+from benchmark import Case, Runner, build_cases, load_fixtures
+from db import DB_CONFIG
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plan_baseline.json')
+
+# Scans reading at least this many rows are worth an index
+SCAN_MIN_ROWS = int(os.getenv('PLAN_SCAN_MIN_ROWS', 10000))
+# Estimated cost growth over the baseline that counts as a regression
+COST_TOLERANCE = 0.5
+# Per-statement limit so one bad plan cannot stall the run
+STATEMENT_TIMEOUT_MS = 60000
+
+SCAN_NODES = ('Seq Scan', 'Index Scan', 'Index Only Scan', 'Bitmap Heap Scan')
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+_COPY_OUT = re.compile(r"^COPY\s*\((.*)\)\s*TO\s+STDOUT", re.IGNORECASE | re.DOTALL)
+_EXECUTE = re.compile(r"^EXECUTE\s+(\w+)", re.IGNORECASE)
+_PREPARE = re.compile(r"^PREPARE\s+\w+\s+AS\s+", re.IGNORECASE)
+_EQUALITY = re.compile(r"\(?(\w+)\)?(?:::[\w ]+)? = (?:ANY )?")
+_RANGE = re.compile(r"\(?(\w+)\)?(?:::[\w ]+)? [<>]=? ")
+_PARTIAL_FLAGS = ('is_active',)
+
+
+def filtered_cases(fixtures):
+    """Filtered and paginated variants of the list routes"""
+    project_id = fixtures['project_ids'][0]
+    return [
+        Case('enterprise', 'GET', f'/api/deliverables?project_id={project_id}&status=Pending',
+             name='enterprise GET /api/deliverables?project_id&status'),
+        Case('enterprise', 'GET', '/api/deliverables?status=Delayed&limit=50',
+             name='enterprise GET /api/deliverables?status&limit'),
+        Case('enterprise', 'GET', '/api/escalations?limit=50', name='enterprise GET /api/escalations?limit'),
+        Case('enterprise', 'GET', f'/api/escalations?project_id={project_id}',
+             name='enterprise GET /api/escalations?project_id'),
+        Case('enterprise', 'GET', f'/api/metrics/engineering?project_id={project_id}&days=90',
+             name='enterprise GET /api/metrics/engineering?project_id'),
+        Case('enterprise', 'GET', '/api/metrics/engineering?days=7&limit=50',
+             name='enterprise GET /api/metrics/engineering?limit'),
+        Case('enterprise', 'GET', f'/api/metrics/qa?project_id={project_id}&days=90',
+             name='enterprise GET /api/metrics/qa?project_id'),
+        Case('enterprise', 'GET', '/api/metrics/engineering?resolution=week&days=365',
+             name='enterprise GET /api/metrics/engineering?resolution=week')
+    ]
+
+
+def capture_statements(runner, cases):
+    """Run every case once; returns ``{normalized_sql: (case_name, sql)}``"""
+    statements = {}
+    current = {}
+
+    def listener(route, sql):
+        key = instrumentation.normalize_sql(statement_text(sql))
+        # Keep the EXECUTE (it carries the parameters) over its PREPARE
+        if key not in statements or _PREPARE.match(statements[key][1]):
+            statements[key] = (current['case'], sql)
+
+    instrumentation.add_statement_listener(listener)
+    try:
+        for case in cases:
+            current['case'] = case.name
+            runner.request(case, 0)
+    finally:
+        instrumentation.remove_statement_listener(listener)
+    return statements
+
+
+def statement_text(sql):
+    """``sql`` with a registry PREPARE or EXECUTE resolved to the prepared text"""
+    sql = sql.strip()
+    prepare = _PREPARE.match(sql)
+    if prepare:
+        return sql[prepare.end():]
+    execute = _EXECUTE.match(sql)
+    return queries.statement_sql(execute.group(1)) or sql if execute else sql
+
+
+def explainable(sql):
+    """The statement to EXPLAIN for ``sql``, or None when it has no plan"""
+    sql = sql.strip().rstrip(';')
+    prepare = _PREPARE.match(sql)
+    if prepare:
+        # Only left when the PREPARE itself failed; explaining it reports why
+        return sql[prepare.end():]
+    copy = _COPY_OUT.match(sql)
+    if copy:
+        return copy.group(1)
+    execute = _EXECUTE.match(sql)
+    if execute:
+        return sql if queries.statement_sql(execute.group(1)) else None
+    return sql if sql.split(None, 1)[0].upper() in EXPLAINABLE else None
+
+
+def explain(conn, sql):
+    """``EXPLAIN (ANALYZE, BUFFERS)`` output as a dict; the statement is rolled back.
+
+    ``EXECUTE`` of a registry statement is explained by preparing the same
+    text on this connection first.
+    """
+    cursor = conn.cursor()
+    execute = _EXECUTE.match(sql)
+    try:
+        cursor.execute(f"SET LOCAL statement_timeout = {STATEMENT_TIMEOUT_MS}")
+        if execute:
+            cursor.execute(f"PREPARE {execute.group(1)} AS {queries.statement_sql(execute.group(1))}")
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+        return cursor.fetchone()[0][0]
+    finally:
+        conn.rollback()
+        if execute:
+            # PREPARE is not transactional
+            cursor.execute("DEALLOCATE ALL")
+            conn.rollback()
+
+
+def walk(node, ancestors=()):
+    yield node, ancestors
+    for child in node.get('Plans', ()):
+        yield from walk(child, ancestors + (node,))
+
+
+def _conditions(node):
+    return ' AND '.join(node[key] for key in ('Index Cond', 'Recheck Cond', 'Filter') if node.get(key))
+
+
+def _columns(pattern, text):
+    return list(dict.fromkeys(match.group(1) for match in pattern.finditer(text)))
+
+
+def _sort_columns(node, ancestors):
+    """Leading keys of the nearest sort above ``node`` that belong to its table"""
+    alias = node.get('Alias')
+    for ancestor in reversed(ancestors):
+        if ancestor['Node Type'] not in ('Sort', 'Incremental Sort'):
+            continue
+        columns = []
+        for key in ancestor.get('Sort Key', ()):
+            table, _, rest = key.partition('.')
+            if not rest or table != alias:
+                break
+            columns.append(rest)
+        return columns
+    return []
+
+
+def _flag_columns(text):
+    """Boolean flag columns required to be true, e.g. ``Filter: is_active``"""
+    return [flag for flag in _PARTIAL_FLAGS
+            if re.search(rf"(?<!NOT )\b{flag}\b(?! = false| IS FALSE| IS NOT)", text)]
+
+
+def analyze_plan(plan):
+    """Problems found in a plan and the index each scan would want.
+
+    Returns ``(problems, wanted)`` where ``wanted`` holds
+    ``(table, columns, predicate)`` tuples.
+    """
+    problems = []
+    wanted = []
+    for node, ancestors in walk(plan['Plan']):
+        loops = node.get('Actual Loops', 1) or 1
+        node_type = node['Node Type']
+
+        if node.get('Sort Space Type') == 'Disk':
+            problems.append(f"sort_spill:{node.get('Sort Space Used', 0)}kB")
+        if node_type == 'Hash' and node.get('Hash Batches', 1) > 1:
+            problems.append(f"hash_spill:{node['Hash Batches']} batches")
+        if node_type not in SCAN_NODES:
+            continue
+
+        table = node['Relation Name']
+        returned = node.get('Actual Rows', 0) * loops
+        removed = (node.get('Rows Removed by Filter', 0) + node.get('Rows Removed by Index Recheck', 0)) * loops
+        read = returned + removed
+        sort_columns = _sort_columns(node, ancestors)
+
+        if node_type == 'Seq Scan' and read >= SCAN_MIN_ROWS:
+            problems.append(f'seq_scan:{table}')
+        elif removed >= SCAN_MIN_ROWS and removed > returned:
+            problems.append(f'filter_discard:{table}')
+        elif not (sort_columns and returned >= SCAN_MIN_ROWS):
+            continue
+
+        text = _conditions(node)
+        flags = _flag_columns(text)
+        equality = [column for column in _columns(_EQUALITY, text) if column not in flags]
+        ranges = [column for column in _columns(_RANGE, text) if column not in equality]
+        columns = equality + [column for column in sort_columns or ranges[:1] if column.split()[0] not in equality]
+        if columns:
+            predicate = ' AND '.join(f'{flag} = TRUE' for flag in flags) or None
+            wanted.append((table, columns, predicate))
+    return problems, wanted
+
+
+def load_indexes(conn):
+    """Existing indexes as ``{table: [(columns, predicate), ...]}``"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT t.relname,
+               ARRAY(SELECT pg_get_indexdef(ix.indexrelid, k.n::int, true)
+                     FROM generate_series(1, ix.indnkeyatts) k(n) ORDER BY k.n),
+               pg_get_expr(ix.indpred, ix.indrelid)
+        FROM pg_index ix
+        JOIN pg_class t ON t.oid = ix.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE n.nspname = 'public'
+    """)
+    indexes = {}
+    for table, columns, predicate in cursor.fetchall():
+        indexes.setdefault(table, []).append((list(columns), predicate))
+    conn.rollback()
+    return indexes
+
+
+def is_covered(indexes, table, columns, predicate):
+    """True when an existing index starts with ``columns`` and can serve ``predicate``"""
+    names = [column.split()[0] for column in columns]
+    for existing, existing_predicate in indexes.get(table, ()):
+        if existing[:len(names)] != names:
+            continue
+        if existing_predicate is None or (predicate and existing_predicate.replace('(', '').replace(')', '')
+                                          .lower() == predicate.lower()):
+            return True
+    return False
+
+
+def index_ddl(table, columns, predicate, concurrently=True):
+    name = f"idx_{table}_{'_'.join(column.split()[0] for column in columns)}{'_active' if predicate else ''}"
+    ddl = (f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name} "
+           f"ON {table}({', '.join(columns)})")
+    return ddl + (f' WHERE {predicate};' if predicate else ';')
+
+
+def check_statements(conn, statements, indexes):
+    """Explain every statement; returns ``(results, advice)``"""
+    results = {}
+    advice = {}
+    for normalized, (case_name, sql) in statements.items():
+        target = explainable(sql)
+        if target is None:
+            continue
+        try:
+            plan = explain(conn, target)
+        except psycopg2.Error as e:
+            # e.g. statements on a temp table created earlier in the request
+            results[normalized] = {'case': case_name, 'error': str(e).strip().splitlines()[0]}
+            continue
+
+        problems, wanted = analyze_plan(plan)
+        results[normalized] = {
+            'case': case_name,
+            'cost': plan['Plan']['Total Cost'],
+            'time_ms': round(plan['Planning Time'] + plan['Execution Time'], 2),
+            'problems': sorted(set(problems))
+        }
+        for table, columns, predicate in wanted:
+            if not is_covered(indexes, table, columns, predicate):
+                advice.setdefault(index_ddl(table, columns, predicate), set()).add(case_name)
+    return results, advice
+
+
+def compare(baseline, results, tolerance=COST_TOLERANCE):
+    """Statements that gained a problem or whose estimated cost grew"""
+    regressions = []
+    for normalized, result in results.items():
+        base = baseline.get(normalized)
+        if base is None or 'cost' not in result or 'cost' not in base:
+            continue
+        for problem in sorted(set(result['problems']) - set(base['problems'])):
+            regressions.append(f"{result['case']}: new {problem}")
+        if result['cost'] > base['cost'] * (1 + tolerance):
+            regressions.append(f"{result['case']}: cost {base['cost']} -> {result['cost']}")
+    return regressions
+
+
+def print_report(results, advice):
+    for normalized, result in sorted(results.items(), key=lambda item: item[1]['case']):
+        if 'error' in result:
+            print(f"{result['case']}\n    skipped: {result['error']}")
+            continue
+        if result['problems']:
+            print(f"{result['case']}  cost={result['cost']} time={result['time_ms']}ms")
+            print(f"    {normalized[:160]}")
+            print(f"    problems: {', '.join(result['problems'])}")
+    print(f'\n{len(advice)} index suggestion(s)')
+    for ddl, cases in sorted(advice.items()):
+        print(f'{ddl}\n    -- {", ".join(sorted(cases))}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EXPLAIN every route query and suggest indexes')
+    parser.add_argument('--only', help='run cases whose name contains this text')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help='record these plans as the baseline')
+    parser.add_argument('--tolerance', type=float, default=COST_TOLERANCE, help='allowed estimated cost growth')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        fixtures = load_fixtures(conn)
+        conn.rollback()
+        cases = [case for case in build_cases() + filtered_cases(fixtures)
+                 if not args.only or args.only in case.name]
+
+        statements = capture_statements(Runner(fixtures), cases)
+        # Fresh statistics after the write routes ran, so plans do not depend
+        # on when autovacuum last analyzed
+        conn.autocommit = True
+        conn.cursor().execute("ANALYZE")
+        conn.autocommit = False
+        results, advice = check_statements(conn, statements, load_indexes(conn))
+    finally:
+        conn.close()
+    print_report(results, advice)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'sizes': fixtures['sizes'], 'statements': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline written to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}; run with --update-baseline')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['sizes'] != fixtures['sizes']:
+        print(f"Warning: baseline was recorded against {baseline['sizes']}, database has {fixtures['sizes']}")
+
+    regressions = compare(baseline['statements'], results, args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    print(f"{len(regressions)} regression(s) across {len(results)} statement(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
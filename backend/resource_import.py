@@ -0,0 +1,169 @@
+import os
+
+from psycopg2.extras import execute_values
+
+MAX_IMPORT_ROWS = int(os.getenv('MAX_IMPORT_ROWS', 5000))
+PAGE_SIZE = 1000
+
+REQUIRED_FIELDS = ['name', 'email', 'department_id', 'role']
+
+# Columns written by the import, with the cast used in VALUES lists so that
+# all-NULL columns still type-check
+RESOURCE_COLUMNS = [
+    ('name', 'varchar'),
+    ('email', 'varchar'),
+    ('department_id', 'integer'),
+    ('role', 'varchar'),
+    ('status', 'varchar'),
+    ('level', 'varchar'),
+    ('base_salary', 'numeric'),
+    ('hire_date', 'date'),
+    ('location', 'varchar'),
+    ('phone', 'varchar')
+]
+
+INSERT_DEFAULTS = {'status': 'Available', 'level': 'Junior'}
+
+
+def validate_import(rows):
+    """Check required fields and in-batch email uniqueness for every row at once"""
+    valid = []
+    rejects = []
+    seen = {}
+
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            rejects.append({'row': index, 'errors': ['Row must be an object']})
+            continue
+
+        errors = [f'{field} is required' for field in REQUIRED_FIELDS if not row.get(field)]
+        skills = row.get('skills')
+        if skills is not None and (not isinstance(skills, list)
+                                   or not all(isinstance(s, int) and not isinstance(s, bool) for s in skills)):
+            errors.append('skills must be a list of skill ids')
+
+        email = str(row.get('email') or '').strip()
+        if email:
+            if email in seen:
+                errors.append(f'Duplicate email, first seen at row {seen[email]}')
+            else:
+                seen[email] = index
+
+        if errors:
+            rejects.append({'row': index, 'errors': errors})
+        else:
+            valid.append((index, dict(row, email=email)))
+
+    return valid, rejects
+
+
+def reject_unknown_skills(conn, valid, rejects):
+    """Reject rows naming skill ids that do not exist, checked in one query for the batch"""
+    skill_ids = list({skill_id for _, row in valid for skill_id in row.get('skills') or []})
+    if not skill_ids:
+        return valid
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM skills WHERE id = ANY(%s)", (skill_ids,))
+    known_skills = {row[0] for row in cursor.fetchall()}
+
+    remaining = []
+    for index, row in valid:
+        unknown = sorted(set(row.get('skills') or []) - known_skills)
+        if unknown:
+            rejects.append({'row': index, 'errors': [f"Unknown skill ids: {', '.join(map(str, unknown))}"]})
+        else:
+            remaining.append((index, row))
+
+    rejects.sort(key=lambda reject: reject['row'])
+    return remaining
+
+
+def upsert_resources(conn, valid):
+    """Insert new resources and update existing ones (matched on email) in batched statements.
+
+    Returns ``(ids_by_email, inserted, updated)``.
+    """
+    cursor = conn.cursor()
+    emails = [row['email'] for _, row in valid]
+    cursor.execute("SELECT id, email FROM resources WHERE email = ANY(%s)", (emails,))
+    existing = {email: resource_id for resource_id, email in cursor.fetchall()}
+
+    names = [name for name, _ in RESOURCE_COLUMNS]
+    template = '(' + ', '.join(f'%s::{cast}' for _, cast in RESOURCE_COLUMNS) + ')'
+    to_insert = []
+    to_update = []
+    for _, row in valid:
+        if row['email'] in existing:
+            to_update.append(tuple(row.get(name) for name in names))
+        else:
+            to_insert.append(tuple(row.get(name, INSERT_DEFAULTS.get(name)) for name in names))
+
+    ids_by_email = dict(existing)
+
+    if to_insert:
+        inserted_rows = execute_values(cursor, f"""
+            INSERT INTO resources ({', '.join(names)})
+            VALUES %s
+            RETURNING id, email
+        """, to_insert, template=template, page_size=PAGE_SIZE, fetch=True)
+        ids_by_email.update({email: resource_id for resource_id, email in inserted_rows})
+
+    if to_update:
+        # Optional fields left out of the payload keep their current value
+        assignments = ', '.join(
+            f"{name} = v.{name}" if name in REQUIRED_FIELDS else f"{name} = COALESCE(v.{name}, r.{name})"
+            for name in names if name != 'email'
+        )
+        execute_values(cursor, f"""
+            UPDATE resources r SET {assignments}
+            FROM (VALUES %s) AS v({', '.join(names)})
+            WHERE r.email = v.email
+        """, to_update, template=template, page_size=PAGE_SIZE)
+
+    return ids_by_email, len(to_insert), len(to_update)
+
+
+def sync_resource_skills(conn, desired):
+    """Bring resource_skills in line with ``desired`` ({resource_id: skill_ids}).
+
+    Only the difference between the stored and desired skill sets is written,
+    so unchanged rows (and their proficiency data) are left untouched.
+    Returns ``(added, removed)`` counts.
+    """
+    if not desired:
+        return 0, 0
+
+    cursor = conn.cursor()
+
+    cursor.execute(
+        "SELECT resource_id, skill_id FROM resource_skills WHERE resource_id = ANY(%s)",
+        (list(desired.keys()),)
+    )
+    current = {}
+    for resource_id, skill_id in cursor.fetchall():
+        current.setdefault(resource_id, set()).add(skill_id)
+
+    to_add = []
+    to_remove = []
+    for resource_id, skill_ids in desired.items():
+        wanted = set(skill_ids)
+        have = current.get(resource_id, set())
+        to_add.extend((resource_id, skill_id) for skill_id in wanted - have)
+        to_remove.extend((resource_id, skill_id) for skill_id in have - wanted)
+
+    if to_remove:
+        execute_values(cursor, """
+            DELETE FROM resource_skills rs
+            USING (VALUES %s) AS v(resource_id, skill_id)
+            WHERE rs.resource_id = v.resource_id AND rs.skill_id = v.skill_id
+        """, to_remove, page_size=PAGE_SIZE)
+
+    if to_add:
+        execute_values(cursor, """
+            INSERT INTO resource_skills (resource_id, skill_id)
+            VALUES %s
+            ON CONFLICT (resource_id, skill_id) DO NOTHING
+        """, to_add, page_size=PAGE_SIZE)
+
+    return len(to_add), len(to_remove)
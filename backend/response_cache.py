@@ -0,0 +1,274 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, request, make_response
+from flask_caching import Cache
+from flask_caching.backends.base import BaseCache
+from flask_jwt_extended import get_jwt
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Response cache configuration. CACHE_TYPE selects the backend:
+#   response_cache.LRUCache - in-process LRU (default, per worker process)
+#   RedisCache              - shared across workers; configure Redis with
+#                             maxmemory-policy allkeys-lru for LRU eviction
+CACHE_CONFIG = {
+    'CACHE_TYPE': os.getenv('CACHE_TYPE', 'response_cache.LRUCache'),
+    'CACHE_DEFAULT_TIMEOUT': int(os.getenv('CACHE_DEFAULT_TIMEOUT', 60)),
+    'CACHE_THRESHOLD': int(os.getenv('CACHE_THRESHOLD', 1000)),
+    'CACHE_REDIS_URL': os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+    'CACHE_KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', 'itdd:')
+}
+
+cache = Cache()
+
+
+class LRUCache(BaseCache):
+    """Thread-safe in-process cache with per-entry TTL and LRU eviction.
+
+    Both Flask apps share one instance per process so that writes made
+    through one app invalidate responses cached by the other.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, threshold=1000, default_timeout=300):
+        super().__init__(default_timeout)
+        self._threshold = threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(threshold=config['CACHE_THRESHOLD'], **kwargs)
+            return cls._instance
+
+    def _expires_at(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.monotonic() + timeout if timeout > 0 else 0
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, value, timeout):
+        self._entries[key] = (self._expires_at(timeout), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._threshold:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[1] if entry else None
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._store(key, value, timeout)
+        return True
+
+    def add(self, key, value, timeout=None):
+        with self._lock:
+            if self._live(key):
+                return False
+            self._store(key, value, timeout)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def has(self, key):
+        with self._lock:
+            return self._live(key) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        return True
+
+    def inc(self, key, delta=1):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                self._store(key, delta, 0)
+                return delta
+            expires_at, value = entry
+            self._entries[key] = (expires_at, value + delta)
+            return value + delta
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'routes': {}}
+_stats_lock = threading.Lock()
+
+
+def record_lookup(endpoint, outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+        route = _stats['routes'].setdefault(endpoint, {'hits': 0, 'misses': 0})
+        route[outcome] += 1
+
+
+def _version_key(table):
+    return f"table_version:{table}"
+
+
+def _table_versions(tables):
+    """Current version of each table; a version changes whenever the table is written.
+
+    A missing version (never written, or evicted) is seeded with the current
+    time so it can never collide with a version used by an older entry.
+    """
+    keys = [_version_key(table) for table in tables]
+    versions = cache.get_many(*keys)
+    for i, version in enumerate(versions):
+        if version is None:
+            cache.add(keys[i], time.time_ns(), timeout=0)
+            versions[i] = cache.get(keys[i])
+    return versions
+
+
+def table_versions(*tables):
+    """Current versions of ``tables``, for in-process caches that follow the same invalidations"""
+    return _table_versions(tables)
+
+
+def invalidate_tables(*tables):
+    """Invalidate every cached response that reads from any of ``tables``"""
+    for table in tables:
+        key = _version_key(table)
+        if not cache.add(key, time.time_ns(), timeout=0):
+            cache.cache.inc(key)
+    with _stats_lock:
+        _stats['invalidations'] += 1
+
+
+def response_key(path, args, role, tables):
+    """Cache key for a response to ``path`` with query ``args`` as seen by ``role``"""
+    query = '&'.join(f"{k}={v}" for k, v in sorted(args.items(multi=True)))
+    versions = ','.join(str(v) for v in _table_versions(tables))
+    return f"response:{path}?{query}:{role}:{versions}"
+
+
+def response_etag(key):
+    """ETag for a cached response; it only changes when the cache key does"""
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def hit_response(response_class, cached, etag, if_none_match):
+    """Response for a cache hit, or a 304 when the client already holds ``etag``"""
+    if if_none_match.contains_weak(etag):
+        response = response_class(status=304)
+    else:
+        data, status, mimetype = cached
+        response = response_class(data, status=status, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['X-Cache'] = 'HIT'
+    return response
+
+
+def store_response(key, etag, response, data, timeout=None):
+    """Cache a route's freshly built ``response`` with body ``data`` (None when streamed) if it succeeded"""
+    if response.status_code == 200 and data is not None:
+        cache.set(key, (data, response.status_code, response.mimetype), timeout=timeout)
+        response.set_etag(etag)
+    response.headers['X-Cache'] = 'MISS'
+    return response
+
+
+def cached_response(*tables, timeout=None):
+    """Cache a GET route's successful JSON response.
+
+    The cache key is built from the route path, the sorted query string, the
+    caller's JWT role and the current version of every table in ``tables``.
+    Responses carry an ETag derived from the key, so a client revalidating an
+    unchanged response gets a 304 without the route running at all.
+    Must be applied below ``@jwt_required()`` so the role claim is available.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = response_key(request.path, request.args, get_jwt().get('role'), tables)
+            etag = response_etag(key)
+
+            cached = cache.get(key)
+            if cached is not None:
+                record_lookup(request.endpoint, 'hits')
+                return hit_response(current_app.response_class, cached, etag, request.if_none_match)
+
+            record_lookup(request.endpoint, 'misses')
+            # Other users will be served this response; db reads it from a
+            # replica only if that replica has replayed everyone's writes
+            g.caching_response = True
+            response = make_response(f(*args, **kwargs))
+            data = None if response.is_streamed else response.get_data()
+            return store_response(key, etag, response, data, timeout)
+        return decorated_function
+    return decorator
+
+
+# Cache-Control for responses revalidated with their ETag
+CONDITIONAL_CACHE_CONTROL = 'private, no-cache'
+
+
+def wants_etag(method, response):
+    """True for a successful GET, the only responses given an ETag"""
+    return method == 'GET' and response.status_code == 200
+
+
+def conditional_get(response):
+    """Give every successful GET response an ETag and honour If-None-Match.
+
+    Routes without ``cached_response`` get an ETag hashed from the body, which
+    saves the transfer but not the query.
+    """
+    if not wants_etag(request.method, response) or response.is_streamed:
+        return response
+    response.add_etag()
+    response.headers.setdefault('Cache-Control', CONDITIONAL_CACHE_CONTROL)
+    return response.make_conditional(request)
+
+
+def get_cache_stats():
+    """Hit/miss counters for this process, overall and per route"""
+    with _stats_lock:
+        lookups = _stats['hits'] + _stats['misses']
+        stats = {
+            'backend': CACHE_CONFIG['CACHE_TYPE'],
+            'hits': _stats['hits'],
+            'misses': _stats['misses'],
+            'hit_rate': round(_stats['hits'] / lookups * 100, 2) if lookups else 0,
+            'invalidations': _stats['invalidations'],
+            'routes': {endpoint: dict(counts) for endpoint, counts in _stats['routes'].items()}
+        }
+    if LRUCache._instance is not None:
+        stats['entries'] = LRUCache._instance.size()
+        stats['evictions'] = LRUCache._instance.evictions
+    return stats
+
+
+def init_app(app):
+    """Attach the response cache and conditional GET handling to a Flask app"""
+    cache.init_app(app, config=CACHE_CONFIG)
+    app.after_request(conditional_get)
@@ -0,0 +1,66 @@
+ROLLUP_RESOLUTIONS = ('week', 'month')
+
+# How each metric is summarised over a period. Rollup tables hold sums and a
+# sample count; counts are reported as totals, while scores, percentages and
+# durations are averaged over the period's daily rows.
+ROLLUP_METRICS = {
+    'engineering_metrics': {
+        'commits_count': 'sum',
+        'lines_of_code': 'sum',
+        'code_quality_score': 'avg',
+        'test_coverage': 'avg',
+        'bugs_reported': 'sum',
+        'bugs_resolved': 'sum',
+        'code_review_time_avg': 'avg',
+        'deployment_frequency': 'sum',
+        'lead_time_hours': 'avg',
+        'developer_productivity_score': 'avg',
+        'technical_debt_ratio': 'avg'
+    },
+    'qa_metrics': {
+        'test_cases_total': 'sum',
+        'test_cases_passed': 'sum',
+        'test_cases_failed': 'sum',
+        'automation_coverage': 'avg',
+        'manual_test_hours': 'sum',
+        'defects_found': 'sum',
+        'defects_fixed': 'sum',
+        'defect_removal_efficiency': 'avg',
+        'test_execution_rate': 'avg',
+        'regression_test_success': 'avg',
+        'performance_test_score': 'avg',
+        'security_test_score': 'avg'
+    }
+}
+
+
+def build_rollup_query(table, resolution, days, project_id=None, org_wide=False):
+    """Build a list query over ``table``'s pre-aggregated buckets.
+
+    Covers every bucket overlapping the last ``days`` days. Returns
+    ``(query, params, order)`` for ``list_response``. Buckets are per project
+    unless ``org_wide`` is set.
+    """
+    columns = ', '.join(
+        f"ROUND(r.{column}::decimal / r.samples, 2) as {column}" if aggregate == 'avg' else f"r.{column}"
+        for column, aggregate in ROLLUP_METRICS[table].items()
+    )
+    query = f"""
+        SELECT r.resolution, r.period_start, r.project_id, p.name as project_name,
+               r.samples, {columns}
+        FROM {table}_rollup r
+        LEFT JOIN projects p ON r.project_id = p.id
+        WHERE r.resolution = %s AND r.samples > 0
+        AND r.period_start >= date_trunc(%s, CURRENT_DATE - make_interval(days => %s))::date
+    """
+    params = [resolution, resolution, days]
+
+    if org_wide:
+        query += " AND r.project_id IS NULL"
+        return query, params, [('period_start', 'DESC')]
+
+    query += " AND r.project_id IS NOT NULL"
+    if project_id:
+        query += " AND r.project_id = %s"
+        params.append(int(project_id))
+    return query, params, [('period_start', 'DESC'), ('project_id', 'ASC')]
@@ -0,0 +1,167 @@
+"""Typeahead search across resources, projects and clients.
+
+Each entity is matched with ``ILIKE '%term%'`` on its searchable columns,
+which the pg_trgm GIN indexes from migration 008 answer without a scan.
+Matches are ranked by how the term hits the name: exact, name prefix, word
+prefix within the name, prefix of another column, anywhere. Ties go to the
+shorter name, then the lower id. Each entity returns at most ``limit`` rows
+and the merged list is cut to ``limit`` again.
+
+Result columns are listed per entity and never include salary, bonus or
+billable rates. HR users also get the HR-only resource fields, and HR and
+admin users also see inactive rows.
+
+Short terms match the most rows and repeat the most while typing, so
+results for terms up to SEARCH_CACHE_MAX_LENGTH characters are kept in an
+in-process LRU. Entries are keyed by the searched tables' cache versions,
+so any write to them retires the old entries.
+"""
+import os
+
+from response_cache import LRUCache, table_versions
+
+SEARCH_MIN_LENGTH = 2
+SEARCH_MAX_LENGTH = 100
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+SEARCH_CACHE_MAX_LENGTH = int(os.getenv('SEARCH_CACHE_MAX_LENGTH', 3))
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', 2048))
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', 300))
+
+SEARCH_TABLES = ('resources', 'projects', 'clients', 'departments')
+
+# Roles that also see inactive rows, and roles that get HR_FIELDS
+INACTIVE_ROLES = ('admin', 'hr')
+HR_ROLES = ('hr',)
+
+# Entity name -> query. {fields} takes the role's extra columns, {active}
+# the inactive-row filter. The name column comes first in each rank.
+SEARCH_QUERIES = {
+    'resource': """
+        SELECT r.id, r.name, r.email, r.role, r.status, r.level, r.location,
+               d.name AS department{fields},
+               CASE WHEN lower(r.name) = %(term)s THEN 0
+                    WHEN r.name ILIKE %(prefix)s THEN 1
+                    WHEN r.name ILIKE %(word)s THEN 2
+                    WHEN r.email ILIKE %(prefix)s OR r.role ILIKE %(prefix)s THEN 3
+                    ELSE 4 END AS rank
+        FROM resources r
+        LEFT JOIN departments d ON d.id = r.department_id
+        WHERE (r.name ILIKE %(pattern)s OR r.email ILIKE %(pattern)s OR r.role ILIKE %(pattern)s){active}
+        ORDER BY rank, length(r.name), r.id
+        LIMIT %(limit)s
+    """,
+    'project': """
+        SELECT p.id, p.name, p.status, p.priority, c.name AS client{fields},
+               CASE WHEN lower(p.name) = %(term)s THEN 0
+                    WHEN p.name ILIKE %(prefix)s THEN 1
+                    WHEN p.name ILIKE %(word)s THEN 2
+                    WHEN p.description ILIKE %(prefix)s THEN 3
+                    ELSE 4 END AS rank
+        FROM projects p
+        LEFT JOIN clients c ON c.id = p.client_id
+        WHERE (p.name ILIKE %(pattern)s OR p.description ILIKE %(pattern)s){active}
+        ORDER BY rank, length(p.name), p.id
+        LIMIT %(limit)s
+    """,
+    'client': """
+        SELECT c.id, c.name, c.industry{fields},
+               CASE WHEN lower(c.name) = %(term)s THEN 0
+                    WHEN c.name ILIKE %(prefix)s THEN 1
+                    WHEN c.name ILIKE %(word)s THEN 2
+                    ELSE 4 END AS rank
+        FROM clients c
+        WHERE c.name ILIKE %(pattern)s{active}
+        ORDER BY rank, length(c.name), c.id
+        LIMIT %(limit)s
+    """
+}
+
+SEARCH_ALIASES = {'resource': 'r', 'project': 'p', 'client': 'c'}
+
+# Extra columns for HR_ROLES
+HR_FIELDS = {
+    'resource': ('performance_rating', 'bench_reason', 'bench_start_date')
+}
+
+_prefix_cache = LRUCache(threshold=SEARCH_CACHE_SIZE, default_timeout=SEARCH_CACHE_TTL)
+
+
+class SearchError(ValueError):
+    """Raised when a search request is invalid"""
+
+
+def parse_search_args(args):
+    """Search term, entity types and limit from the query string"""
+    term = ' '.join(args.get('q', '').split()).lower()
+    if len(term) < SEARCH_MIN_LENGTH:
+        raise SearchError(f'q must be at least {SEARCH_MIN_LENGTH} characters')
+    if len(term) > SEARCH_MAX_LENGTH:
+        raise SearchError(f'q must be at most {SEARCH_MAX_LENGTH} characters')
+
+    types = args.get('types')
+    if types:
+        types = [entity.strip() for entity in types.split(',') if entity.strip()]
+        types = [entity[:-1] if entity.endswith('s') else entity for entity in types]
+        unknown = [entity for entity in types if entity not in SEARCH_QUERIES]
+        if unknown:
+            raise SearchError(f"Unknown types: {', '.join(unknown)}")
+    else:
+        types = list(SEARCH_QUERIES)
+
+    try:
+        limit = min(int(args.get('limit', SEARCH_DEFAULT_LIMIT)), SEARCH_MAX_LIMIT)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        raise SearchError('limit must be a positive integer')
+    return term, [entity for entity in SEARCH_QUERIES if entity in types], limit
+
+
+def _like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_query(entity, role):
+    """SQL for one entity with the columns and rows ``role`` may see"""
+    alias = SEARCH_ALIASES[entity]
+    fields = HR_FIELDS.get(entity, ()) if role in HR_ROLES else ()
+    return SEARCH_QUERIES[entity].format(
+        fields=''.join(f', {alias}.{field}' for field in fields),
+        active='' if role in INACTIVE_ROLES else f' AND COALESCE({alias}.is_active, TRUE)'
+    )
+
+
+def search(cursor, term, types, limit, role):
+    """Ranked matches for ``term`` across ``types``, as dicts with a ``type`` key.
+
+    ``cursor`` must be a RealDictCursor. Short terms are served from the
+    prefix cache while the searched tables are unchanged.
+    """
+    key = None
+    if len(term) <= SEARCH_CACHE_MAX_LENGTH:
+        # Roles that see the same columns and rows share entries
+        visibility = (role in INACTIVE_ROLES, role in HR_ROLES)
+        key = f"{table_versions(*SEARCH_TABLES)}:{visibility}:{','.join(types)}:{limit}:{term}"
+        results = _prefix_cache.get(key)
+        if results is not None:
+            return results
+
+    like = _like(term)
+    params = {'term': term, 'prefix': f'{like}%', 'word': f'% {like}%', 'pattern': f'%{like}%', 'limit': limit}
+    results = []
+    for order, entity in enumerate(types):
+        cursor.execute(search_query(entity, role), params)
+        results.extend((row['rank'], len(row['name']), order, entity, row) for row in cursor.fetchall())
+    results.sort(key=lambda match: match[:3])
+
+    matches = []
+    for _, _, _, entity, row in results[:limit]:
+        match = {'type': entity}
+        match.update(row)
+        del match['rank']
+        matches.append(match)
+
+    if key is not None:
+        _prefix_cache.set(key, matches)
+    return matches
@@ -0,0 +1,354 @@
+"""In-memory skill index for matching resources to staffing requests.
+
+Every resource has a fixed bit position. Each skill keeps one bitset per
+proficiency threshold (resources at that level or above), and status, level,
+location and department keep one bitset per value. Bitsets are Python ints,
+so an AND/OR skill query with filters is a few big-int operations on
+12.5 KB values at 100k resources; only the matches are unpacked and ranked.
+
+The index is loaded once per process and then patched from the resources
+delta (``updated_at`` plus sync tombstones; resource_skills writes touch
+their resource). A sync runs when a write invalidates resources,
+resource_skills or skills in the response cache, and at least every
+SKILL_INDEX_SYNC_INTERVAL seconds to pick up writes made outside the API.
+Each sync builds a new index, so readers never see a half-applied delta.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from pagination import SYNC_TOKEN_QUERY
+from response_cache import table_versions
+
+# Seconds between delta syncs when no write has invalidated the index
+SKILL_INDEX_SYNC_INTERVAL = float(os.getenv('SKILL_INDEX_SYNC_INTERVAL', 30))
+
+SKILL_INDEX_TABLES = ('resources', 'resource_skills', 'skills')
+
+MAX_PROFICIENCY = 5
+
+# Resource columns with one bitset per value, filterable by the same names
+FILTERS = ('status', 'level', 'location', 'department_id')
+
+RESOURCES_QUERY = """
+    SELECT id, name, role, status, level, location, department_id,
+           COALESCE(is_active, TRUE) AS is_active,
+           COALESCE(performance_rating, 3.0)::float AS performance_rating
+    FROM resources
+"""
+
+RESOURCE_SKILLS_QUERY = """
+    SELECT rs.resource_id, rs.skill_id, COALESCE(rs.proficiency_level, 3)
+    FROM resource_skills rs
+"""
+
+DELETED_RESOURCES_QUERY = """
+    SELECT row_id FROM sync_tombstones WHERE table_name = 'resources' AND deleted_at >= %s
+"""
+
+
+class MatchError(ValueError):
+    """Raised when a match query is invalid"""
+
+
+def _bitset(positions, size):
+    """Python int with the bits at ``positions`` set"""
+    bits = np.zeros(size, dtype=bool)
+    bits[positions] = True
+    return int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+
+
+def _positions(bitset, size):
+    """Positions of the set bits, ascending"""
+    # Only the non-empty 64-bit words are unpacked, so sparse matches stay cheap
+    words = np.frombuffer(bitset.to_bytes((size + 63) // 64 * 8, 'little'), dtype='<u8')
+    nonzero = np.flatnonzero(words)
+    bits = np.flatnonzero(np.unpackbits(words[nonzero].view(np.uint8), bitorder='little').view(bool))
+    return nonzero[bits >> 6] * 64 + (bits & 63)
+
+
+def _grow(array, size):
+    # Geometric growth, so appending resources one at a time stays cheap
+    if len(array) >= size:
+        return array
+    grown = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class SkillIndex:
+    """Immutable snapshot of every active resource's skills and attributes.
+
+    ``updated`` returns a new index with a delta applied.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.positions = {}
+        # Per position: (id, name, role, status, level, location, department_id)
+        self.rows = []
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.ratings = np.zeros(0)
+        self.active = 0
+        self.values = {name: {} for name in FILTERS}
+        # Skill id -> bitsets of proficiency >= 1 .. MAX_PROFICIENCY
+        self.skills = {}
+        # Skill id -> proficiency per position, 0 where the skill is missing
+        self.proficiency = {}
+        self.skill_names = {}
+        self.skill_ids = {}
+
+    def updated(self, resources, resource_skills, deleted, skills):
+        """New index with ``resources`` replaced and ``deleted`` ids removed.
+
+        ``resource_skills`` must hold every skill of every resource in
+        ``resources``; ``skills`` is the full (id, name) list.
+        """
+        index = SkillIndex()
+        index.positions = dict(self.positions)
+        index.rows = list(self.rows)
+        for row in resources:
+            if row[0] not in index.positions:
+                index.positions[row[0]] = len(index.rows)
+                index.rows.append(None)
+        index.size = size = len(index.rows)
+
+        changed = [index.positions[row[0]] for row in resources]
+        changed += [index.positions[resource_id] for resource_id in deleted if resource_id in index.positions]
+        changed = np.array(changed, dtype=np.int64)
+        keep = ~_bitset(changed, size)
+
+        index.ids = _grow(self.ids, size).copy()
+        index.ratings = _grow(self.ratings, size).copy()
+        active = []
+        additions = {name: defaultdict(list) for name in FILTERS}
+        for row in resources:
+            resource_id, name, role, status, level, location, department_id, is_active, rating = row
+            position = index.positions[resource_id]
+            index.rows[position] = (resource_id, name, role, status, level, location, department_id)
+            index.ids[position] = resource_id
+            index.ratings[position] = rating
+            if is_active:
+                active.append(position)
+                for column, value in zip(FILTERS, (status, level, location, department_id)):
+                    if value is not None:
+                        additions[column][value].append(position)
+        for resource_id in deleted:
+            if resource_id in index.positions:
+                index.rows[index.positions[resource_id]] = None
+
+        index.active = (self.active & keep) | _bitset(active, size)
+        for column in FILTERS:
+            values = {value: bits & keep for value, bits in self.values[column].items()}
+            for value, positions in additions[column].items():
+                values[value] = values.get(value, 0) | _bitset(positions, size)
+            index.values[column] = {value: bits for value, bits in values.items() if bits}
+
+        active = set(active)
+        held = defaultdict(lambda: ([], []))
+        for resource_id, skill_id, proficiency in resource_skills:
+            position = index.positions.get(resource_id)
+            if position in active:
+                held[skill_id][0].append(position)
+                held[skill_id][1].append(proficiency)
+
+        for skill_id in set(self.proficiency) | set(held):
+            proficiency = _grow(self.proficiency.get(skill_id, np.zeros(0, dtype=np.uint8)), size)
+            bitsets = [bits & keep for bits in self.skills.get(skill_id, [0] * MAX_PROFICIENCY)]
+            if proficiency[changed].any() or skill_id in held:
+                proficiency = proficiency.copy()
+                proficiency[changed] = 0
+            if skill_id in held:
+                positions, levels = (np.array(values) for values in held[skill_id])
+                proficiency[positions] = levels
+                for level in range(1, MAX_PROFICIENCY + 1):
+                    bitsets[level - 1] |= _bitset(positions[levels >= level], size)
+            if bitsets[0]:
+                index.proficiency[skill_id] = proficiency
+                index.skills[skill_id] = bitsets
+
+        index.skill_names = dict(skills)
+        index.skill_ids = {name.lower(): skill_id for skill_id, name in skills}
+        return index
+
+    def skill_id(self, skill):
+        """Resolve a skill name (case-insensitive) or id"""
+        if skill.isdigit() and int(skill) in self.skill_names:
+            return int(skill)
+        skill_id = self.skill_ids.get(skill.lower())
+        if skill_id is None:
+            raise MatchError(f'Unknown skill: {skill}')
+        return skill_id
+
+    def match(self, skills=(), any_skill=False, limit=20, **filters):
+        """Rank active resources holding ``skills``, (skill id, minimum proficiency) pairs.
+
+        With ``any_skill`` one qualifying skill is enough, otherwise all are
+        required. ``filters`` map a FILTERS column to the values it may take.
+        Matches are ranked by total proficiency over the requested skills
+        they qualify for, then performance rating, then id. Returns the
+        number of matches and the top ``limit``.
+        """
+        bits = self.active
+        if skills:
+            combined = None
+            for skill_id, minimum in skills:
+                skill_bits = self.skills.get(skill_id, [0] * MAX_PROFICIENCY)[minimum - 1]
+                if combined is None:
+                    combined = skill_bits
+                else:
+                    combined = combined | skill_bits if any_skill else combined & skill_bits
+            bits &= combined
+        for column, values in filters.items():
+            if values:
+                allowed = 0
+                for value in values:
+                    allowed |= self.values[column].get(value, 0)
+                bits &= allowed
+
+        total = bits.bit_count()
+        if not total:
+            return 0, []
+
+        positions = _positions(bits, self.size)
+        scores = np.zeros(len(positions), dtype=np.int64)
+        for skill_id, minimum in skills:
+            if skill_id in self.proficiency:
+                levels = self.proficiency[skill_id][positions]
+                scores += np.where(levels >= minimum, levels, 0)
+        ratings = self.ratings[positions]
+
+        # Narrow to everything tied with the limit-th best before the exact sort
+        if total > limit:
+            keys = scores * 1000 + np.rint(ratings * 100).astype(np.int64)
+            cutoff = np.partition(keys, total - limit)[total - limit]
+            candidates = np.flatnonzero(keys >= cutoff)
+            positions, scores, ratings = positions[candidates], scores[candidates], ratings[candidates]
+        order = np.lexsort((self.ids[positions], -ratings, -scores))[:limit]
+
+        matches = []
+        for i in order:
+            position = positions[i]
+            resource_id, name, role, status, level, location, department_id = self.rows[position]
+            matches.append({
+                'id': resource_id,
+                'name': name,
+                'role': role,
+                'status': status,
+                'level': level,
+                'location': location,
+                'department_id': department_id,
+                'performance_rating': float(self.ratings[position]),
+                'score': int(scores[i]),
+                'skills': {
+                    self.skill_names[skill_id]: int(self.proficiency[skill_id][position])
+                    for skill_id, _ in skills
+                    if skill_id in self.proficiency and self.proficiency[skill_id][position]
+                }
+            })
+        return total, matches
+
+
+def load_changes(conn, since=None):
+    """Resources, their skills and deleted ids changed since a sync token (everything without one)"""
+    cursor = conn.cursor()
+    cursor.execute(SYNC_TOKEN_QUERY)
+    sync_token = cursor.fetchone()[0]
+
+    if since is None:
+        cursor.execute(RESOURCES_QUERY)
+        resources = cursor.fetchall()
+        cursor.execute(RESOURCE_SKILLS_QUERY)
+        resource_skills = cursor.fetchall()
+        deleted = []
+    else:
+        cursor.execute(RESOURCES_QUERY + " WHERE updated_at >= %s", (since,))
+        resources = cursor.fetchall()
+        cursor.execute(RESOURCE_SKILLS_QUERY + """
+            JOIN resources r ON r.id = rs.resource_id
+            WHERE r.updated_at >= %s
+        """, (since,))
+        resource_skills = cursor.fetchall()
+        cursor.execute(DELETED_RESOURCES_QUERY, (since,))
+        deleted = [row[0] for row in cursor.fetchall()]
+
+    cursor.execute("SELECT id, name FROM skills")
+    skills = cursor.fetchall()
+    return sync_token, resources, resource_skills, deleted, skills
+
+
+_index = None
+_index_versions = None
+_index_synced_at = 0.0
+_sync_token = None
+_index_lock = threading.Lock()
+
+
+def get_skill_index(conn):
+    """Get the process-wide skill index, syncing it first if resources or skills changed"""
+    global _index, _index_versions, _index_synced_at, _sync_token
+
+    versions = table_versions(*SKILL_INDEX_TABLES)
+    if (_index is not None and versions == _index_versions
+            and time.monotonic() - _index_synced_at < SKILL_INDEX_SYNC_INTERVAL):
+        return _index
+
+    with _index_lock:
+        if (_index is None or versions != _index_versions
+                or time.monotonic() - _index_synced_at >= SKILL_INDEX_SYNC_INTERVAL):
+            synced_at = time.monotonic()
+            sync_token, resources, resource_skills, deleted, skills = load_changes(conn, _sync_token)
+            _index = (_index or SkillIndex()).updated(resources, resource_skills, deleted, skills)
+            _sync_token = sync_token
+            _index_versions = versions
+            _index_synced_at = synced_at
+        return _index
+
+
+def invalidate_skill_index():
+    """Drop the index so the next match reloads it in full"""
+    global _index, _sync_token
+    with _index_lock:
+        _index = None
+        _sync_token = None
+
+
+def parse_match_args(args, index):
+    """Read a match query from the query string.
+
+    ``skills`` is a comma-separated list of skill names or ids, each with an
+    optional minimum proficiency (``Python:4``). ``match`` is ``all``
+    (default) or ``any``. ``status``, ``level``, ``location`` and
+    ``department_id`` take comma-separated values.
+    """
+    skills = []
+    for entry in args.get('skills', '').split(','):
+        if not entry.strip():
+            continue
+        skill, _, minimum = entry.strip().partition(':')
+        try:
+            minimum = int(minimum) if minimum else 1
+        except ValueError:
+            raise MatchError(f'Invalid proficiency for {skill}: {minimum}')
+        if not 1 <= minimum <= MAX_PROFICIENCY:
+            raise MatchError(f'Proficiency must be between 1 and {MAX_PROFICIENCY}')
+        skills.append((index.skill_id(skill.strip()), minimum))
+
+    mode = args.get('match', 'all')
+    if mode not in ('all', 'any'):
+        raise MatchError('match must be all or any')
+
+    filters = {}
+    for column in FILTERS:
+        values = [value.strip() for value in args.get(column, '').split(',') if value.strip()]
+        if column == 'department_id':
+            try:
+                values = [int(value) for value in values]
+            except ValueError:
+                raise MatchError('department_id must be an integer')
+        filters[column] = values
+
+    return skills, mode == 'any', filters
@@ -0,0 +1,45 @@
+-- =============================================================================
+-- BENCHMARK: bulk deliverable updates vs project health recomputation
+-- =============================================================================
+-- Times one UPDATE of every deliverable in a project for growing batch sizes.
+-- With the statement-level health triggers the per-row cost stays flat, i.e.
+-- total time grows linearly with the batch size.
+--
+-- Run against a database created from unified_it_delivery_schema.sql:
+--   psql -d zapcom_resource_db -f database/benchmarks/deliverable_bulk_update.sql
+-- Everything runs in a transaction that is rolled back.
+-- =============================================================================
+
+BEGIN;
+
+DO $$
+DECLARE
+    batch_size INTEGER;
+    bench_project_id INTEGER;
+    started TIMESTAMP;
+    elapsed_ms NUMERIC;
+BEGIN
+    FOREACH batch_size IN ARRAY ARRAY[100, 500, 1000, 5000, 10000, 50000] LOOP
+        INSERT INTO projects (name, start_date, end_date, budget)
+        VALUES ('Benchmark ' || batch_size, CURRENT_DATE - 60, CURRENT_DATE + 30, 100000)
+        RETURNING id INTO bench_project_id;
+
+        INSERT INTO deliverables (name, project_id, due_date, status, actual_hours)
+        SELECT 'Deliverable ' || g, bench_project_id, CURRENT_DATE + 30, 'In Progress', 10
+        FROM generate_series(1, batch_size) g;
+
+        started := clock_timestamp();
+        UPDATE deliverables
+        SET status = 'Completed', actual_hours = actual_hours + 5
+        WHERE project_id = bench_project_id;
+        elapsed_ms := EXTRACT(EPOCH FROM clock_timestamp() - started) * 1000;
+
+        RAISE NOTICE 'rows: %  total: % ms  per row: % us',
+            lpad(batch_size::TEXT, 6),
+            lpad(round(elapsed_ms, 1)::TEXT, 9),
+            round(elapsed_ms * 1000 / batch_size, 2);
+    END LOOP;
+END;
+$$;
+
+ROLLBACK;
@@ -0,0 +1,183 @@
+-- =============================================================================
+-- MIGRATION 001: weekly and monthly metric rollups
+-- =============================================================================
+-- engineering_metrics_rollup and qa_metrics_rollup hold metric sums and a
+-- sample count per week and month, per project and org-wide (project_id
+-- NULL). Statement-level triggers keep them current, and GET /metrics/
+-- engineering and /metrics/qa read them for resolution=week|month. The
+-- rollups are backfilled from the existing rows at the end; the triggers
+-- block metric writes until the migration commits, so none are missed.
+--
+--   psql -d zapcom_resource_db -f database/migrations/001_metric_rollups.sql
+-- New databases get the same objects from unified_it_delivery_schema.sql.
+-- =============================================================================
+
+BEGIN;
+
+-- Weekly and monthly metric rollups, per project and org-wide (project_id
+-- NULL). Each bucket stores the sum of every metric plus the number of daily
+-- rows (samples), so averages stay exact under incremental maintenance.
+-- No foreign key on project_id: deleting a project cascades to the raw rows,
+-- whose triggers then drain the project's buckets to zero samples.
+CREATE TABLE IF NOT EXISTS engineering_metrics_rollup (
+    resolution VARCHAR(10) NOT NULL,
+    period_start DATE NOT NULL,
+    project_id INTEGER,
+    samples INTEGER NOT NULL DEFAULT 0,
+    commits_count BIGINT DEFAULT 0,
+    lines_of_code BIGINT DEFAULT 0,
+    code_quality_score BIGINT DEFAULT 0,
+    test_coverage BIGINT DEFAULT 0,
+    bugs_reported BIGINT DEFAULT 0,
+    bugs_resolved BIGINT DEFAULT 0,
+    code_review_time_avg DECIMAL(14,2) DEFAULT 0,
+    deployment_frequency BIGINT DEFAULT 0,
+    lead_time_hours DECIMAL(16,2) DEFAULT 0,
+    developer_productivity_score BIGINT DEFAULT 0,
+    technical_debt_ratio DECIMAL(14,2) DEFAULT 0,
+    
+    CONSTRAINT chk_engineering_rollup_resolution CHECK (resolution IN ('week', 'month'))
+);
+
+CREATE TABLE IF NOT EXISTS qa_metrics_rollup (
+    resolution VARCHAR(10) NOT NULL,
+    period_start DATE NOT NULL,
+    project_id INTEGER,
+    samples INTEGER NOT NULL DEFAULT 0,
+    test_cases_total BIGINT DEFAULT 0,
+    test_cases_passed BIGINT DEFAULT 0,
+    test_cases_failed BIGINT DEFAULT 0,
+    automation_coverage BIGINT DEFAULT 0,
+    manual_test_hours BIGINT DEFAULT 0,
+    defects_found BIGINT DEFAULT 0,
+    defects_fixed BIGINT DEFAULT 0,
+    defect_removal_efficiency DECIMAL(14,2) DEFAULT 0,
+    test_execution_rate DECIMAL(14,2) DEFAULT 0,
+    regression_test_success DECIMAL(14,2) DEFAULT 0,
+    performance_test_score BIGINT DEFAULT 0,
+    security_test_score BIGINT DEFAULT 0,
+    
+    CONSTRAINT chk_qa_rollup_resolution CHECK (resolution IN ('week', 'month'))
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_engineering_metrics_rollup_bucket
+    ON engineering_metrics_rollup(resolution, period_start, COALESCE(project_id, 0));
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_qa_metrics_rollup_bucket
+    ON qa_metrics_rollup(resolution, period_start, COALESCE(project_id, 0));
+
+-- Function to maintain <metrics table>_rollup from a statement's transition
+-- tables. Inserted rows are added to their week and month buckets, deleted
+-- rows are subtracted and updates do both, so a bulk upsert costs one
+-- rollup statement rather than one per row.
+CREATE OR REPLACE FUNCTION maintain_metric_rollups()
+RETURNS TRIGGER AS $$
+DECLARE
+    rollup_table TEXT := TG_TABLE_NAME || '_rollup';
+    metric_columns TEXT[];
+    delta_sql TEXT;
+BEGIN
+    SELECT array_agg(quote_ident(attname) ORDER BY attnum) INTO metric_columns
+    FROM pg_attribute
+    WHERE attrelid = rollup_table::regclass AND attnum > 0 AND NOT attisdropped
+    AND attname NOT IN ('resolution', 'period_start', 'project_id', 'samples');
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        delta_sql := format('SELECT project_id, metric_date, 1 AS samples, %s FROM new_rows',
+            (SELECT string_agg(format('COALESCE(%s, 0) AS %s', c, c), ', ') FROM unnest(metric_columns) c));
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        delta_sql := concat_ws(' UNION ALL ', delta_sql,
+            format('SELECT project_id, metric_date, -1 AS samples, %s FROM old_rows',
+                (SELECT string_agg(format('-COALESCE(%s, 0) AS %s', c, c), ', ') FROM unnest(metric_columns) c)));
+    END IF;
+
+    -- Buckets are upserted in key order so concurrent batches lock them consistently
+    EXECUTE format($sql$
+        INSERT INTO %I AS r (resolution, period_start, project_id, samples, %s)
+        SELECT b.resolution, date_trunc(b.resolution, d.metric_date)::DATE, s.project_id,
+               SUM(d.samples), %s
+        FROM (%s) d
+        CROSS JOIN (VALUES ('week'), ('month')) AS b(resolution)
+        CROSS JOIN LATERAL (VALUES (d.project_id), (NULL::INTEGER)) AS s(project_id)
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+        ON CONFLICT (resolution, period_start, COALESCE(project_id, 0))
+        DO UPDATE SET samples = r.samples + EXCLUDED.samples, %s
+    $sql$,
+        rollup_table,
+        array_to_string(metric_columns, ', '),
+        (SELECT string_agg(format('SUM(d.%s)', c), ', ') FROM unnest(metric_columns) c),
+        delta_sql,
+        (SELECT string_agg(format('%s = r.%s + EXCLUDED.%s', c, c, c), ', ') FROM unnest(metric_columns) c));
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function to recompute a metrics table's rollups from scratch, e.g. after
+-- TRUNCATE or when adding rollups to an existing database:
+--   SELECT rebuild_metric_rollups('engineering_metrics');
+CREATE OR REPLACE FUNCTION rebuild_metric_rollups(metrics_table TEXT)
+RETURNS VOID AS $$
+DECLARE
+    rollup_table TEXT := metrics_table || '_rollup';
+    metric_columns TEXT[];
+BEGIN
+    SELECT array_agg(quote_ident(attname) ORDER BY attnum) INTO metric_columns
+    FROM pg_attribute
+    WHERE attrelid = rollup_table::regclass AND attnum > 0 AND NOT attisdropped
+    AND attname NOT IN ('resolution', 'period_start', 'project_id', 'samples');
+
+    EXECUTE format('TRUNCATE %I', rollup_table);
+    EXECUTE format($sql$
+        INSERT INTO %I (resolution, period_start, project_id, samples, %s)
+        SELECT b.resolution, date_trunc(b.resolution, m.metric_date)::DATE, s.project_id,
+               COUNT(*), %s
+        FROM %I m
+        CROSS JOIN (VALUES ('week'), ('month')) AS b(resolution)
+        CROSS JOIN LATERAL (VALUES (m.project_id), (NULL::INTEGER)) AS s(project_id)
+        GROUP BY 1, 2, 3
+    $sql$,
+        rollup_table,
+        array_to_string(metric_columns, ', '),
+        (SELECT string_agg(format('SUM(COALESCE(m.%s, 0))', c), ', ') FROM unnest(metric_columns) c),
+        metrics_table);
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS rollup_engineering_metrics_insert ON engineering_metrics;
+DROP TRIGGER IF EXISTS rollup_engineering_metrics_update ON engineering_metrics;
+DROP TRIGGER IF EXISTS rollup_engineering_metrics_delete ON engineering_metrics;
+DROP TRIGGER IF EXISTS rollup_qa_metrics_insert ON qa_metrics;
+DROP TRIGGER IF EXISTS rollup_qa_metrics_update ON qa_metrics;
+DROP TRIGGER IF EXISTS rollup_qa_metrics_delete ON qa_metrics;
+
+CREATE TRIGGER rollup_engineering_metrics_insert
+    AFTER INSERT ON engineering_metrics REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_metric_rollups();
+
+CREATE TRIGGER rollup_engineering_metrics_update
+    AFTER UPDATE ON engineering_metrics REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_metric_rollups();
+
+CREATE TRIGGER rollup_engineering_metrics_delete
+    AFTER DELETE ON engineering_metrics REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_metric_rollups();
+
+CREATE TRIGGER rollup_qa_metrics_insert
+    AFTER INSERT ON qa_metrics REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_metric_rollups();
+
+CREATE TRIGGER rollup_qa_metrics_update
+    AFTER UPDATE ON qa_metrics REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_metric_rollups();
+
+CREATE TRIGGER rollup_qa_metrics_delete
+    AFTER DELETE ON qa_metrics REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_metric_rollups();
+
+SELECT rebuild_metric_rollups('engineering_metrics');
+SELECT rebuild_metric_rollups('qa_metrics');
+
+COMMIT;
@@ -0,0 +1,141 @@
+-- =============================================================================
+-- MIGRATION 002: statement-level project health refresh
+-- =============================================================================
+-- Replaces the per-row update_project_health_on_deliverable_change trigger
+-- with statement-level triggers that recompute each affected project once
+-- per statement through the set-based project_health_scores(). Scores are
+-- now clamped to 0..100, so every project is refreshed at the end; only
+-- projects whose score, status or risk changes are written.
+--
+--   psql -d zapcom_resource_db -f database/migrations/002_statement_project_health.sql
+-- New databases get the same objects from unified_it_delivery_schema.sql.
+-- =============================================================================
+
+BEGIN;
+
+DROP TRIGGER IF EXISTS update_project_health_on_deliverable_change ON deliverables;
+
+-- Set-based project health scoring: one pass over the deliverables of all
+-- requested projects. Weights are budget 30%, timeline 40%, deliverables 30%.
+CREATE OR REPLACE FUNCTION project_health_scores(project_ids INTEGER[])
+RETURNS TABLE(project_id INTEGER, health_score INTEGER) AS $$
+    WITH totals AS (
+        SELECT d.project_id,
+               COALESCE(SUM(d.actual_hours), 0) AS total_actual_hours,
+               COUNT(*) AS total_deliverables,
+               COUNT(CASE WHEN d.status = 'Completed' THEN 1 END) AS completed_deliverables
+        FROM deliverables d
+        WHERE d.project_id = ANY(project_ids)
+        GROUP BY d.project_id
+    ),
+    components AS (
+        SELECT p.id,
+            CASE WHEN p.budget > 0 THEN
+                LEAST(100, GREATEST(0, 100 - ((COALESCE(t.total_actual_hours, 0) * 75.0 / p.budget * 100) - 80) * 5))::INTEGER
+            ELSE 100 END AS budget_health,
+            CASE
+                WHEN p.end_date IS NULL THEN 100
+                WHEN CURRENT_DATE > p.end_date THEN 0
+                WHEN CURRENT_DATE > p.start_date AND p.end_date - p.start_date > 0 THEN
+                    LEAST(100, GREATEST(0, 100 - (((CURRENT_DATE - p.start_date) * 100 / (p.end_date - p.start_date)) - 50) * 2))
+                ELSE 100
+            END AS timeline_health,
+            CASE WHEN t.total_deliverables > 0 THEN
+                (t.completed_deliverables * 100 / t.total_deliverables)::INTEGER
+            ELSE 100 END AS deliverable_health
+        FROM projects p
+        LEFT JOIN totals t ON t.project_id = p.id
+        WHERE p.id = ANY(project_ids)
+    )
+    SELECT id, (budget_health * 0.3 + timeline_health * 0.4 + deliverable_health * 0.3)::INTEGER
+    FROM components;
+$$ LANGUAGE sql STABLE;
+
+-- Single-project health score, kept for ad-hoc use
+CREATE OR REPLACE FUNCTION calculate_project_health_score(project_id_param INTEGER)
+RETURNS INTEGER AS $$
+    SELECT health_score FROM project_health_scores(ARRAY[project_id_param]);
+$$ LANGUAGE sql STABLE;
+
+-- Recompute health score, status and risk for a set of projects in one
+-- statement, writing only the projects whose values actually change
+CREATE OR REPLACE FUNCTION refresh_project_health(project_ids INTEGER[])
+RETURNS INTEGER AS $$
+DECLARE
+    updated_count INTEGER;
+BEGIN
+    -- Lock in id order so concurrent batches touching the same projects cannot deadlock
+    PERFORM 1 FROM projects WHERE id = ANY(project_ids) ORDER BY id FOR UPDATE;
+
+    UPDATE projects p
+    SET health_score = s.health_score,
+        health_status = s.health_status,
+        delivery_risk = s.delivery_risk
+    FROM (
+        SELECT h.project_id, h.health_score,
+            CASE WHEN h.health_score >= 80 THEN 'Green'
+                 WHEN h.health_score >= 60 THEN 'Yellow'
+                 ELSE 'Red' END AS health_status,
+            CASE WHEN h.health_score >= 80 THEN 'Low'
+                 WHEN h.health_score >= 60 THEN 'Medium'
+                 ELSE 'High' END AS delivery_risk
+        FROM project_health_scores(project_ids) h
+    ) s
+    WHERE p.id = s.project_id
+    AND (p.health_score IS DISTINCT FROM s.health_score
+         OR p.health_status IS DISTINCT FROM s.health_status
+         OR p.delivery_risk IS DISTINCT FROM s.delivery_risk);
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level trigger function: collects the projects touched by a
+-- deliverables statement from its transition tables and refreshes each of
+-- them once. Updates only count when a health input (project, status or
+-- actual hours) changed.
+CREATE OR REPLACE FUNCTION update_project_health()
+RETURNS TRIGGER AS $$
+DECLARE
+    affected_projects INTEGER[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT project_id) INTO affected_projects FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT project_id) INTO affected_projects FROM old_rows;
+    ELSE
+        SELECT array_agg(DISTINCT c.project_id) INTO affected_projects
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        CROSS JOIN LATERAL (VALUES (n.project_id), (o.project_id)) AS c(project_id)
+        WHERE (n.project_id, n.status, n.actual_hours) IS DISTINCT FROM (o.project_id, o.status, o.actual_hours);
+    END IF;
+
+    IF affected_projects IS NOT NULL THEN
+        PERFORM refresh_project_health(affected_projects);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_project_health_on_deliverable_insert ON deliverables;
+DROP TRIGGER IF EXISTS update_project_health_on_deliverable_update ON deliverables;
+DROP TRIGGER IF EXISTS update_project_health_on_deliverable_delete ON deliverables;
+
+CREATE TRIGGER update_project_health_on_deliverable_insert
+    AFTER INSERT ON deliverables REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_project_health();
+
+CREATE TRIGGER update_project_health_on_deliverable_update
+    AFTER UPDATE ON deliverables REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_project_health();
+
+CREATE TRIGGER update_project_health_on_deliverable_delete
+    AFTER DELETE ON deliverables REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_project_health();
+
+SELECT refresh_project_health(array_agg(id)) FROM projects;
+
+COMMIT;
@@ -0,0 +1,110 @@
+-- =============================================================================
+-- MIGRATION 003: statement-level resource status refresh
+-- =============================================================================
+-- Replaces the per-row update_resource_status_on_project_change trigger on
+-- project_resources with statement-level triggers on project_resources and
+-- projects. Each statement refreshes the statuses of the resources it
+-- affects once, through refresh_resource_status().
+--
+--   psql -d zapcom_resource_db -f database/migrations/003_statement_resource_status.sql
+-- New databases get the same objects from unified_it_delivery_schema.sql.
+-- =============================================================================
+
+BEGIN;
+
+DROP TRIGGER IF EXISTS update_resource_status_on_project_change ON project_resources;
+
+-- Recompute Billable/Benched status for a set of resources in one statement:
+-- a resource is Billable while it has an active allocation on an active
+-- In Progress project. Only resources whose status comes from allocations
+-- (Billable, Benched, Available) are touched; On Leave, Shadow and
+-- Transition are set by hand and kept. Only changed statuses are written.
+CREATE OR REPLACE FUNCTION refresh_resource_status(resource_ids INTEGER[])
+RETURNS INTEGER AS $$
+DECLARE
+    updated_count INTEGER;
+BEGIN
+    -- Lock in id order so concurrent reallocations cannot deadlock
+    PERFORM 1 FROM resources WHERE id = ANY(resource_ids) ORDER BY id FOR UPDATE;
+
+    UPDATE resources r
+    SET status = s.status
+    FROM (
+        SELECT u.id,
+            CASE WHEN b.resource_id IS NOT NULL THEN 'Billable' ELSE 'Benched' END AS status
+        FROM unnest(resource_ids) AS u(id)
+        LEFT JOIN (
+            SELECT DISTINCT pr.resource_id
+            FROM project_resources pr
+            JOIN projects p ON pr.project_id = p.id
+            WHERE pr.resource_id = ANY(resource_ids)
+            AND pr.is_active = TRUE
+            AND p.is_active = TRUE
+            AND p.status = 'In Progress'
+        ) b ON b.resource_id = u.id
+    ) s
+    WHERE r.id = s.id
+    AND (r.status IS NULL OR r.status IN ('Billable', 'Benched', 'Available'))
+    AND r.status IS DISTINCT FROM s.status;
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level trigger function: collects the resources touched by a
+-- project_resources statement, or actively allocated to projects whose status or
+-- activity changed, and refreshes each of them once.
+CREATE OR REPLACE FUNCTION update_resource_status()
+RETURNS TRIGGER AS $$
+DECLARE
+    affected_resources INTEGER[];
+BEGIN
+    IF TG_TABLE_NAME = 'projects' THEN
+        SELECT array_agg(DISTINCT pr.resource_id) INTO affected_resources
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        JOIN project_resources pr ON pr.project_id = n.id AND pr.is_active = TRUE
+        WHERE (n.status, n.is_active) IS DISTINCT FROM (o.status, o.is_active);
+    ELSIF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT resource_id) INTO affected_resources FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT resource_id) INTO affected_resources FROM old_rows;
+    ELSE
+        SELECT array_agg(DISTINCT c.resource_id) INTO affected_resources
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        CROSS JOIN LATERAL (VALUES (n.resource_id), (o.resource_id)) AS c(resource_id)
+        WHERE (n.resource_id, n.project_id, n.is_active) IS DISTINCT FROM (o.resource_id, o.project_id, o.is_active);
+    END IF;
+
+    IF affected_resources IS NOT NULL THEN
+        PERFORM refresh_resource_status(affected_resources);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_resource_status_on_allocation_insert ON project_resources;
+DROP TRIGGER IF EXISTS update_resource_status_on_allocation_update ON project_resources;
+DROP TRIGGER IF EXISTS update_resource_status_on_allocation_delete ON project_resources;
+DROP TRIGGER IF EXISTS update_resource_status_on_project_change ON projects;
+
+CREATE TRIGGER update_resource_status_on_allocation_insert
+    AFTER INSERT ON project_resources REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_resource_status();
+
+CREATE TRIGGER update_resource_status_on_allocation_update
+    AFTER UPDATE ON project_resources REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_resource_status();
+
+CREATE TRIGGER update_resource_status_on_allocation_delete
+    AFTER DELETE ON project_resources REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_resource_status();
+
+CREATE TRIGGER update_resource_status_on_project_change
+    AFTER UPDATE ON projects REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_resource_status();
+
+COMMIT;
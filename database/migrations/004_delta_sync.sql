@@ -0,0 +1,132 @@
+-- =============================================================================
+-- MIGRATION 004: delta sync tombstones and parent touches
+-- =============================================================================
+-- List routes that support ?since= read rows changed after the sync token
+-- from updated_at and deleted ids from sync_tombstones. Statement-level
+-- triggers record a tombstone for every deleted resource, project,
+-- deliverable and escalation, and bump the parent updated_at when
+-- resource_skills or project_resources rows change. Migration 007 adds the
+-- project_resources tombstones and needs this migration first.
+--
+--   psql -d zapcom_resource_db -f database/migrations/004_delta_sync.sql
+-- New databases get the same objects from unified_it_delivery_schema.sql.
+-- =============================================================================
+
+BEGIN;
+
+-- Ids of deleted rows for list routes that support ?since= delta sync.
+-- Pruned with prune_sync_tombstones(); clients older than the retention
+-- window reload the full list.
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    table_name VARCHAR(50) NOT NULL,
+    row_id INTEGER NOT NULL,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (table_name, row_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_resources_updated_at ON resources(updated_at);
+CREATE INDEX IF NOT EXISTS idx_projects_updated_at ON projects(updated_at);
+CREATE INDEX IF NOT EXISTS idx_deliverables_updated_at ON deliverables(updated_at);
+CREATE INDEX IF NOT EXISTS idx_escalations_updated_at ON escalations(updated_at);
+
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_deleted_at ON sync_tombstones(table_name, deleted_at);
+
+-- Statement-level trigger function: records a tombstone for every deleted row
+CREATE OR REPLACE FUNCTION record_sync_tombstones()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO sync_tombstones (table_name, row_id)
+    SELECT TG_TABLE_NAME, id FROM old_rows
+    ORDER BY id
+    ON CONFLICT (table_name, row_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level trigger function: bumps updated_at on the parent rows of
+-- changed child rows, so delta sync picks up aggregates such as a resource's
+-- skills. Arguments: parent table, foreign key column in the child table.
+CREATE OR REPLACE FUNCTION touch_parent_rows()
+RETURNS TRIGGER AS $$
+DECLARE
+    changed_sql TEXT;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        changed_sql := format('SELECT %I AS parent_id FROM new_rows', TG_ARGV[1]);
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        changed_sql := concat_ws(' UNION ', changed_sql,
+            format('SELECT %I AS parent_id FROM old_rows', TG_ARGV[1]));
+    END IF;
+
+    EXECUTE format('UPDATE %I SET updated_at = CURRENT_TIMESTAMP WHERE id IN (%s)',
+        TG_ARGV[0], changed_sql);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drop tombstones older than the delta sync retention window, e.g. nightly:
+--   SELECT prune_sync_tombstones(INTERVAL '30 days');
+CREATE OR REPLACE FUNCTION prune_sync_tombstones(retention INTERVAL)
+RETURNS INTEGER AS $$
+DECLARE
+    deleted_count INTEGER;
+BEGIN
+    DELETE FROM sync_tombstones WHERE deleted_at < CURRENT_TIMESTAMP - retention;
+    GET DIAGNOSTICS deleted_count = ROW_COUNT;
+    RETURN deleted_count;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sync_tombstones_resources ON resources;
+DROP TRIGGER IF EXISTS sync_tombstones_projects ON projects;
+DROP TRIGGER IF EXISTS sync_tombstones_deliverables ON deliverables;
+DROP TRIGGER IF EXISTS sync_tombstones_escalations ON escalations;
+DROP TRIGGER IF EXISTS touch_resources_on_skill_insert ON resource_skills;
+DROP TRIGGER IF EXISTS touch_resources_on_skill_update ON resource_skills;
+DROP TRIGGER IF EXISTS touch_resources_on_skill_delete ON resource_skills;
+DROP TRIGGER IF EXISTS touch_projects_on_allocation_insert ON project_resources;
+DROP TRIGGER IF EXISTS touch_projects_on_allocation_update ON project_resources;
+DROP TRIGGER IF EXISTS touch_projects_on_allocation_delete ON project_resources;
+
+CREATE TRIGGER sync_tombstones_resources
+    AFTER DELETE ON resources REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+
+CREATE TRIGGER sync_tombstones_projects
+    AFTER DELETE ON projects REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+
+CREATE TRIGGER sync_tombstones_deliverables
+    AFTER DELETE ON deliverables REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+
+CREATE TRIGGER sync_tombstones_escalations
+    AFTER DELETE ON escalations REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+
+CREATE TRIGGER touch_resources_on_skill_insert
+    AFTER INSERT ON resource_skills REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_parent_rows('resources', 'resource_id');
+
+CREATE TRIGGER touch_resources_on_skill_update
+    AFTER UPDATE ON resource_skills REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_parent_rows('resources', 'resource_id');
+
+CREATE TRIGGER touch_resources_on_skill_delete
+    AFTER DELETE ON resource_skills REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_parent_rows('resources', 'resource_id');
+
+CREATE TRIGGER touch_projects_on_allocation_insert
+    AFTER INSERT ON project_resources REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_parent_rows('projects', 'project_id');
+
+CREATE TRIGGER touch_projects_on_allocation_update
+    AFTER UPDATE ON project_resources REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_parent_rows('projects', 'project_id');
+
+CREATE TRIGGER touch_projects_on_allocation_delete
+    AFTER DELETE ON project_resources REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_parent_rows('projects', 'project_id');
+
+COMMIT;
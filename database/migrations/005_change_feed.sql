@@ -0,0 +1,123 @@
+-- =============================================================================
+-- MIGRATION 005: change feed notifications
+-- =============================================================================
+-- Statement-level triggers on projects, deliverables, resources,
+-- escalations and financial_overview publish the changed ids on the
+-- itdd_changes channel for GET /api/changes/stream.
+--
+--   psql -d zapcom_resource_db -f database/migrations/005_change_feed.sql
+-- New databases get the same objects from unified_it_delivery_schema.sql.
+-- =============================================================================
+
+BEGIN;
+
+-- Statement-level trigger function: publishes the ids touched by a statement
+-- on the itdd_changes channel for the change feed. Arguments: feed topic and
+-- the column holding the row's project id (omitted when there is none).
+-- Ids are sent in chunks of 250 to stay well under NOTIFY's 8000 byte limit.
+CREATE OR REPLACE FUNCTION notify_change_feed()
+RETURNS TRIGGER AS $$
+DECLARE
+    project_column TEXT := COALESCE(quote_ident(TG_ARGV[1]), 'NULL::INTEGER');
+    changed_sql TEXT;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        changed_sql := format('SELECT id, %s AS project_id FROM new_rows', project_column);
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        changed_sql := concat_ws(' UNION ', changed_sql,
+            format('SELECT id, %s AS project_id FROM old_rows', project_column));
+    END IF;
+
+    EXECUTE format($sql$
+        SELECT pg_notify('itdd_changes', json_build_object(
+            'topic', %L,
+            'table', %L,
+            'op', %L,
+            'ids', array_agg(DISTINCT id ORDER BY id),
+            'project_ids', array_remove(array_agg(DISTINCT project_id), NULL)
+        )::text)
+        FROM (SELECT id, project_id, dense_rank() OVER (ORDER BY id) / 250 AS chunk FROM (%s) c) changed
+        GROUP BY chunk
+    $sql$, TG_ARGV[0], TG_TABLE_NAME, TG_OP, changed_sql);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS change_feed_projects_insert ON projects;
+DROP TRIGGER IF EXISTS change_feed_projects_update ON projects;
+DROP TRIGGER IF EXISTS change_feed_projects_delete ON projects;
+DROP TRIGGER IF EXISTS change_feed_deliverables_insert ON deliverables;
+DROP TRIGGER IF EXISTS change_feed_deliverables_update ON deliverables;
+DROP TRIGGER IF EXISTS change_feed_deliverables_delete ON deliverables;
+DROP TRIGGER IF EXISTS change_feed_resources_insert ON resources;
+DROP TRIGGER IF EXISTS change_feed_resources_update ON resources;
+DROP TRIGGER IF EXISTS change_feed_resources_delete ON resources;
+DROP TRIGGER IF EXISTS change_feed_escalations_insert ON escalations;
+DROP TRIGGER IF EXISTS change_feed_escalations_update ON escalations;
+DROP TRIGGER IF EXISTS change_feed_escalations_delete ON escalations;
+DROP TRIGGER IF EXISTS change_feed_financial_overview_insert ON financial_overview;
+DROP TRIGGER IF EXISTS change_feed_financial_overview_update ON financial_overview;
+DROP TRIGGER IF EXISTS change_feed_financial_overview_delete ON financial_overview;
+
+CREATE TRIGGER change_feed_projects_insert
+    AFTER INSERT ON projects REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('project', 'id');
+
+CREATE TRIGGER change_feed_projects_update
+    AFTER UPDATE ON projects REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('project', 'id');
+
+CREATE TRIGGER change_feed_projects_delete
+    AFTER DELETE ON projects REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('project', 'id');
+
+CREATE TRIGGER change_feed_deliverables_insert
+    AFTER INSERT ON deliverables REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('project', 'project_id');
+
+CREATE TRIGGER change_feed_deliverables_update
+    AFTER UPDATE ON deliverables REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('project', 'project_id');
+
+CREATE TRIGGER change_feed_deliverables_delete
+    AFTER DELETE ON deliverables REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('project', 'project_id');
+
+CREATE TRIGGER change_feed_resources_insert
+    AFTER INSERT ON resources REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('resource');
+
+CREATE TRIGGER change_feed_resources_update
+    AFTER UPDATE ON resources REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('resource');
+
+CREATE TRIGGER change_feed_resources_delete
+    AFTER DELETE ON resources REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('resource');
+
+CREATE TRIGGER change_feed_escalations_insert
+    AFTER INSERT ON escalations REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('escalation', 'project_id');
+
+CREATE TRIGGER change_feed_escalations_update
+    AFTER UPDATE ON escalations REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('escalation', 'project_id');
+
+CREATE TRIGGER change_feed_escalations_delete
+    AFTER DELETE ON escalations REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('escalation', 'project_id');
+
+CREATE TRIGGER change_feed_financial_overview_insert
+    AFTER INSERT ON financial_overview REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('financial');
+
+CREATE TRIGGER change_feed_financial_overview_update
+    AFTER UPDATE ON financial_overview REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('financial');
+
+CREATE TRIGGER change_feed_financial_overview_delete
+    AFTER DELETE ON financial_overview REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('financial');
+
+COMMIT;
@@ -0,0 +1,52 @@
+-- =============================================================================
+-- MIGRATION 006: composite and partial indexes for the route queries
+-- =============================================================================
+-- Proposed by backend/query_plans.py against the large generated dataset
+-- (100k resources, 10k projects, 2M deliverables). Each index matches the
+-- filter columns followed by the keyset ORDER BY of a list route, so the
+-- first page is read in index order instead of sorting the whole table.
+-- The single-column indexes that become prefixes of a composite are dropped.
+-- The rollup period indexes need the tables from 001_metric_rollups.sql.
+--
+-- CONCURRENTLY cannot run inside a transaction block; run with autocommit:
+--   psql -d zapcom_resource_db -f database/migrations/006_route_query_indexes.sql
+-- New databases get the same indexes from unified_it_delivery_schema.sql.
+-- =============================================================================
+
+-- GET /api/deliverables: ORDER BY due_date, id (optionally by project and status)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_deliverables_due_date_id
+    ON deliverables(due_date, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_deliverables_project_status_due_date
+    ON deliverables(project_id, status, due_date, id);
+DROP INDEX CONCURRENTLY IF EXISTS idx_deliverables_due_date;
+DROP INDEX CONCURRENTLY IF EXISTS idx_deliverables_project;
+
+-- GET /api/escalations: WHERE status = ? ORDER BY raised_date DESC, id DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_escalations_status_raised_date
+    ON escalations(status, raised_date DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_escalations_project_status_raised_date
+    ON escalations(project_id, status, raised_date DESC, id DESC);
+DROP INDEX CONCURRENTLY IF EXISTS idx_escalations_status;
+DROP INDEX CONCURRENTLY IF EXISTS idx_escalations_project;
+
+-- GET /api/metrics/*?resolution=week|month: ORDER BY period_start DESC, project_id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_engineering_metrics_rollup_period
+    ON engineering_metrics_rollup(resolution, period_start DESC, project_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_qa_metrics_rollup_period
+    ON qa_metrics_rollup(resolution, period_start DESC, project_id);
+
+-- Active allocations: reallocation moves, resource status refresh, view joins
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_project_resources_resource_project_active
+    ON project_resources(resource_id, project_id) WHERE is_active = TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_project_resources_project_active
+    ON project_resources(project_id) WHERE is_active = TRUE;
+
+-- Dashboard counts over active projects and resources by status
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_projects_status_active
+    ON projects(status) WHERE is_active = TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_resources_status_active
+    ON resources(status) WHERE is_active = TRUE;
+
+ANALYZE deliverables;
+ANALYZE escalations;
+ANALYZE project_resources;
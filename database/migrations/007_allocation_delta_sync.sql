@@ -0,0 +1,41 @@
+-- =============================================================================
+-- MIGRATION 007: delta sync for project_resources
+-- =============================================================================
+-- The capacity index (backend/capacity.py) keeps every active allocation in
+-- memory and patches it from the rows changed since its last sync, like the
+-- skill index does for resources. project_resources gets the same updated_at
+-- column, trigger and tombstones as the other synced tables.
+--
+-- Requires 004_delta_sync.sql, which creates sync_tombstones and
+-- record_sync_tombstones(); the check below stops here if it has not run.
+--
+--   psql -d zapcom_resource_db -f database/migrations/007_allocation_delta_sync.sql
+-- New databases get the same objects from unified_it_delivery_schema.sql.
+-- =============================================================================
+
+BEGIN;
+
+DO $$
+BEGIN
+    IF to_regclass('sync_tombstones') IS NULL
+       OR to_regprocedure('record_sync_tombstones()') IS NULL THEN
+        RAISE EXCEPTION 'sync_tombstones and record_sync_tombstones() are missing; apply 004_delta_sync.sql first';
+    END IF;
+END
+$$;
+
+ALTER TABLE project_resources
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+DROP TRIGGER IF EXISTS update_project_resources_updated_at ON project_resources;
+CREATE TRIGGER update_project_resources_updated_at
+    BEFORE UPDATE ON project_resources FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+DROP TRIGGER IF EXISTS sync_tombstones_project_resources ON project_resources;
+CREATE TRIGGER sync_tombstones_project_resources
+    AFTER DELETE ON project_resources REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+
+CREATE INDEX IF NOT EXISTS idx_project_resources_updated_at ON project_resources(updated_at);
+
+COMMIT;
@@ -0,0 +1,33 @@
+-- =============================================================================
+-- MIGRATION 008: trigram indexes for GET /api/search
+-- =============================================================================
+-- The typeahead search (backend/search.py) matches ILIKE '%term%' on
+-- resource names, emails and roles, project names and descriptions, and
+-- client names. pg_trgm GIN indexes answer these patterns with a bitmap
+-- index scan instead of a sequential scan of each table. Terms shorter than
+-- three characters yield no trigrams and still scan; the route caches them.
+--
+-- pg_trgm ships with the PostgreSQL contrib package. CONCURRENTLY cannot run
+-- inside a transaction block; run with autocommit:
+--   psql -d zapcom_resource_db -f database/migrations/008_search_trigram_indexes.sql
+-- New databases get the same objects from unified_it_delivery_schema.sql.
+-- =============================================================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_resources_name_trgm
+    ON resources USING GIN (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_resources_email_trgm
+    ON resources USING GIN (email gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_resources_role_trgm
+    ON resources USING GIN (role gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_projects_name_trgm
+    ON projects USING GIN (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_projects_description_trgm
+    ON projects USING GIN (description gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_clients_name_trgm
+    ON clients USING GIN (name gin_trgm_ops);
+
+ANALYZE resources;
+ANALYZE projects;
+ANALYZE clients;
@@ -0,0 +1,150 @@
+-- =============================================================================
+-- MIGRATION 009: incrementally maintained department counters
+-- =============================================================================
+-- GET /api/analytics/allocation and GET /api/departments/performance read
+-- department_stats, one row per department, instead of aggregating every
+-- resource per request. Statement-level triggers on resources keep it
+-- current in the writing transaction; allocation writes reach it through
+-- the resource status refresh. The counters are built from the current
+-- resources at the end. Check for drift with:
+--   python backend/department_stats.py [--repair]
+--
+--   psql -d zapcom_resource_db -f database/migrations/009_department_stats.sql
+-- New databases get the same objects from unified_it_delivery_schema.sql.
+-- =============================================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS department_stats (
+    department_id INTEGER,
+    total_resources INTEGER NOT NULL DEFAULT 0,
+    billable_resources INTEGER NOT NULL DEFAULT 0,
+    benched_resources INTEGER NOT NULL DEFAULT 0,
+    shadow_resources INTEGER NOT NULL DEFAULT 0,
+    available_resources INTEGER NOT NULL DEFAULT 0,
+    on_leave_resources INTEGER NOT NULL DEFAULT 0,
+    transition_resources INTEGER NOT NULL DEFAULT 0,
+    active_resources INTEGER NOT NULL DEFAULT 0,
+    active_billable_resources INTEGER NOT NULL DEFAULT 0,
+    rating_sum DECIMAL(14,2) NOT NULL DEFAULT 0,
+    rated_resources INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_department_stats_department ON department_stats(COALESCE(department_id, 0));
+
+-- SELECT summing (sign, department_id, status, is_active, performance_rating)
+-- rows from ``source`` into department_stats columns. Shared by the trigger
+-- (signed transition rows) and the rebuild (every resource, sign 1).
+CREATE OR REPLACE FUNCTION department_stats_delta_sql(source TEXT)
+RETURNS TEXT AS $$
+    SELECT format($sql$
+        SELECT department_id,
+               SUM(sign) AS total_resources,
+               SUM(CASE WHEN status = 'Billable' THEN sign ELSE 0 END) AS billable_resources,
+               SUM(CASE WHEN status = 'Benched' THEN sign ELSE 0 END) AS benched_resources,
+               SUM(CASE WHEN status = 'Shadow' THEN sign ELSE 0 END) AS shadow_resources,
+               SUM(CASE WHEN status = 'Available' THEN sign ELSE 0 END) AS available_resources,
+               SUM(CASE WHEN status = 'On Leave' THEN sign ELSE 0 END) AS on_leave_resources,
+               SUM(CASE WHEN status = 'Transition' THEN sign ELSE 0 END) AS transition_resources,
+               SUM(CASE WHEN COALESCE(is_active, TRUE) THEN sign ELSE 0 END) AS active_resources,
+               SUM(CASE WHEN COALESCE(is_active, TRUE) AND status = 'Billable' THEN sign ELSE 0 END)
+                   AS active_billable_resources,
+               SUM(CASE WHEN COALESCE(is_active, TRUE) THEN sign * COALESCE(performance_rating, 0) ELSE 0 END)
+                   AS rating_sum,
+               SUM(CASE WHEN COALESCE(is_active, TRUE) AND performance_rating IS NOT NULL THEN sign ELSE 0 END)
+                   AS rated_resources
+        FROM (%s) d
+        GROUP BY department_id
+    $sql$, source);
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Function to maintain department_stats from a resources statement's
+-- transition tables: inserted rows are added, deleted rows subtracted and
+-- updates do both. Departments whose delta nets to zero (an updated_at bump,
+-- a rename) are skipped, so most resource updates take no counter locks.
+-- Allocation writes reach it through refresh_resource_status().
+CREATE OR REPLACE FUNCTION maintain_department_stats()
+RETURNS TRIGGER AS $$
+DECLARE
+    delta_sql TEXT;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        delta_sql := 'SELECT 1 AS sign, department_id, status, is_active, performance_rating FROM new_rows';
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        delta_sql := concat_ws(' UNION ALL ', delta_sql,
+            'SELECT -1 AS sign, department_id, status, is_active, performance_rating FROM old_rows');
+    END IF;
+
+    -- Counter rows are upserted in key order so concurrent batches lock them consistently
+    EXECUTE format($sql$
+        INSERT INTO department_stats AS s (
+            department_id, total_resources, billable_resources, benched_resources, shadow_resources,
+            available_resources, on_leave_resources, transition_resources, active_resources,
+            active_billable_resources, rating_sum, rated_resources)
+        SELECT * FROM (%s) delta
+        WHERE (total_resources, billable_resources, benched_resources, shadow_resources,
+               available_resources, on_leave_resources, transition_resources, active_resources,
+               active_billable_resources, rating_sum, rated_resources)
+           <> (0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        ORDER BY COALESCE(department_id, 0)
+        ON CONFLICT (COALESCE(department_id, 0)) DO UPDATE SET
+            total_resources = s.total_resources + EXCLUDED.total_resources,
+            billable_resources = s.billable_resources + EXCLUDED.billable_resources,
+            benched_resources = s.benched_resources + EXCLUDED.benched_resources,
+            shadow_resources = s.shadow_resources + EXCLUDED.shadow_resources,
+            available_resources = s.available_resources + EXCLUDED.available_resources,
+            on_leave_resources = s.on_leave_resources + EXCLUDED.on_leave_resources,
+            transition_resources = s.transition_resources + EXCLUDED.transition_resources,
+            active_resources = s.active_resources + EXCLUDED.active_resources,
+            active_billable_resources = s.active_billable_resources + EXCLUDED.active_billable_resources,
+            rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+            rated_resources = s.rated_resources + EXCLUDED.rated_resources,
+            updated_at = CURRENT_TIMESTAMP
+    $sql$, department_stats_delta_sql(delta_sql));
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function to recompute department_stats from scratch, e.g. after TRUNCATE,
+-- when adding the counters to an existing database, or to repair drift
+-- reported by backend/department_stats.py:
+--   SELECT rebuild_department_stats();
+CREATE OR REPLACE FUNCTION rebuild_department_stats()
+RETURNS VOID AS $$
+BEGIN
+    -- TRUNCATE waits for writers holding counter rows, so the recount below
+    -- sees every change whose delta it discards
+    TRUNCATE department_stats;
+    EXECUTE format($sql$
+        INSERT INTO department_stats (
+            department_id, total_resources, billable_resources, benched_resources, shadow_resources,
+            available_resources, on_leave_resources, transition_resources, active_resources,
+            active_billable_resources, rating_sum, rated_resources)
+        %s
+    $sql$, department_stats_delta_sql(
+        'SELECT 1 AS sign, department_id, status, is_active, performance_rating FROM resources'));
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS department_stats_resources_insert ON resources;
+DROP TRIGGER IF EXISTS department_stats_resources_update ON resources;
+DROP TRIGGER IF EXISTS department_stats_resources_delete ON resources;
+
+CREATE TRIGGER department_stats_resources_insert
+    AFTER INSERT ON resources REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_department_stats();
+
+CREATE TRIGGER department_stats_resources_update
+    AFTER UPDATE ON resources REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_department_stats();
+
+CREATE TRIGGER department_stats_resources_delete
+    AFTER DELETE ON resources REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_department_stats();
+
+SELECT rebuild_department_stats();
+
+COMMIT;
@@ -0,0 +1,19 @@
+-- =============================================================================
+-- MIGRATION 010: shared token revocation list
+-- =============================================================================
+-- Logout and POST /api/auth/revoke/<user_id> record revocations here instead
+-- of in the response cache, whose LRU may evict them and which is per
+-- process by default. Every worker and both serving modes check this table,
+-- and a revocation lasts until the tokens it covers have expired.
+--
+--   psql -d zapcom_resource_db -f database/migrations/010_token_revocations.sql
+-- New databases get the same objects from unified_it_delivery_schema.sql.
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS token_revocations (
+    revocation_key VARCHAR(100) PRIMARY KEY,
+    revoked_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_token_revocations_expires ON token_revocations(expires_at);
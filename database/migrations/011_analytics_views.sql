@@ -0,0 +1,111 @@
+-- =============================================================================
+-- MIGRATION 011: project health, HR and financial summary views
+-- =============================================================================
+-- GET /api/projects/health, /api/hr/resources and /api/financial/overview
+-- read v_project_health, v_resource_performance_hr and v_financial_summary,
+-- which earlier schemas never created, so those routes failed with a 500.
+-- The two indexes serve the HR view's keyset order and its year-to-date
+-- hours. CONCURRENTLY cannot run inside a transaction block, so run the file
+-- with autocommit (the psql default).
+--
+--   psql -d zapcom_resource_db -f database/migrations/011_analytics_views.sql
+-- New databases get the same objects from unified_it_delivery_schema.sql.
+-- =============================================================================
+
+-- Project health with the budget, timeline and delivery figures behind the
+-- score. Budget burn costs hours at the same rate as project_health_scores();
+-- deliverables, allocations and escalations are aggregated per project
+-- before the join.
+CREATE OR REPLACE VIEW v_project_health AS
+SELECT 
+    p.id as project_id,
+    p.name as project_name,
+    c.name as client_name,
+    r.name as manager_name,
+    p.health_score,
+    p.health_status,
+    p.delivery_risk,
+    CASE WHEN p.budget > 0 THEN
+        ROUND(COALESCE(d.total_actual_hours, 0) * 75.0 / p.budget * 100, 1)
+    END as budget_utilization,
+    CASE WHEN p.end_date > p.start_date THEN
+        ROUND(LEAST(100, GREATEST(0, (CURRENT_DATE - p.start_date) * 100.0 / (p.end_date - p.start_date))), 1)
+    END as timeline_progress,
+    ROUND(a.avg_allocation, 1) as resource_utilization,
+    COALESCE(e.escalation_count, 0) as escalation_count,
+    COALESCE(d.deliverables_on_track, 0) as deliverables_on_track,
+    COALESCE(d.deliverables_delayed, 0) as deliverables_delayed
+FROM projects p
+LEFT JOIN clients c ON p.client_id = c.id
+LEFT JOIN resources r ON p.manager_id = r.id
+LEFT JOIN (
+    SELECT project_id,
+           SUM(actual_hours) as total_actual_hours,
+           COUNT(CASE WHEN status IN ('Delayed', 'Blocked')
+                        OR (status != 'Completed' AND due_date < CURRENT_DATE) THEN 1 END) as deliverables_delayed,
+           COUNT(CASE WHEN status IN ('Pending', 'In Progress')
+                       AND due_date >= CURRENT_DATE THEN 1 END) as deliverables_on_track
+    FROM deliverables
+    GROUP BY project_id
+) d ON d.project_id = p.id
+LEFT JOIN (
+    SELECT project_id, AVG(allocation_percentage) as avg_allocation
+    FROM project_resources
+    WHERE is_active = TRUE
+    GROUP BY project_id
+) a ON a.project_id = p.id
+LEFT JOIN (
+    SELECT project_id, COUNT(*) as escalation_count
+    FROM escalations
+    WHERE status IN ('Open', 'In Progress', 'Escalated')
+    GROUP BY project_id
+) e ON e.project_id = p.id
+WHERE p.is_active = TRUE;
+
+-- Compensation, reviews and current allocation per active resource (HR only)
+CREATE OR REPLACE VIEW v_resource_performance_hr AS
+SELECT 
+    r.id as resource_id,
+    r.name,
+    d.name as department,
+    r.base_salary,
+    r.bonus,
+    r.base_salary + COALESCE(r.bonus, 0) as total_compensation,
+    r.performance_rating,
+    r.last_review_date,
+    r.next_review_date,
+    COALESCE(a.allocated, 0) as utilization_rate,
+    COALESCE(h.billable_hours_ytd, 0) as billable_hours_ytd
+FROM resources r
+LEFT JOIN departments d ON r.department_id = d.id
+LEFT JOIN (
+    SELECT resource_id, SUM(allocation_percentage) as allocated
+    FROM project_resources
+    WHERE is_active = TRUE
+    GROUP BY resource_id
+) a ON a.resource_id = r.id
+LEFT JOIN (
+    SELECT assigned_to, SUM(actual_hours) as billable_hours_ytd
+    FROM deliverables
+    WHERE completion_date >= date_trunc('year', CURRENT_DATE)
+    GROUP BY assigned_to
+) h ON h.assigned_to = r.id
+WHERE r.is_active = TRUE;
+
+-- Monthly financial figures
+CREATE OR REPLACE VIEW v_financial_summary AS
+SELECT 
+    month,
+    total_budget,
+    budget_utilized,
+    revenue_generated,
+    profit_margin,
+    burn_rate,
+    project_count,
+    billable_resources,
+    cost_per_resource,
+    revenue_per_resource
+FROM financial_overview;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_resources_name_id_active ON resources(name, id) WHERE is_active = TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_deliverables_completion_date ON deliverables(completion_date);
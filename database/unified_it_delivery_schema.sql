@@ -10,6 +10,7 @@
 -- Enable required extensions
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 CREATE EXTENSION IF NOT EXISTS "pgcrypto";
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
 
 -- =============================================================================
 -- AUTHENTICATION AND USER MANAGEMENT
@@ -31,6 +32,15 @@ CREATE TABLE users (
     CONSTRAINT chk_user_role CHECK (role IN ('hr', 'resource_manager', 'leadership', 'delivery_owner', 'admin'))
 );
 
+-- Revoked access tokens ('token:<jti>') and users ('user:<id>', every token
+-- issued up to revoked_at). Rows are kept until the tokens they cover have
+-- expired; expired rows are ignored and purged on the next revocation.
+CREATE TABLE token_revocations (
+    revocation_key VARCHAR(100) PRIMARY KEY,
+    revoked_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
 -- =============================================================================
 -- CORE BUSINESS ENTITIES
 -- =============================================================================
@@ -163,6 +173,7 @@ CREATE TABLE project_resources (
     role_in_project VARCHAR(100),
     is_active BOOLEAN DEFAULT TRUE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
     CONSTRAINT chk_allocation CHECK (allocation_percentage >= 0 AND allocation_percentage <= 100),
     FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
@@ -279,6 +290,74 @@ CREATE TABLE qa_metrics (
     UNIQUE(project_id, metric_date)
 );
 
+-- Weekly and monthly metric rollups, per project and org-wide (project_id
+-- NULL). Each bucket stores the sum of every metric plus the number of daily
+-- rows (samples), so averages stay exact under incremental maintenance.
+-- No foreign key on project_id: deleting a project cascades to the raw rows,
+-- whose triggers then drain the project's buckets to zero samples.
+CREATE TABLE engineering_metrics_rollup (
+    resolution VARCHAR(10) NOT NULL,
+    period_start DATE NOT NULL,
+    project_id INTEGER,
+    samples INTEGER NOT NULL DEFAULT 0,
+    commits_count BIGINT DEFAULT 0,
+    lines_of_code BIGINT DEFAULT 0,
+    code_quality_score BIGINT DEFAULT 0,
+    test_coverage BIGINT DEFAULT 0,
+    bugs_reported BIGINT DEFAULT 0,
+    bugs_resolved BIGINT DEFAULT 0,
+    code_review_time_avg DECIMAL(14,2) DEFAULT 0,
+    deployment_frequency BIGINT DEFAULT 0,
+    lead_time_hours DECIMAL(16,2) DEFAULT 0,
+    developer_productivity_score BIGINT DEFAULT 0,
+    technical_debt_ratio DECIMAL(14,2) DEFAULT 0,
+    
+    CONSTRAINT chk_engineering_rollup_resolution CHECK (resolution IN ('week', 'month'))
+);
+
+CREATE TABLE qa_metrics_rollup (
+    resolution VARCHAR(10) NOT NULL,
+    period_start DATE NOT NULL,
+    project_id INTEGER,
+    samples INTEGER NOT NULL DEFAULT 0,
+    test_cases_total BIGINT DEFAULT 0,
+    test_cases_passed BIGINT DEFAULT 0,
+    test_cases_failed BIGINT DEFAULT 0,
+    automation_coverage BIGINT DEFAULT 0,
+    manual_test_hours BIGINT DEFAULT 0,
+    defects_found BIGINT DEFAULT 0,
+    defects_fixed BIGINT DEFAULT 0,
+    defect_removal_efficiency DECIMAL(14,2) DEFAULT 0,
+    test_execution_rate DECIMAL(14,2) DEFAULT 0,
+    regression_test_success DECIMAL(14,2) DEFAULT 0,
+    performance_test_score BIGINT DEFAULT 0,
+    security_test_score BIGINT DEFAULT 0,
+    
+    CONSTRAINT chk_qa_rollup_resolution CHECK (resolution IN ('week', 'month'))
+);
+
+-- Per-department resource counters, maintained by statement-level triggers
+-- on resources so the department analytics read one row per department.
+-- Status counts cover every resource, like the analytics routes; the
+-- active_* and rating columns cover active resources only. department_id
+-- NULL counts resources without a department. No foreign key: a deleted
+-- department's resources move to NULL through their own update triggers.
+CREATE TABLE department_stats (
+    department_id INTEGER,
+    total_resources INTEGER NOT NULL DEFAULT 0,
+    billable_resources INTEGER NOT NULL DEFAULT 0,
+    benched_resources INTEGER NOT NULL DEFAULT 0,
+    shadow_resources INTEGER NOT NULL DEFAULT 0,
+    available_resources INTEGER NOT NULL DEFAULT 0,
+    on_leave_resources INTEGER NOT NULL DEFAULT 0,
+    transition_resources INTEGER NOT NULL DEFAULT 0,
+    active_resources INTEGER NOT NULL DEFAULT 0,
+    active_billable_resources INTEGER NOT NULL DEFAULT 0,
+    rating_sum DECIMAL(14,2) NOT NULL DEFAULT 0,
+    rated_resources INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Financial Overview table
 CREATE TABLE financial_overview (
     id SERIAL PRIMARY KEY,
@@ -320,6 +399,20 @@ CREATE TABLE company_kpis (
     UNIQUE(kpi_date)
 );
 
+-- =============================================================================
+-- DELTA SYNC
+-- =============================================================================
+
+-- Ids of deleted rows for list routes that support ?since= delta sync.
+-- Pruned with prune_sync_tombstones(); clients older than the retention
+-- window reload the full list.
+CREATE TABLE sync_tombstones (
+    table_name VARCHAR(50) NOT NULL,
+    row_id INTEGER NOT NULL,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (table_name, row_id)
+);
+
 -- =============================================================================
 -- INDEXES FOR PERFORMANCE
 -- =============================================================================
@@ -328,6 +421,7 @@ CREATE TABLE company_kpis (
 CREATE INDEX idx_users_email ON users(email);
 CREATE INDEX idx_users_role ON users(role);
 CREATE INDEX idx_users_active ON users(is_active);
+CREATE INDEX idx_token_revocations_expires ON token_revocations(expires_at);
 
 -- Departments indexes
 CREATE INDEX idx_departments_active ON departments(is_active);
@@ -343,10 +437,13 @@ CREATE INDEX idx_clients_industry ON clients(industry);
 
 -- Resources indexes  
 CREATE INDEX idx_resources_status ON resources(status);
+CREATE INDEX idx_resources_status_active ON resources(status) WHERE is_active = TRUE;
 CREATE INDEX idx_resources_department ON resources(department_id);
 CREATE INDEX idx_resources_active ON resources(is_active);
 CREATE INDEX idx_resources_email ON resources(email);
 CREATE INDEX idx_resources_level ON resources(level);
+-- Keyset order of GET /api/hr/resources (v_resource_performance_hr)
+CREATE INDEX idx_resources_name_id_active ON resources(name, id) WHERE is_active = TRUE;
 
 -- Resource Skills indexes
 CREATE INDEX idx_resource_skills_resource ON resource_skills(resource_id);
@@ -354,6 +451,7 @@ CREATE INDEX idx_resource_skills_skill ON resource_skills(skill_id);
 
 -- Projects indexes
 CREATE INDEX idx_projects_status ON projects(status);
+CREATE INDEX idx_projects_status_active ON projects(status) WHERE is_active = TRUE;
 CREATE INDEX idx_projects_active ON projects(is_active);
 CREATE INDEX idx_projects_dates ON projects(start_date, end_date);
 CREATE INDEX idx_projects_client ON projects(client_id);
@@ -364,16 +462,22 @@ CREATE INDEX idx_projects_health ON projects(health_status);
 CREATE INDEX idx_project_resources_project ON project_resources(project_id);
 CREATE INDEX idx_project_resources_resource ON project_resources(resource_id);
 CREATE INDEX idx_project_resources_active ON project_resources(is_active);
+CREATE INDEX idx_project_resources_resource_project_active
+    ON project_resources(resource_id, project_id) WHERE is_active = TRUE;
+CREATE INDEX idx_project_resources_project_active ON project_resources(project_id) WHERE is_active = TRUE;
 
 -- Deliverables indexes
-CREATE INDEX idx_deliverables_project ON deliverables(project_id);
+-- Filter columns followed by the list routes' keyset order (see database/migrations)
+CREATE INDEX idx_deliverables_project_status_due_date ON deliverables(project_id, status, due_date, id);
 CREATE INDEX idx_deliverables_assigned ON deliverables(assigned_to);
 CREATE INDEX idx_deliverables_status ON deliverables(status);
-CREATE INDEX idx_deliverables_due_date ON deliverables(due_date);
+CREATE INDEX idx_deliverables_due_date_id ON deliverables(due_date, id);
+CREATE INDEX idx_deliverables_completion_date ON deliverables(completion_date);
 
 -- Escalations indexes
-CREATE INDEX idx_escalations_project ON escalations(project_id);
-CREATE INDEX idx_escalations_status ON escalations(status);
+CREATE INDEX idx_escalations_project_status_raised_date
+    ON escalations(project_id, status, raised_date DESC, id DESC);
+CREATE INDEX idx_escalations_status_raised_date ON escalations(status, raised_date DESC, id DESC);
 CREATE INDEX idx_escalations_priority ON escalations(priority);
 CREATE INDEX idx_escalations_assigned ON escalations(assigned_to);
 CREATE INDEX idx_escalations_raised_by ON escalations(raised_by);
@@ -383,11 +487,35 @@ CREATE INDEX idx_engineering_metrics_project ON engineering_metrics(project_id);
 CREATE INDEX idx_engineering_metrics_date ON engineering_metrics(metric_date);
 CREATE INDEX idx_qa_metrics_project ON qa_metrics(project_id);
 CREATE INDEX idx_qa_metrics_date ON qa_metrics(metric_date);
+CREATE UNIQUE INDEX idx_engineering_metrics_rollup_bucket
+    ON engineering_metrics_rollup(resolution, period_start, COALESCE(project_id, 0));
+CREATE UNIQUE INDEX idx_qa_metrics_rollup_bucket
+    ON qa_metrics_rollup(resolution, period_start, COALESCE(project_id, 0));
+CREATE INDEX idx_engineering_metrics_rollup_period
+    ON engineering_metrics_rollup(resolution, period_start DESC, project_id);
+CREATE INDEX idx_qa_metrics_rollup_period ON qa_metrics_rollup(resolution, period_start DESC, project_id);
+CREATE UNIQUE INDEX idx_department_stats_department ON department_stats(COALESCE(department_id, 0));
 
 -- Financial indexes
 CREATE INDEX idx_financial_overview_month ON financial_overview(month);
 CREATE INDEX idx_company_kpis_date ON company_kpis(kpi_date);
 
+-- Search indexes: trigram GIN indexes answer ILIKE '%term%' for GET /api/search
+CREATE INDEX idx_resources_name_trgm ON resources USING GIN (name gin_trgm_ops);
+CREATE INDEX idx_resources_email_trgm ON resources USING GIN (email gin_trgm_ops);
+CREATE INDEX idx_resources_role_trgm ON resources USING GIN (role gin_trgm_ops);
+CREATE INDEX idx_projects_name_trgm ON projects USING GIN (name gin_trgm_ops);
+CREATE INDEX idx_projects_description_trgm ON projects USING GIN (description gin_trgm_ops);
+CREATE INDEX idx_clients_name_trgm ON clients USING GIN (name gin_trgm_ops);
+
+-- Delta sync indexes
+CREATE INDEX idx_resources_updated_at ON resources(updated_at);
+CREATE INDEX idx_projects_updated_at ON projects(updated_at);
+CREATE INDEX idx_deliverables_updated_at ON deliverables(updated_at);
+CREATE INDEX idx_escalations_updated_at ON escalations(updated_at);
+CREATE INDEX idx_project_resources_updated_at ON project_resources(updated_at);
+CREATE INDEX idx_sync_tombstones_deleted_at ON sync_tombstones(table_name, deleted_at);
+
 -- =============================================================================
 -- FUNCTIONS AND TRIGGERS
 -- =============================================================================
@@ -401,148 +529,436 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
--- Function to update resource status based on project allocation
+-- Recompute Billable/Benched status for a set of resources in one statement:
+-- a resource is Billable while it has an active allocation on an active
+-- In Progress project. Only resources whose status comes from allocations
+-- (Billable, Benched, Available) are touched; On Leave, Shadow and
+-- Transition are set by hand and kept. Only changed statuses are written.
+CREATE OR REPLACE FUNCTION refresh_resource_status(resource_ids INTEGER[])
+RETURNS INTEGER AS $$
+DECLARE
+    updated_count INTEGER;
+BEGIN
+    -- Lock in id order so concurrent reallocations cannot deadlock
+    PERFORM 1 FROM resources WHERE id = ANY(resource_ids) ORDER BY id FOR UPDATE;
+
+    UPDATE resources r
+    SET status = s.status
+    FROM (
+        SELECT u.id,
+            CASE WHEN b.resource_id IS NOT NULL THEN 'Billable' ELSE 'Benched' END AS status
+        FROM unnest(resource_ids) AS u(id)
+        LEFT JOIN (
+            SELECT DISTINCT pr.resource_id
+            FROM project_resources pr
+            JOIN projects p ON pr.project_id = p.id
+            WHERE pr.resource_id = ANY(resource_ids)
+            AND pr.is_active = TRUE
+            AND p.is_active = TRUE
+            AND p.status = 'In Progress'
+        ) b ON b.resource_id = u.id
+    ) s
+    WHERE r.id = s.id
+    AND (r.status IS NULL OR r.status IN ('Billable', 'Benched', 'Available'))
+    AND r.status IS DISTINCT FROM s.status;
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level trigger function: collects the resources touched by a
+-- project_resources statement, or actively allocated to projects whose status or
+-- activity changed, and refreshes each of them once.
 CREATE OR REPLACE FUNCTION update_resource_status()
 RETURNS TRIGGER AS $$
+DECLARE
+    affected_resources INTEGER[];
 BEGIN
-    -- Update resource status when project allocation changes
-    IF TG_OP = 'INSERT' OR TG_OP = 'UPDATE' THEN
-        UPDATE resources 
-        SET status = CASE 
-            WHEN EXISTS (
-                SELECT 1 FROM project_resources pr 
-                JOIN projects p ON pr.project_id = p.id 
-                WHERE pr.resource_id = NEW.resource_id 
-                AND pr.is_active = TRUE 
-                AND p.is_active = TRUE
-                AND p.status = 'In Progress'
-            ) THEN 'Billable'
-            ELSE 'Benched'
-        END
-        WHERE id = NEW.resource_id;
-        RETURN NEW;
+    IF TG_TABLE_NAME = 'projects' THEN
+        SELECT array_agg(DISTINCT pr.resource_id) INTO affected_resources
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        JOIN project_resources pr ON pr.project_id = n.id AND pr.is_active = TRUE
+        WHERE (n.status, n.is_active) IS DISTINCT FROM (o.status, o.is_active);
+    ELSIF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT resource_id) INTO affected_resources FROM new_rows;
     ELSIF TG_OP = 'DELETE' THEN
-        UPDATE resources 
-        SET status = CASE 
-            WHEN EXISTS (
-                SELECT 1 FROM project_resources pr 
-                JOIN projects p ON pr.project_id = p.id 
-                WHERE pr.resource_id = OLD.resource_id 
-                AND pr.is_active = TRUE 
-                AND p.is_active = TRUE
-                AND p.status = 'In Progress'
-                AND pr.id != OLD.id
-            ) THEN 'Billable'
-            ELSE 'Benched'
-        END
-        WHERE id = OLD.resource_id;
-        RETURN OLD;
+        SELECT array_agg(DISTINCT resource_id) INTO affected_resources FROM old_rows;
+    ELSE
+        SELECT array_agg(DISTINCT c.resource_id) INTO affected_resources
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        CROSS JOIN LATERAL (VALUES (n.resource_id), (o.resource_id)) AS c(resource_id)
+        WHERE (n.resource_id, n.project_id, n.is_active) IS DISTINCT FROM (o.resource_id, o.project_id, o.is_active);
+    END IF;
+
+    IF affected_resources IS NOT NULL THEN
+        PERFORM refresh_resource_status(affected_resources);
     END IF;
+
     RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
--- Simplified function to calculate project health score without recursion
+-- Set-based project health scoring: one pass over the deliverables of all
+-- requested projects. Weights are budget 30%, timeline 40%, deliverables 30%.
+CREATE OR REPLACE FUNCTION project_health_scores(project_ids INTEGER[])
+RETURNS TABLE(project_id INTEGER, health_score INTEGER) AS $$
+    WITH totals AS (
+        SELECT d.project_id,
+               COALESCE(SUM(d.actual_hours), 0) AS total_actual_hours,
+               COUNT(*) AS total_deliverables,
+               COUNT(CASE WHEN d.status = 'Completed' THEN 1 END) AS completed_deliverables
+        FROM deliverables d
+        WHERE d.project_id = ANY(project_ids)
+        GROUP BY d.project_id
+    ),
+    components AS (
+        SELECT p.id,
+            CASE WHEN p.budget > 0 THEN
+                LEAST(100, GREATEST(0, 100 - ((COALESCE(t.total_actual_hours, 0) * 75.0 / p.budget * 100) - 80) * 5))::INTEGER
+            ELSE 100 END AS budget_health,
+            CASE
+                WHEN p.end_date IS NULL THEN 100
+                WHEN CURRENT_DATE > p.end_date THEN 0
+                WHEN CURRENT_DATE > p.start_date AND p.end_date - p.start_date > 0 THEN
+                    LEAST(100, GREATEST(0, 100 - (((CURRENT_DATE - p.start_date) * 100 / (p.end_date - p.start_date)) - 50) * 2))
+                ELSE 100
+            END AS timeline_health,
+            CASE WHEN t.total_deliverables > 0 THEN
+                (t.completed_deliverables * 100 / t.total_deliverables)::INTEGER
+            ELSE 100 END AS deliverable_health
+        FROM projects p
+        LEFT JOIN totals t ON t.project_id = p.id
+        WHERE p.id = ANY(project_ids)
+    )
+    SELECT id, (budget_health * 0.3 + timeline_health * 0.4 + deliverable_health * 0.3)::INTEGER
+    FROM components;
+$$ LANGUAGE sql STABLE;
+
+-- Single-project health score, kept for ad-hoc use
 CREATE OR REPLACE FUNCTION calculate_project_health_score(project_id_param INTEGER)
 RETURNS INTEGER AS $$
+    SELECT health_score FROM project_health_scores(ARRAY[project_id_param]);
+$$ LANGUAGE sql STABLE;
+
+-- Recompute health score, status and risk for a set of projects in one
+-- statement, writing only the projects whose values actually change
+CREATE OR REPLACE FUNCTION refresh_project_health(project_ids INTEGER[])
+RETURNS INTEGER AS $$
+DECLARE
+    updated_count INTEGER;
+BEGIN
+    -- Lock in id order so concurrent batches touching the same projects cannot deadlock
+    PERFORM 1 FROM projects WHERE id = ANY(project_ids) ORDER BY id FOR UPDATE;
+
+    UPDATE projects p
+    SET health_score = s.health_score,
+        health_status = s.health_status,
+        delivery_risk = s.delivery_risk
+    FROM (
+        SELECT h.project_id, h.health_score,
+            CASE WHEN h.health_score >= 80 THEN 'Green'
+                 WHEN h.health_score >= 60 THEN 'Yellow'
+                 ELSE 'Red' END AS health_status,
+            CASE WHEN h.health_score >= 80 THEN 'Low'
+                 WHEN h.health_score >= 60 THEN 'Medium'
+                 ELSE 'High' END AS delivery_risk
+        FROM project_health_scores(project_ids) h
+    ) s
+    WHERE p.id = s.project_id
+    AND (p.health_score IS DISTINCT FROM s.health_score
+         OR p.health_status IS DISTINCT FROM s.health_status
+         OR p.delivery_risk IS DISTINCT FROM s.delivery_risk);
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level trigger function: collects the projects touched by a
+-- deliverables statement from its transition tables and refreshes each of
+-- them once. Updates only count when a health input (project, status or
+-- actual hours) changed.
+CREATE OR REPLACE FUNCTION update_project_health()
+RETURNS TRIGGER AS $$
 DECLARE
-    budget_health INTEGER := 100;
-    timeline_health INTEGER := 100;
-    deliverable_health INTEGER := 100;
-    final_score INTEGER;
-    project_budget DECIMAL(15,2);
-    project_start_date DATE;
-    project_end_date DATE;
-    total_actual_hours INTEGER;
-    total_deliverables INTEGER;
-    completed_deliverables INTEGER;
-    days_elapsed INTEGER;
-    total_days INTEGER;
+    affected_projects INTEGER[];
 BEGIN
-    -- Get project details
-    SELECT p.budget, p.start_date, p.end_date 
-    INTO project_budget, project_start_date, project_end_date
-    FROM projects p WHERE p.id = project_id_param;
-
-    -- Calculate budget health
-    IF project_budget > 0 THEN
-        SELECT COALESCE(SUM(d.actual_hours), 0) INTO total_actual_hours
-        FROM deliverables d WHERE d.project_id = project_id_param;
-        
-        budget_health := LEAST(100, GREATEST(0, 100 - ((total_actual_hours * 75.0 / project_budget * 100) - 80) * 5));
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT project_id) INTO affected_projects FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT project_id) INTO affected_projects FROM old_rows;
+    ELSE
+        SELECT array_agg(DISTINCT c.project_id) INTO affected_projects
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        CROSS JOIN LATERAL (VALUES (n.project_id), (o.project_id)) AS c(project_id)
+        WHERE (n.project_id, n.status, n.actual_hours) IS DISTINCT FROM (o.project_id, o.status, o.actual_hours);
     END IF;
 
-    -- Calculate timeline health
-    IF project_end_date IS NOT NULL THEN
-        IF CURRENT_DATE > project_end_date THEN
-            timeline_health := 0;
-        ELSIF CURRENT_DATE > project_start_date THEN
-            days_elapsed := CURRENT_DATE - project_start_date;
-            total_days := project_end_date - project_start_date;
-            IF total_days > 0 THEN
-                timeline_health := GREATEST(0, 100 - ((days_elapsed * 100 / total_days) - 50) * 2);
-            END IF;
-        END IF;
+    IF affected_projects IS NOT NULL THEN
+        PERFORM refresh_project_health(affected_projects);
     END IF;
 
-    -- Calculate deliverable health
-    SELECT COUNT(*), COUNT(CASE WHEN d.status = 'Completed' THEN 1 END)
-    INTO total_deliverables, completed_deliverables
-    FROM deliverables d WHERE d.project_id = project_id_param;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
 
-    IF total_deliverables > 0 THEN
-        deliverable_health := (completed_deliverables * 100 / total_deliverables);
+-- Function to maintain <metrics table>_rollup from a statement's transition
+-- tables. Inserted rows are added to their week and month buckets, deleted
+-- rows are subtracted and updates do both, so a bulk upsert costs one
+-- rollup statement rather than one per row.
+CREATE OR REPLACE FUNCTION maintain_metric_rollups()
+RETURNS TRIGGER AS $$
+DECLARE
+    rollup_table TEXT := TG_TABLE_NAME || '_rollup';
+    metric_columns TEXT[];
+    delta_sql TEXT;
+BEGIN
+    SELECT array_agg(quote_ident(attname) ORDER BY attnum) INTO metric_columns
+    FROM pg_attribute
+    WHERE attrelid = rollup_table::regclass AND attnum > 0 AND NOT attisdropped
+    AND attname NOT IN ('resolution', 'period_start', 'project_id', 'samples');
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        delta_sql := format('SELECT project_id, metric_date, 1 AS samples, %s FROM new_rows',
+            (SELECT string_agg(format('COALESCE(%s, 0) AS %s', c, c), ', ') FROM unnest(metric_columns) c));
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        delta_sql := concat_ws(' UNION ALL ', delta_sql,
+            format('SELECT project_id, metric_date, -1 AS samples, %s FROM old_rows',
+                (SELECT string_agg(format('-COALESCE(%s, 0) AS %s', c, c), ', ') FROM unnest(metric_columns) c)));
     END IF;
 
-    -- Calculate final weighted score
-    final_score := (budget_health * 0.3 + timeline_health * 0.4 + deliverable_health * 0.3)::INTEGER;
+    -- Buckets are upserted in key order so concurrent batches lock them consistently
+    EXECUTE format($sql$
+        INSERT INTO %I AS r (resolution, period_start, project_id, samples, %s)
+        SELECT b.resolution, date_trunc(b.resolution, d.metric_date)::DATE, s.project_id,
+               SUM(d.samples), %s
+        FROM (%s) d
+        CROSS JOIN (VALUES ('week'), ('month')) AS b(resolution)
+        CROSS JOIN LATERAL (VALUES (d.project_id), (NULL::INTEGER)) AS s(project_id)
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+        ON CONFLICT (resolution, period_start, COALESCE(project_id, 0))
+        DO UPDATE SET samples = r.samples + EXCLUDED.samples, %s
+    $sql$,
+        rollup_table,
+        array_to_string(metric_columns, ', '),
+        (SELECT string_agg(format('SUM(d.%s)', c), ', ') FROM unnest(metric_columns) c),
+        delta_sql,
+        (SELECT string_agg(format('%s = r.%s + EXCLUDED.%s', c, c, c), ', ') FROM unnest(metric_columns) c));
 
-    RETURN final_score;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
--- Function to update project health without causing recursion
-CREATE OR REPLACE FUNCTION update_project_health()
+-- Function to recompute a metrics table's rollups from scratch, e.g. after
+-- TRUNCATE or when adding rollups to an existing database:
+--   SELECT rebuild_metric_rollups('engineering_metrics');
+CREATE OR REPLACE FUNCTION rebuild_metric_rollups(metrics_table TEXT)
+RETURNS VOID AS $$
+DECLARE
+    rollup_table TEXT := metrics_table || '_rollup';
+    metric_columns TEXT[];
+BEGIN
+    SELECT array_agg(quote_ident(attname) ORDER BY attnum) INTO metric_columns
+    FROM pg_attribute
+    WHERE attrelid = rollup_table::regclass AND attnum > 0 AND NOT attisdropped
+    AND attname NOT IN ('resolution', 'period_start', 'project_id', 'samples');
+
+    EXECUTE format('TRUNCATE %I', rollup_table);
+    EXECUTE format($sql$
+        INSERT INTO %I (resolution, period_start, project_id, samples, %s)
+        SELECT b.resolution, date_trunc(b.resolution, m.metric_date)::DATE, s.project_id,
+               COUNT(*), %s
+        FROM %I m
+        CROSS JOIN (VALUES ('week'), ('month')) AS b(resolution)
+        CROSS JOIN LATERAL (VALUES (m.project_id), (NULL::INTEGER)) AS s(project_id)
+        GROUP BY 1, 2, 3
+    $sql$,
+        rollup_table,
+        array_to_string(metric_columns, ', '),
+        (SELECT string_agg(format('SUM(COALESCE(m.%s, 0))', c), ', ') FROM unnest(metric_columns) c),
+        metrics_table);
+END;
+$$ LANGUAGE plpgsql;
+
+-- SELECT summing (sign, department_id, status, is_active, performance_rating)
+-- rows from ``source`` into department_stats columns. Shared by the trigger
+-- (signed transition rows) and the rebuild (every resource, sign 1).
+CREATE OR REPLACE FUNCTION department_stats_delta_sql(source TEXT)
+RETURNS TEXT AS $$
+    SELECT format($sql$
+        SELECT department_id,
+               SUM(sign) AS total_resources,
+               SUM(CASE WHEN status = 'Billable' THEN sign ELSE 0 END) AS billable_resources,
+               SUM(CASE WHEN status = 'Benched' THEN sign ELSE 0 END) AS benched_resources,
+               SUM(CASE WHEN status = 'Shadow' THEN sign ELSE 0 END) AS shadow_resources,
+               SUM(CASE WHEN status = 'Available' THEN sign ELSE 0 END) AS available_resources,
+               SUM(CASE WHEN status = 'On Leave' THEN sign ELSE 0 END) AS on_leave_resources,
+               SUM(CASE WHEN status = 'Transition' THEN sign ELSE 0 END) AS transition_resources,
+               SUM(CASE WHEN COALESCE(is_active, TRUE) THEN sign ELSE 0 END) AS active_resources,
+               SUM(CASE WHEN COALESCE(is_active, TRUE) AND status = 'Billable' THEN sign ELSE 0 END)
+                   AS active_billable_resources,
+               SUM(CASE WHEN COALESCE(is_active, TRUE) THEN sign * COALESCE(performance_rating, 0) ELSE 0 END)
+                   AS rating_sum,
+               SUM(CASE WHEN COALESCE(is_active, TRUE) AND performance_rating IS NOT NULL THEN sign ELSE 0 END)
+                   AS rated_resources
+        FROM (%s) d
+        GROUP BY department_id
+    $sql$, source);
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Function to maintain department_stats from a resources statement's
+-- transition tables: inserted rows are added, deleted rows subtracted and
+-- updates do both. Departments whose delta nets to zero (an updated_at bump,
+-- a rename) are skipped, so most resource updates take no counter locks.
+-- Allocation writes reach it through refresh_resource_status().
+CREATE OR REPLACE FUNCTION maintain_department_stats()
 RETURNS TRIGGER AS $$
 DECLARE
-    target_project_id INTEGER;
-    calculated_health_score INTEGER;
-    health_status_val VARCHAR(20);
-    risk_level VARCHAR(20);
+    delta_sql TEXT;
 BEGIN
-    -- Determine which project to update
-    IF TG_TABLE_NAME = 'deliverables' THEN
-        target_project_id := COALESCE(NEW.project_id, OLD.project_id);
-    ELSE
-        RETURN COALESCE(NEW, OLD);
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        delta_sql := 'SELECT 1 AS sign, department_id, status, is_active, performance_rating FROM new_rows';
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        delta_sql := concat_ws(' UNION ALL ', delta_sql,
+            'SELECT -1 AS sign, department_id, status, is_active, performance_rating FROM old_rows');
     END IF;
 
-    -- Calculate health score
-    calculated_health_score := calculate_project_health_score(target_project_id);
+    -- Counter rows are upserted in key order so concurrent batches lock them consistently
+    EXECUTE format($sql$
+        INSERT INTO department_stats AS s (
+            department_id, total_resources, billable_resources, benched_resources, shadow_resources,
+            available_resources, on_leave_resources, transition_resources, active_resources,
+            active_billable_resources, rating_sum, rated_resources)
+        SELECT * FROM (%s) delta
+        WHERE (total_resources, billable_resources, benched_resources, shadow_resources,
+               available_resources, on_leave_resources, transition_resources, active_resources,
+               active_billable_resources, rating_sum, rated_resources)
+           <> (0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        ORDER BY COALESCE(department_id, 0)
+        ON CONFLICT (COALESCE(department_id, 0)) DO UPDATE SET
+            total_resources = s.total_resources + EXCLUDED.total_resources,
+            billable_resources = s.billable_resources + EXCLUDED.billable_resources,
+            benched_resources = s.benched_resources + EXCLUDED.benched_resources,
+            shadow_resources = s.shadow_resources + EXCLUDED.shadow_resources,
+            available_resources = s.available_resources + EXCLUDED.available_resources,
+            on_leave_resources = s.on_leave_resources + EXCLUDED.on_leave_resources,
+            transition_resources = s.transition_resources + EXCLUDED.transition_resources,
+            active_resources = s.active_resources + EXCLUDED.active_resources,
+            active_billable_resources = s.active_billable_resources + EXCLUDED.active_billable_resources,
+            rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+            rated_resources = s.rated_resources + EXCLUDED.rated_resources,
+            updated_at = CURRENT_TIMESTAMP
+    $sql$, department_stats_delta_sql(delta_sql));
 
-    -- Determine status and risk
-    IF calculated_health_score >= 80 THEN
-        health_status_val := 'Green';
-        risk_level := 'Low';
-    ELSIF calculated_health_score >= 60 THEN
-        health_status_val := 'Yellow';
-        risk_level := 'Medium';
-    ELSE
-        health_status_val := 'Red';
-        risk_level := 'High';
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function to recompute department_stats from scratch, e.g. after TRUNCATE,
+-- when adding the counters to an existing database, or to repair drift
+-- reported by backend/department_stats.py:
+--   SELECT rebuild_department_stats();
+CREATE OR REPLACE FUNCTION rebuild_department_stats()
+RETURNS VOID AS $$
+BEGIN
+    -- TRUNCATE waits for writers holding counter rows, so the recount below
+    -- sees every change whose delta it discards
+    TRUNCATE department_stats;
+    EXECUTE format($sql$
+        INSERT INTO department_stats (
+            department_id, total_resources, billable_resources, benched_resources, shadow_resources,
+            available_resources, on_leave_resources, transition_resources, active_resources,
+            active_billable_resources, rating_sum, rated_resources)
+        %s
+    $sql$, department_stats_delta_sql(
+        'SELECT 1 AS sign, department_id, status, is_active, performance_rating FROM resources'));
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level trigger function: records a tombstone for every deleted row
+CREATE OR REPLACE FUNCTION record_sync_tombstones()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO sync_tombstones (table_name, row_id)
+    SELECT TG_TABLE_NAME, id FROM old_rows
+    ORDER BY id
+    ON CONFLICT (table_name, row_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level trigger function: bumps updated_at on the parent rows of
+-- changed child rows, so delta sync picks up aggregates such as a resource's
+-- skills. Arguments: parent table, foreign key column in the child table.
+CREATE OR REPLACE FUNCTION touch_parent_rows()
+RETURNS TRIGGER AS $$
+DECLARE
+    changed_sql TEXT;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        changed_sql := format('SELECT %I AS parent_id FROM new_rows', TG_ARGV[1]);
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        changed_sql := concat_ws(' UNION ', changed_sql,
+            format('SELECT %I AS parent_id FROM old_rows', TG_ARGV[1]));
+    END IF;
+
+    EXECUTE format('UPDATE %I SET updated_at = CURRENT_TIMESTAMP WHERE id IN (%s)',
+        TG_ARGV[0], changed_sql);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drop tombstones older than the delta sync retention window, e.g. nightly:
+--   SELECT prune_sync_tombstones(INTERVAL '30 days');
+CREATE OR REPLACE FUNCTION prune_sync_tombstones(retention INTERVAL)
+RETURNS INTEGER AS $$
+DECLARE
+    deleted_count INTEGER;
+BEGIN
+    DELETE FROM sync_tombstones WHERE deleted_at < CURRENT_TIMESTAMP - retention;
+    GET DIAGNOSTICS deleted_count = ROW_COUNT;
+    RETURN deleted_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level trigger function: publishes the ids touched by a statement
+-- on the itdd_changes channel for the change feed. Arguments: feed topic and
+-- the column holding the row's project id (omitted when there is none).
+-- Ids are sent in chunks of 250 to stay well under NOTIFY's 8000 byte limit.
+CREATE OR REPLACE FUNCTION notify_change_feed()
+RETURNS TRIGGER AS $$
+DECLARE
+    project_column TEXT := COALESCE(quote_ident(TG_ARGV[1]), 'NULL::INTEGER');
+    changed_sql TEXT;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        changed_sql := format('SELECT id, %s AS project_id FROM new_rows', project_column);
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        changed_sql := concat_ws(' UNION ', changed_sql,
+            format('SELECT id, %s AS project_id FROM old_rows', project_column));
     END IF;
 
-    -- Update project (only if different to avoid unnecessary updates)
-    UPDATE projects 
-    SET health_score = calculated_health_score,
-        health_status = health_status_val,
-        delivery_risk = risk_level
-    WHERE id = target_project_id 
-    AND (projects.health_score != calculated_health_score 
-         OR projects.health_status != health_status_val 
-         OR projects.delivery_risk != risk_level);
-
-    RETURN COALESCE(NEW, OLD);
+    EXECUTE format($sql$
+        SELECT pg_notify('itdd_changes', json_build_object(
+            'topic', %L,
+            'table', %L,
+            'op', %L,
+            'ids', array_agg(DISTINCT id ORDER BY id),
+            'project_ids', array_remove(array_agg(DISTINCT project_id), NULL)
+        )::text)
+        FROM (SELECT id, project_id, dense_rank() OVER (ORDER BY id) / 250 AS chunk FROM (%s) c) changed
+        GROUP BY chunk
+    $sql$, TG_ARGV[0], TG_TABLE_NAME, TG_OP, changed_sql);
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
@@ -572,6 +988,9 @@ CREATE TRIGGER update_deliverables_updated_at
 CREATE TRIGGER update_escalations_updated_at 
     BEFORE UPDATE ON escalations FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+CREATE TRIGGER update_project_resources_updated_at 
+    BEFORE UPDATE ON project_resources FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
 CREATE TRIGGER update_financial_overview_updated_at 
     BEFORE UPDATE ON financial_overview FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
@@ -579,14 +998,181 @@ CREATE TRIGGER update_company_kpis_updated_at
     BEFORE UPDATE ON company_kpis FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
 -- Business logic triggers (removed recursive project health trigger)
+-- Resource status triggers (statement level, one recomputation per batch)
+CREATE TRIGGER update_resource_status_on_allocation_insert
+    AFTER INSERT ON project_resources REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_resource_status();
+
+CREATE TRIGGER update_resource_status_on_allocation_update
+    AFTER UPDATE ON project_resources REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_resource_status();
+
+CREATE TRIGGER update_resource_status_on_allocation_delete
+    AFTER DELETE ON project_resources REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_resource_status();
+
 CREATE TRIGGER update_resource_status_on_project_change
-    AFTER INSERT OR UPDATE OR DELETE ON project_resources 
-    FOR EACH ROW EXECUTE FUNCTION update_resource_status();
+    AFTER UPDATE ON projects REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_resource_status();
+
+-- Only trigger health calculation on deliverable changes to avoid recursion.
+-- Statement level: each affected project is recomputed once per statement.
+CREATE TRIGGER update_project_health_on_deliverable_insert
+    AFTER INSERT ON deliverables REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_project_health();
+
+CREATE TRIGGER update_project_health_on_deliverable_update
+    AFTER UPDATE ON deliverables REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_project_health();
+
+CREATE TRIGGER update_project_health_on_deliverable_delete
+    AFTER DELETE ON deliverables REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_project_health();
+
+-- Metric rollup triggers (statement level, one rollup upsert per batch)
+CREATE TRIGGER rollup_engineering_metrics_insert
+    AFTER INSERT ON engineering_metrics REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_metric_rollups();
+
+CREATE TRIGGER rollup_engineering_metrics_update
+    AFTER UPDATE ON engineering_metrics REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_metric_rollups();
+
+CREATE TRIGGER rollup_engineering_metrics_delete
+    AFTER DELETE ON engineering_metrics REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_metric_rollups();
+
+CREATE TRIGGER rollup_qa_metrics_insert
+    AFTER INSERT ON qa_metrics REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_metric_rollups();
+
+CREATE TRIGGER rollup_qa_metrics_update
+    AFTER UPDATE ON qa_metrics REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_metric_rollups();
+
+CREATE TRIGGER rollup_qa_metrics_delete
+    AFTER DELETE ON qa_metrics REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_metric_rollups();
+
+-- Department counters (statement level, one upsert per department per batch)
+CREATE TRIGGER department_stats_resources_insert
+    AFTER INSERT ON resources REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_department_stats();
+
+CREATE TRIGGER department_stats_resources_update
+    AFTER UPDATE ON resources REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_department_stats();
+
+CREATE TRIGGER department_stats_resources_delete
+    AFTER DELETE ON resources REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_department_stats();
+
+-- Delta sync triggers: tombstones for deleted rows, and parent updated_at
+-- bumps for child rows that feed a list route's aggregates
+CREATE TRIGGER sync_tombstones_resources
+    AFTER DELETE ON resources REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+
+CREATE TRIGGER sync_tombstones_projects
+    AFTER DELETE ON projects REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+
+CREATE TRIGGER sync_tombstones_deliverables
+    AFTER DELETE ON deliverables REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+
+CREATE TRIGGER sync_tombstones_escalations
+    AFTER DELETE ON escalations REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+
+CREATE TRIGGER sync_tombstones_project_resources
+    AFTER DELETE ON project_resources REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+
+CREATE TRIGGER touch_resources_on_skill_insert
+    AFTER INSERT ON resource_skills REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_parent_rows('resources', 'resource_id');
+
+CREATE TRIGGER touch_resources_on_skill_update
+    AFTER UPDATE ON resource_skills REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_parent_rows('resources', 'resource_id');
+
+CREATE TRIGGER touch_resources_on_skill_delete
+    AFTER DELETE ON resource_skills REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_parent_rows('resources', 'resource_id');
+
+CREATE TRIGGER touch_projects_on_allocation_insert
+    AFTER INSERT ON project_resources REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_parent_rows('projects', 'project_id');
+
+CREATE TRIGGER touch_projects_on_allocation_update
+    AFTER UPDATE ON project_resources REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_parent_rows('projects', 'project_id');
+
+CREATE TRIGGER touch_projects_on_allocation_delete
+    AFTER DELETE ON project_resources REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_parent_rows('projects', 'project_id');
+
+-- Change feed triggers (statement level, one notification per 250 rows)
+CREATE TRIGGER change_feed_projects_insert
+    AFTER INSERT ON projects REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('project', 'id');
+
+CREATE TRIGGER change_feed_projects_update
+    AFTER UPDATE ON projects REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('project', 'id');
+
+CREATE TRIGGER change_feed_projects_delete
+    AFTER DELETE ON projects REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('project', 'id');
+
+CREATE TRIGGER change_feed_deliverables_insert
+    AFTER INSERT ON deliverables REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('project', 'project_id');
+
+CREATE TRIGGER change_feed_deliverables_update
+    AFTER UPDATE ON deliverables REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('project', 'project_id');
+
+CREATE TRIGGER change_feed_deliverables_delete
+    AFTER DELETE ON deliverables REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('project', 'project_id');
+
+CREATE TRIGGER change_feed_resources_insert
+    AFTER INSERT ON resources REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('resource');
 
--- Only trigger health calculation on deliverable changes to avoid recursion
-CREATE TRIGGER update_project_health_on_deliverable_change
-    AFTER INSERT OR UPDATE OR DELETE ON deliverables 
-    FOR EACH ROW EXECUTE FUNCTION update_project_health();
+CREATE TRIGGER change_feed_resources_update
+    AFTER UPDATE ON resources REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('resource');
+
+CREATE TRIGGER change_feed_resources_delete
+    AFTER DELETE ON resources REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('resource');
+
+CREATE TRIGGER change_feed_escalations_insert
+    AFTER INSERT ON escalations REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('escalation', 'project_id');
+
+CREATE TRIGGER change_feed_escalations_update
+    AFTER UPDATE ON escalations REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('escalation', 'project_id');
+
+CREATE TRIGGER change_feed_escalations_delete
+    AFTER DELETE ON escalations REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('escalation', 'project_id');
+
+CREATE TRIGGER change_feed_financial_overview_insert
+    AFTER INSERT ON financial_overview REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('financial');
+
+CREATE TRIGGER change_feed_financial_overview_update
+    AFTER UPDATE ON financial_overview REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('financial');
+
+CREATE TRIGGER change_feed_financial_overview_delete
+    AFTER DELETE ON financial_overview REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_change_feed('financial');
 
 -- =============================================================================
 -- DASHBOARD VIEWS
@@ -666,6 +1252,101 @@ GROUP BY p.id, p.name, p.description, c.name, r.name, p.status, p.priority,
          p.budget, p.start_date, p.end_date, p.health_score, p.health_status, 
          p.delivery_risk, p.technology_stack;
 
+-- Project health with the budget, timeline and delivery figures behind the
+-- score. Budget burn costs hours at the same rate as project_health_scores();
+-- deliverables, allocations and escalations are aggregated per project
+-- before the join.
+CREATE OR REPLACE VIEW v_project_health AS
+SELECT 
+    p.id as project_id,
+    p.name as project_name,
+    c.name as client_name,
+    r.name as manager_name,
+    p.health_score,
+    p.health_status,
+    p.delivery_risk,
+    CASE WHEN p.budget > 0 THEN
+        ROUND(COALESCE(d.total_actual_hours, 0) * 75.0 / p.budget * 100, 1)
+    END as budget_utilization,
+    CASE WHEN p.end_date > p.start_date THEN
+        ROUND(LEAST(100, GREATEST(0, (CURRENT_DATE - p.start_date) * 100.0 / (p.end_date - p.start_date))), 1)
+    END as timeline_progress,
+    ROUND(a.avg_allocation, 1) as resource_utilization,
+    COALESCE(e.escalation_count, 0) as escalation_count,
+    COALESCE(d.deliverables_on_track, 0) as deliverables_on_track,
+    COALESCE(d.deliverables_delayed, 0) as deliverables_delayed
+FROM projects p
+LEFT JOIN clients c ON p.client_id = c.id
+LEFT JOIN resources r ON p.manager_id = r.id
+LEFT JOIN (
+    SELECT project_id,
+           SUM(actual_hours) as total_actual_hours,
+           COUNT(CASE WHEN status IN ('Delayed', 'Blocked')
+                        OR (status != 'Completed' AND due_date < CURRENT_DATE) THEN 1 END) as deliverables_delayed,
+           COUNT(CASE WHEN status IN ('Pending', 'In Progress')
+                       AND due_date >= CURRENT_DATE THEN 1 END) as deliverables_on_track
+    FROM deliverables
+    GROUP BY project_id
+) d ON d.project_id = p.id
+LEFT JOIN (
+    SELECT project_id, AVG(allocation_percentage) as avg_allocation
+    FROM project_resources
+    WHERE is_active = TRUE
+    GROUP BY project_id
+) a ON a.project_id = p.id
+LEFT JOIN (
+    SELECT project_id, COUNT(*) as escalation_count
+    FROM escalations
+    WHERE status IN ('Open', 'In Progress', 'Escalated')
+    GROUP BY project_id
+) e ON e.project_id = p.id
+WHERE p.is_active = TRUE;
+
+-- Compensation, reviews and current allocation per active resource (HR only)
+CREATE OR REPLACE VIEW v_resource_performance_hr AS
+SELECT 
+    r.id as resource_id,
+    r.name,
+    d.name as department,
+    r.base_salary,
+    r.bonus,
+    r.base_salary + COALESCE(r.bonus, 0) as total_compensation,
+    r.performance_rating,
+    r.last_review_date,
+    r.next_review_date,
+    COALESCE(a.allocated, 0) as utilization_rate,
+    COALESCE(h.billable_hours_ytd, 0) as billable_hours_ytd
+FROM resources r
+LEFT JOIN departments d ON r.department_id = d.id
+LEFT JOIN (
+    SELECT resource_id, SUM(allocation_percentage) as allocated
+    FROM project_resources
+    WHERE is_active = TRUE
+    GROUP BY resource_id
+) a ON a.resource_id = r.id
+LEFT JOIN (
+    SELECT assigned_to, SUM(actual_hours) as billable_hours_ytd
+    FROM deliverables
+    WHERE completion_date >= date_trunc('year', CURRENT_DATE)
+    GROUP BY assigned_to
+) h ON h.assigned_to = r.id
+WHERE r.is_active = TRUE;
+
+-- Monthly financial figures
+CREATE OR REPLACE VIEW v_financial_summary AS
+SELECT 
+    month,
+    total_budget,
+    budget_utilized,
+    revenue_generated,
+    profit_margin,
+    burn_rate,
+    project_count,
+    billable_resources,
+    cost_per_resource,
+    revenue_per_resource
+FROM financial_overview;
+
 -- =============================================================================
 -- SAMPLE DATA
 -- =============================================================================